@@ -12,9 +12,10 @@ class AlertSeverity(Enum):
     LOW = "LOW"
 
 class AlertGenerator:
-    def __init__(self):
+    def __init__(self, counter_offset: int = 0, counter_step: int = 1):
         self.alerts: List[Dict] = []
-        self.alert_counter = 4920
+        self.alert_counter = 4920 + counter_offset
+        self.counter_step = counter_step  # > 1 when sharded, keeps ids unique
         self.max_alerts = 100  # Keep last 100 alerts
     
     def generate_alert(self, 
@@ -41,7 +42,7 @@ class AlertGenerator:
             "time": self._format_time(time.time())
         }
         
-        self.alert_counter += 1
+        self.alert_counter += self.counter_step
         self.alerts.append(alert)
         
         # Keep only last N alerts
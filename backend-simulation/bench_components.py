@@ -0,0 +1,288 @@
+"""
+Microbenchmarks for the hot backend components, with a stored JSON baseline
+
+Each benchmark is auto-calibrated so one repeat takes at least --min-time, then
+repeated; ns/op is reported as the median (used for comparisons) and the min.
+
+    python bench_components.py run                    # print results
+    python bench_components.py run --json after.json  # ... and save them
+    python bench_components.py baseline               # save bench_baseline.json
+    python bench_components.py compare                # run now, compare with the baseline
+    python bench_components.py compare --against after.json --threshold 0.05
+
+compare exits with status 1 if any benchmark is slower than the baseline by
+more than --threshold (default 10%). Baselines are machine specific: record
+one on the machine you compare on.
+"""
+import argparse
+import functools
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+BASELINE = Path(__file__).parent / "bench_baseline.json"
+
+HISTORY_LENGTHS = [10, 100, 1000]
+CLUSTER_COUNTS = [10, 100, 1000]
+ALERT_BUFFERS = [100, 1000, 10000]
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+def benchmark(name: str):
+    """Register a setup function; it returns the zero-argument callable to time"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def _cdr(i: int, ts: float) -> dict:
+    return {
+        "destination": f"98{i % 100000:08d}",
+        "duration": float(5 + i % 300),
+        "timestamp": ts + i * 60,
+        "origin_region": f"Region {i % 7}",
+        "target_region": f"Region {i % 11}"
+    }
+
+def _extractor_with_history(caller: str, history: int):
+    from feature_extractor import FeatureExtractor
+    extractor = FeatureExtractor()
+    ts = time.time() - 86400
+    for i in range(history):
+        extractor.add_cdr(caller, _cdr(i, ts))
+    return extractor
+
+# ==========================================
+# Feature extraction
+# ==========================================
+
+def _add_cdr_setup(history: int):
+    def setup():
+        caller = "9876543210"
+        extractor = _extractor_with_history(caller, history)
+        # Hold the history length constant: every call evicts the oldest one
+        extractor.max_records_per_caller = history
+        counter = itertools.count(history)
+        ts = time.time()
+        return lambda: extractor.add_cdr(caller, _cdr(next(counter), ts))
+    return setup
+
+def _extract_features_setup(history: int):
+    def setup():
+        caller = "9876543210"
+        extractor = _extractor_with_history(caller, history)
+        return lambda: extractor.extract_features(caller)
+    return setup
+
+for _n in HISTORY_LENGTHS:
+    benchmark(f"feature_extractor.add_cdr[history={_n}]")(_add_cdr_setup(_n))
+    benchmark(f"feature_extractor.extract_features[history={_n}]")(_extract_features_setup(_n))
+
+# ==========================================
+# ML scoring
+# ==========================================
+
+@functools.lru_cache(maxsize=None)
+def _ml_service():
+    """MLService with the trained model if present, else a seeded stand-in of the same type"""
+    from ml_service import MLService
+    service = MLService()
+    if not service.is_loaded:
+        import numpy as np
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import MinMaxScaler
+        rng = np.random.default_rng(42)
+        X = np.column_stack([
+            rng.normal(160, 60, 5000), rng.integers(1, 500, 5000), rng.random(5000),
+            rng.integers(1, 10, 5000), rng.integers(1, 20, 5000)
+        ])
+        service.model = IsolationForest(n_estimators=100, random_state=42).fit(X)
+        service.scaler = MinMaxScaler(feature_range=(0, 100)).fit(-service.model.decision_function(X).reshape(-1, 1))
+        service.is_loaded = True
+        service.synthetic = True
+    return service
+
+FEATURES = [42.5, 180.0, 0.35, 3.0, 6.0]
+
+@benchmark("ml_service.predict")
+def _predict_setup():
+    service = _ml_service()
+    return lambda: service.predict(FEATURES)
+
+@benchmark("ml_service._fallback_predict")
+def _fallback_setup():
+    from ml_service import MLService
+    service = MLService.__new__(MLService)  # Heuristic only, skip model loading
+    return lambda: service._fallback_predict(FEATURES)
+
+# ==========================================
+# Clustering and alerts
+# ==========================================
+
+def _detect_cluster_setup(clusters: int):
+    def setup():
+        from cluster_detector import ClusterDetector
+        detector = ClusterDetector()
+        # Distinct fraud types so only the last cluster matches: a new caller scans all of them
+        for i in range(clusters):
+            detector.detect_cluster(f"seed_{i}", 90.0, f"Type {i}")
+        target_type = f"Type {clusters - 1}"
+        target = detector.clusters[detector.caller_to_cluster[f"seed_{clusters - 1}"]]
+        counter = itertools.count()
+
+        def run():
+            caller = f"new_{next(counter)}"
+            detector.detect_cluster(caller, 90.0, target_type)
+            # Undo the join so every call sees the same state
+            del detector.caller_to_cluster[caller]
+            target["callers"].pop()
+            target["affected_users"] = len(target["callers"])
+        return run
+    return setup
+
+def _get_alerts_setup(buffer: int, severity: str = None):
+    def setup():
+        from alert_generator import AlertGenerator, AlertSeverity
+        generator = AlertGenerator()
+        generator.max_alerts = buffer
+        severities = list(AlertSeverity)
+        for i in range(buffer):
+            generator.generate_alert(severities[i % len(severities)], f"Alert {i}", caller_id=str(i))
+        return lambda: generator.get_alerts(severity=severity)
+    return setup
+
+for _n in CLUSTER_COUNTS:
+    benchmark(f"cluster_detector.detect_cluster[clusters={_n}]")(_detect_cluster_setup(_n))
+for _n in ALERT_BUFFERS:
+    benchmark(f"alert_generator.get_alerts[buffer={_n}]")(_get_alerts_setup(_n))
+    benchmark(f"alert_generator.get_alerts[buffer={_n},severity=CRITICAL]")(_get_alerts_setup(_n, "CRITICAL"))
+
+# ==========================================
+# End to end
+# ==========================================
+
+@benchmark("simulator.process_cdr")
+def _process_cdr_setup():
+    from simulator import FraudSimulator
+    from traffic_source import SyntheticTrafficSource
+    simulator = FraudSimulator()
+    simulator.warm_up()  # Scores with whatever model the server would load
+    source = SyntheticTrafficSource(n_callers=5000, seed=42)
+    pool = source.draw(50000)
+    # Steady state: callers already have history, clusters and alerts exist
+    for cdr in pool:
+        simulator.process_cdr(dict(cdr))
+    cdrs = itertools.cycle(pool)
+    return lambda: simulator.process_cdr(dict(next(cdrs)))
+
+# ==========================================
+# Runner
+# ==========================================
+
+def measure(run: Callable[[], object], min_time: float, repeat: int) -> dict:
+    """timeit-style: calibrate loops to min_time, then take `repeat` timings"""
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time * 1e9 / elapsed * 1.2)))
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            run()
+        timings.append((time.perf_counter_ns() - start) / loops)
+    return {
+        "ns_per_op": statistics.median(timings),
+        "min_ns_per_op": min(timings),
+        "loops": loops,
+        "repeat": repeat
+    }
+
+def run_all(pattern: str = None, min_time: float = 0.2, repeat: int = 5) -> dict:
+    import numpy
+    import sklearn
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(setup(), min_time, repeat)
+        print(f"  {name:<58}{results[name]['ns_per_op'] / 1000:>12.2f} us/op", file=sys.stderr)
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "numpy": numpy.__version__,
+            "sklearn": sklearn.__version__,
+            "ml_model": "synthetic" if getattr(_ml_service(), "synthetic", False) else "trained"
+        },
+        "benchmarks": results
+    }
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print a comparison table; returns True if any benchmark regressed"""
+    regressed = False
+    if baseline["meta"].get("ml_model") != current["meta"].get("ml_model"):
+        print("⚠️  Baseline and current runs used different ML models; ml_service/simulator rows are not comparable")
+    print(f"{'benchmark':<58}{'baseline us':>13}{'current us':>13}{'change':>9}")
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<58}{'-':>13}{result['ns_per_op'] / 1000:>13.2f}{'new':>9}")
+            continue
+        change = result["ns_per_op"] / base["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:<58}{base['ns_per_op'] / 1000:>13.2f}{result['ns_per_op'] / 1000:>13.2f}"
+            f"{change:>+9.1%}{flag}"
+        )
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend component microbenchmarks")
+    parser.add_argument("command", choices=["run", "baseline", "compare"])
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="run: also write results to this file")
+    parser.add_argument("--baseline", default=str(BASELINE), help="Baseline file")
+    parser.add_argument("--against", help="compare: results file to compare instead of running now")
+    parser.add_argument("--threshold", type=float, default=0.10, help="compare: allowed slowdown (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.command == "compare" and args.against:
+        current = json.loads(Path(args.against).read_text())
+    else:
+        current = run_all(args.filter, args.min_time, args.repeat)
+
+    if args.command == "run":
+        print(json.dumps(current, indent=2))
+        if args.json:
+            Path(args.json).write_text(json.dumps(current, indent=2))
+    elif args.command == "baseline":
+        Path(args.baseline).write_text(json.dumps(current, indent=2))
+        print(f"✓ Baseline with {len(current['benchmarks'])} benchmarks saved to {args.baseline}")
+    else:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if compare(baseline, current, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Replay memory check: peak RSS of the external sort in replay.stream_cdrs
+must not grow with the size of the input file.
+
+For each size a call_data.csv is generated with src/generate_data.py, then a
+fresh interpreter consumes stream_cdrs() (no scoring) and its peak RSS is
+read with os.wait4. Fails if the largest file needs noticeably more memory
+than the smallest.
+
+Usage: python bench_replay_memory.py [--sizes 2e5 1e6 4e6] [--chunk-size 100000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+HERE = Path(__file__).parent
+GENERATOR = HERE.parent / "src" / "generate_data.py"
+
+CONSUME = """
+import sys
+from pathlib import Path
+import replay
+rows = sum(1 for _ in replay.stream_cdrs(Path(sys.argv[1]), chunk_size=int(sys.argv[2])))
+print(rows)
+"""
+
+# Allowed growth of peak RSS from the smallest to the largest file
+TOLERANCE_MB = 40
+
+def peak_rss_mb(path: Path, chunk_size: int) -> float:
+    process = subprocess.Popen(
+        [sys.executable, "-c", CONSUME, str(path), str(chunk_size)], cwd=HERE, stdout=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    if status != 0:
+        raise RuntimeError(f"stream_cdrs failed on {path} with status {status}")
+    return usage.ru_maxrss / 1024  # KB on Linux
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that replay memory does not grow with file size")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[2e5, 1e6, 4e6], help="Target row counts")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    peaks = []
+    with tempfile.TemporaryDirectory(prefix="satark-replay-mem-") as tmp:
+        data = Path(tmp) / "call_data.csv"
+        for size in args.sizes:
+            subprocess.run(
+                [sys.executable, str(GENERATOR), "--seed", "42", "--days", "30", "--start", "2026-01-31",
+                 "--rows", str(int(size)), "--output", str(data)],
+                check=True, stdout=subprocess.DEVNULL
+            )
+            peak = peak_rss_mb(data, args.chunk_size)
+            peaks.append(peak)
+            print(f"  {int(size):>12,} rows ({data.stat().st_size / 1e6:>6.0f} MB): peak RSS {peak:>6.0f} MB")
+
+    growth = peaks[-1] - peaks[0]
+    if growth > TOLERANCE_MB:
+        print(f"⚠️  Peak RSS grew by {growth:.0f} MB with file size (allowed {TOLERANCE_MB} MB)")
+        sys.exit(1)
+    print(f"✓ Peak RSS flat across sizes (grew {growth:.0f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Startup benchmark: time to import main and build the simulator (server can
+answer /health), time to warm up (server is ready), and the slowest imports from `python -X importtime`.
+
+Each measurement runs in a fresh interpreter so module caches don't hide cost.
+Snapshots (and with them the WAL) are disabled, so runs neither restore from
+nor write into data/snapshots and are reproducible.
+
+Usage: python bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+ENV = dict(os.environ, SATARK_SNAPSHOTS="0")
+
+MEASURE = """
+import json, time
+t0 = time.perf_counter()
+import main
+main.simulator = main.create_simulator()  # Done by the startup hook in the server
+t1 = time.perf_counter()
+main.simulator.warm_up()
+t2 = time.perf_counter()
+if hasattr(main.simulator, "close"):
+    main.simulator.close()
+print(json.dumps({"import_s": t1 - t0, "warm_up_s": t2 - t1}))
+"""
+
+def run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE], cwd=HERE, env=ENV, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def slowest_imports(limit: int = 10) -> list:
+    """Top self-time imports of `import main`"""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=HERE, env=ENV, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), name))
+    rows.sort(reverse=True)
+    return [{"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000} for s, c, name in rows[:limit]]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [run_once() for _ in range(runs)]
+    report = {
+        "runs": runs,
+        "import_main_s": statistics.median(r["import_s"] for r in results),
+        "warm_up_s": statistics.median(r["warm_up_s"] for r in results),
+        "slowest_imports": slowest_imports()
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the json and compact /ws/threat-stream encodings
+
+Reports bytes per event (raw and with permessage-deflate) and server CPU:
+encoding runs once per tick for all clients of an encoding, deflate runs
+once per message per client.
+
+Usage: python bench_wire_format.py [ticks] [events_per_tick]
+"""
+import sys
+import time
+import zlib
+from simulator import build_stream_event
+from traffic_source import SyntheticTrafficSource
+from wire_format import make_encoders
+
+def make_ticks(ticks: int, size: int):
+    """Synthetic batches with the same shape as FraudSimulator.generate_batch"""
+    source = SyntheticTrafficSource(seed=42)
+    batches = []
+    stats = {"total_calls": 0, "blocked_threats": 0, "active_campaigns_count": 0, "total_fraud_detected": 0}
+    for _ in range(ticks):
+        events = []
+        for cdr in source.draw(size):
+            fraud = cdr["duration"] < 20
+            result = {
+                "caller_id": cdr["caller_id"],
+                "risk_score": 90.0 if fraud else cdr["duration"] / 6,
+                "is_fraud": fraud,
+                "cluster_id": "cluster_101" if fraud else None,
+                "fraud_type": "Wangiri" if fraud else "Legitimate"
+            }
+            events.append(build_stream_event(source.next_event_id(), cdr, result))
+            stats["total_calls"] += 1
+            stats["blocked_threats"] += int(fraud)
+            stats["total_fraud_detected"] += int(fraud)
+        batches.append({"events": events, "stats": dict(stats)})
+    return batches
+
+def deflate(message) -> bytes:
+    # permessage-deflate uses raw deflate with a per-connection context
+    compressor = zlib.compressobj(wbits=-15)
+    data = message.encode("utf-8") if isinstance(message, str) else message
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    batches = make_ticks(ticks, size)
+    events = ticks * size
+
+    print(f"{ticks} ticks x {size} events")
+    print(f"{'encoding':<10}{'B/event':>10}{'B/event deflate':>18}{'encode us/tick':>17}{'deflate us/client/tick':>25}")
+    for name, encoder in make_encoders().items():
+        start = time.perf_counter()
+        messages = [encoder.encode(batch) for batch in batches]
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compressed = [deflate(message) for message in messages]
+        deflate_time = time.perf_counter() - start
+
+        raw_bytes = sum(len(m) for m in messages)
+        deflated_bytes = sum(len(m) for m in compressed)
+        print(
+            f"{name:<10}{raw_bytes / events:>10.1f}{deflated_bytes / events:>18.1f}"
+            f"{encode_time / ticks * 1e6:>17.1f}{deflate_time / ticks * 1e6:>25.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,15 @@ import time
 import uuid
 
 class ClusterDetector:
-    def __init__(self):
+    def __init__(self, counter_offset: int = 0, counter_step: int = 1):
         self.clusters: Dict[str, Dict] = {}
         self.caller_to_cluster: Dict[str, str] = {}
-        self.cluster_counter = 100
+        self.cluster_counter = 100 + counter_offset
+        self.counter_step = counter_step  # > 1 when sharded, keeps ids unique
+        self.version = 0  # Bumped whenever the active cluster list may change
+        self._active_cache = None
+        self._active_cache_version = -1
+        self._active_expires = 0.0
     
     def detect_cluster(self, caller_id: str, risk_score: float, fraud_type: str = None) -> str:
         """
@@ -55,12 +60,13 @@ class ClusterDetector:
                 return cid
         
         # Create new cluster
-        cluster_id = f"cluster_{self.cluster_counter}"
-        self.cluster_counter += 1
+        cluster_number = self.cluster_counter
+        cluster_id = f"cluster_{cluster_number}"
+        self.cluster_counter += self.counter_step
         
         self.clusters[cluster_id] = {
             "id": cluster_id,
-            "name": f"Cluster #{self.cluster_counter - 1} - {fraud_type}",
+            "name": f"Cluster #{cluster_number} - {fraud_type}",
             "fraud_type": fraud_type,
             "callers": [caller_id],
             "risk_score": risk_score,
@@ -72,6 +78,7 @@ class ClusterDetector:
         }
         
         self.caller_to_cluster[caller_id] = cluster_id
+        self.version += 1
         return cluster_id
     
     def _update_cluster(self, cluster_id: str, caller_id: str, risk_score: float):
@@ -91,11 +98,19 @@ class ClusterDetector:
         cluster["avg_risk"] = total_risk / cluster["affected_users"]
         cluster["risk_score"] = int(cluster["avg_risk"])
         cluster["last_updated"] = time.time()
+        self.version += 1
     
     def get_active_clusters(self) -> List[Dict]:
-        """Get all active clusters"""
+        """Get all active clusters (cached until a cluster changes or expires; do not mutate)"""
+        now = time.time()
+        if self._active_cache_version == self.version:
+            if now < self._active_expires:
+                return self._active_cache
+            # A cluster aged out without being touched
+            self.version += 1
+        
         # Filter active clusters (updated in last 24 hours)
-        cutoff = time.time() - 86400  # 24 hours
+        cutoff = now - 86400  # 24 hours
         
         active = [
             {
@@ -111,8 +126,20 @@ class ClusterDetector:
         
         # Sort by risk score descending
         active.sort(key=lambda x: x["risk_score"], reverse=True)
+        
+        self._active_cache = active
+        self._active_cache_version = self.version
+        self._active_expires = min(
+            (c["last_updated"] + 86400 for c in self.clusters.values() if c["last_updated"] > cutoff),
+            default=float("inf")
+        )
         return active
     
+    def active_version(self) -> int:
+        """Version of get_active_clusters(), accounting for clusters that aged out"""
+        self.get_active_clusters()
+        return self.version
+    
     def get_cluster_by_caller(self, caller_id: str) -> Dict:
         """Get cluster info for a caller"""
         cluster_id = self.caller_to_cluster.get(caller_id)
@@ -1,16 +1,32 @@
 """
 Real-time feature extraction from CDR records
+
+Features are defined once in src/feature_kernel.py and shared with the
+offline pipeline; each caller has a CallerState (from the dependency-free
+src/caller_state.py) updated as CDRs enter and leave its rolling window, so
+extract_features() does not rescan the history.
 """
+import sys
 from datetime import datetime
 from collections import defaultdict
+from pathlib import Path
 from typing import Dict, List
-import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from caller_state import CallerState  # noqa: E402
+
+def _kernel_args(cdr: Dict) -> tuple:
+    timestamp = cdr.get("timestamp")
+    hour = timestamp.hour if hasattr(timestamp, "hour") else None
+    return cdr.get("duration"), hour, cdr.get("origin_region"), cdr.get("target_region")
 
 class FeatureExtractor:
     def __init__(self):
         # Store CDR records per caller (rolling window)
         self.cdr_store: Dict[str, List[Dict]] = defaultdict(list)
         self.max_records_per_caller = 1000  # Keep last 1000 calls per caller
+        # caller_id -> CallerState over cdr_store[caller_id]; rebuilt from the history when missing
+        self.states: Dict[str, CallerState] = {}
     
     def add_cdr(self, caller_id: str, cdr: Dict):
         """
@@ -30,13 +46,34 @@ class FeatureExtractor:
         if isinstance(cdr.get("timestamp"), (int, float)):
             cdr["timestamp"] = datetime.fromtimestamp(cdr["timestamp"])
         elif isinstance(cdr.get("timestamp"), str):
-            cdr["timestamp"] = pd.to_datetime(cdr["timestamp"])
+            try:
+                cdr["timestamp"] = datetime.fromisoformat(cdr["timestamp"])
+            except ValueError:
+                # Rare non-ISO formats; pandas is only imported if we get here
+                import pandas as pd
+                cdr["timestamp"] = pd.to_datetime(cdr["timestamp"])
         
-        self.cdr_store[caller_id].append(cdr)
+        records = self.cdr_store[caller_id]
+        state = self._state(caller_id, records)
+        records.append(cdr)
+        state.add(*_kernel_args(cdr))
         
         # Keep only last N records
-        if len(self.cdr_store[caller_id]) > self.max_records_per_caller:
-            self.cdr_store[caller_id] = self.cdr_store[caller_id][-self.max_records_per_caller:]
+        excess = len(records) - self.max_records_per_caller
+        if excess > 0:
+            for evicted in records[:excess]:
+                state.remove(*_kernel_args(evicted))
+            del records[:excess]
+    
+    def _state(self, caller_id: str, records: List[Dict]) -> CallerState:
+        state = self.states.get(caller_id)
+        if state is None:
+            # New caller, or a history restored from a snapshot
+            state = CallerState()
+            for record in records:
+                state.add(*_kernel_args(record))
+            self.states[caller_id] = state
+        return state
     
     def extract_features(self, caller_id: str) -> List[float]:
         """
@@ -50,32 +87,7 @@ class FeatureExtractor:
             # Return default features for new caller
             return [0.0, 0.0, 0.0, 0.0, 0.0]
         
-        records = self.cdr_store[caller_id]
-        
-        # Calculate features
-        durations = [r.get("duration", 0) for r in records]
-        avg_duration = sum(durations) / len(durations) if durations else 0.0
-        total_calls = len(records)
-        
-        # Night call ratio (22:00 - 05:59)
-        night_calls = 0
-        for r in records:
-            hour = r["timestamp"].hour if hasattr(r["timestamp"], "hour") else 0
-            if hour >= 22 or hour < 6:
-                night_calls += 1
-        night_ratio = night_calls / total_calls if total_calls > 0 else 0.0
-        
-        # Unique regions
-        origin_regions = len(set(r.get("origin_region", "") for r in records))
-        target_regions = len(set(r.get("target_region", "") for r in records))
-        
-        return [
-            float(avg_duration),
-            float(total_calls),
-            float(night_ratio),
-            float(origin_regions),
-            float(target_regions)
-        ]
+        return self._state(caller_id, self.cdr_store[caller_id]).features()
     
     def get_caller_stats(self, caller_id: str) -> Dict:
         """Get detailed stats for a caller"""
@@ -0,0 +1,157 @@
+"""
+Live-process introspection: a sampling profiler and approximate memory report
+
+Both are designed to run against a loaded process: the profiler only reads
+sys._current_frames() from a background thread, and the memory report sizes a
+random sample of entries per structure and extrapolates instead of walking
+everything.
+"""
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread at a fixed interval and aggregates them
+    in the folded format used by flamegraph.pl / speedscope:
+
+        thread;module:function:line;...;module:function:line <count>
+    """
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float = 0.01) -> bool:
+        """Start sampling for `seconds`; returns False if a profile is already running"""
+        if self.running:
+            return False
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = interval
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, seconds: float):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.stopped_at = time.time()
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "distinct_stacks": len(self.stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def deep_sizeof(obj, seen: set = None, depth: int = 6) -> int:
+    """Approximate retained size of plain containers, strings, numbers and datetimes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth < 0:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in list(obj.items()):
+            size += deep_sizeof(key, seen, depth - 1) + deep_sizeof(value, seen, depth - 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in list(obj):
+            size += deep_sizeof(item, seen, depth - 1)
+    elif hasattr(type(obj), "__slots__"):  # e.g. feature_kernel.CallerState
+        for name in type(obj).__slots__:
+            size += deep_sizeof(getattr(obj, name, None), seen, depth - 1)
+    elif hasattr(obj, "nbytes") and not isinstance(obj, (str, bytes, datetime)):
+        size += int(obj.nbytes)
+    return size
+
+def estimate_mapping(mapping: Dict, sample_size: int = 200) -> dict:
+    """Entry count and approximate bytes of a dict, sizing only a random sample of entries"""
+    keys = list(mapping)  # Single C-level copy, safe while other threads insert
+    count = len(keys)
+    sample = random.sample(keys, min(sample_size, count))
+    seen = set()
+    sampled = 0
+    for key in sample:
+        value = mapping.get(key)
+        sampled += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    per_entry = sampled / len(sample) if sample else 0
+    return {
+        "entries": count,
+        "approx_bytes": int(sys.getsizeof(mapping) + per_entry * count),
+        "sampled_entries": len(sample)
+    }
+
+def estimate_sequence(items: list, sample_size: int = 200) -> dict:
+    items = list(items)
+    sample = random.sample(items, min(sample_size, len(items)))
+    seen = set()
+    per_item = sum(deep_sizeof(item, seen) for item in sample) / len(sample) if sample else 0
+    return {
+        "entries": len(items),
+        "approx_bytes": int(sys.getsizeof(items) + per_item * len(items)),
+        "sampled_entries": len(sample)
+    }
+
+def model_nbytes(obj, depth: int = 4, seen: set = None) -> int:
+    """Bytes held in numpy arrays and sklearn trees reachable from a fitted model"""
+    if seen is None:
+        seen = set()
+    if obj is None or id(obj) in seen or depth < 0:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, "nbytes") and hasattr(obj, "dtype"):
+        return int(obj.nbytes)
+    if type(obj).__name__ == "Tree" and hasattr(obj, "node_count"):
+        # sklearn's Cython Tree: 64-byte node structs plus the value array
+        return int(obj.node_count) * 64 + int(obj.value.nbytes)
+    if isinstance(obj, (list, tuple)):
+        return sum(model_nbytes(item, depth - 1, seen) for item in obj)
+    if isinstance(obj, dict):
+        return sum(model_nbytes(item, depth - 1, seen) for item in obj.values())
+    if hasattr(obj, "__dict__"):
+        return sum(model_nbytes(value, depth - 1, seen) for value in vars(obj).values())
+    return 0
@@ -0,0 +1,340 @@
+"""
+Load generator for /api/cdr, /api/check-number and /ws/threat-stream
+
+Drives a running server (--url) or an in-process one (--in-process, uvicorn
+on an ephemeral port in a background thread) with a weighted request mix.
+
+Arrival processes:
+  closed  --concurrency N workers, each sends its next request when the
+          previous one returns (measures capacity)
+  open    Poisson arrivals at --rate req/s regardless of how fast the server
+          answers; latency is measured from the scheduled send time, so queueing
+          behind a slow server is counted (no coordinated omission)
+
+WebSocket clients (--ws-clients) stay connected for the whole run and record
+delivery latency: receive time minus the event's server-side timestamp.
+
+Usage:
+    python loadtest.py --in-process --concurrency 32 --duration 30
+    python loadtest.py --url http://127.0.0.1:8000 --arrival open --rate 500 \\
+        --mix cdr=80,check-number=20 --ws-clients 50 --json results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+ENDPOINTS = {
+    "cdr": "/api/cdr",
+    "check-number": "/api/check-number",
+}
+
+PERCENTILES = [("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p99.9", 0.999)]
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client, so client overhead stays small next to the server's"""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post_json(self, path: str, body: bytes) -> int:
+        """Send one request and read the full response; returns the status code"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+        )
+        try:
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by server")
+            status = int(status_line.split(b" ", 2)[1])
+            length = 0
+            keep_alive = True
+            while True:
+                line = await self.reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.partition(b":")
+                name = name.strip().lower()
+                if name == b"content-length":
+                    length = int(value)
+                elif name == b"connection" and value.strip().lower() == b"close":
+                    keep_alive = False
+            await self.reader.readexactly(length)
+        except Exception:
+            self.close()
+            raise
+        if not keep_alive:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class RequestFactory:
+    """Realistic request bodies: a fixed caller population so features accumulate"""
+    def __init__(self, callers: int = 5000, seed: int = None):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.callers = [str(rng.randint(6_000_000_000, 9_999_999_999)) for _ in range(callers)]
+        self.regions = ["Mumbai", "Delhi", "Kolkata", "Chennai", "Bengaluru", "Hyderabad", "Pune", "Jaipur"]
+
+    def body(self, kind: str) -> bytes:
+        rng = self.rng
+        if kind == "cdr":
+            fraud = rng.random() < 0.05
+            payload = {
+                "caller_id": rng.choice(self.callers),
+                "destination": str(rng.randint(6_000_000_000, 9_999_999_999)),
+                "duration": round(rng.expovariate(1 / 4) if fraud else max(0.0, rng.gauss(160, 60)), 2),
+                "timestamp": time.time(),
+                "origin_region": rng.choice(self.regions),
+                "target_region": rng.choice(self.regions)
+            }
+        else:
+            payload = {"number": rng.choice(self.callers)}
+        return json.dumps(payload).encode("utf-8")
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'cdr=80,check-number=20' -> normalized weights"""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("mix weights must sum to more than 0")
+    return {name: weight / total for name, weight in weights.items()}
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    """Throughput and exact latency percentiles (ms) from raw samples"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    summary = {
+        "requests": count + errors,
+        "errors": errors,
+        "throughput_per_sec": count / elapsed if elapsed else 0.0,
+    }
+    if count:
+        summary["latency_ms"] = {
+            name: latencies[min(count - 1, int(q * count))] * 1000 for name, q in PERCENTILES
+        }
+        summary["latency_ms"]["mean"] = sum(latencies) / count * 1000
+        summary["latency_ms"]["max"] = latencies[-1] * 1000
+    return summary
+
+class LoadTest:
+    def __init__(self, url: str, mix: Dict[str, float], seed: int = None):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.ws_url = f"ws://{self.host}:{self.port}/ws/threat-stream"
+        self.mix_names = list(mix)
+        self.mix_weights = [mix[name] for name in self.mix_names]
+        self.factory = RequestFactory(seed=seed)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in mix}
+        self.errors: Dict[str, int] = {name: 0 for name in mix}
+        self.status_counts: Dict[str, int] = {}
+        self.ws_latencies: List[float] = []
+        self.ws_connect: List[float] = []
+        self.ws_messages = 0
+        self.ws_errors = 0
+
+    def _pick(self) -> str:
+        return self.factory.rng.choices(self.mix_names, self.mix_weights)[0]
+
+    async def _request(self, conn: HTTPConnection, kind: str, scheduled: float):
+        try:
+            status = await conn.post_json(ENDPOINTS[kind], self.factory.body(kind))
+        except Exception:
+            self.errors[kind] += 1
+            return
+        self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+        if status == 200:
+            self.latencies[kind].append(time.perf_counter() - scheduled)
+        else:
+            self.errors[kind] += 1
+
+    async def closed_loop(self, concurrency: int, deadline: float):
+        async def worker():
+            conn = HTTPConnection(self.host, self.port)
+            try:
+                while time.perf_counter() < deadline:
+                    await self._request(conn, self._pick(), time.perf_counter())
+            finally:
+                conn.close()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, max_in_flight: int, deadline: float):
+        # A pool of keep-alive connections; arrivals wait for a free one but keep
+        # their scheduled time, so pool exhaustion shows up as latency
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(max_in_flight):
+            pool.put_nowait(HTTPConnection(self.host, self.port))
+
+        async def send(kind: str, scheduled: float):
+            conn = await pool.get()
+            try:
+                await self._request(conn, kind, scheduled)
+            finally:
+                pool.put_nowait(conn)
+
+        tasks = set()
+        rng = self.factory.rng
+        scheduled = time.perf_counter()
+        while scheduled < deadline:
+            scheduled += rng.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(send(self._pick(), scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        while not pool.empty():
+            pool.get_nowait().close()
+
+    async def ws_client(self, deadline: float):
+        import websockets
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(self.ws_url, max_size=None) as ws:
+                self.ws_connect.append(time.perf_counter() - started)
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    received = time.time()
+                    self.ws_messages += 1
+                    for event in json.loads(message).get("events", []):
+                        self.ws_latencies.append(max(0.0, received - event["timestamp"]))
+        except Exception:
+            self.ws_errors += 1
+
+    async def run(self, arrival: str, duration: float, concurrency: int, rate: float,
+                  max_in_flight: int, ws_clients: int) -> dict:
+        await self.wait_ready()
+        start = time.perf_counter()
+        deadline = start + duration
+        jobs = [self.ws_client(deadline) for _ in range(ws_clients)]
+        if self.mix_names and (concurrency or rate):
+            if arrival == "closed":
+                jobs.append(self.closed_loop(concurrency, deadline))
+            else:
+                jobs.append(self.open_loop(rate, max_in_flight, deadline))
+        await asyncio.gather(*jobs)
+        elapsed = time.perf_counter() - start
+
+        all_latencies = list(itertools.chain.from_iterable(self.latencies.values()))
+        report = {
+            "elapsed_s": elapsed,
+            "http": {
+                "overall": summarize(all_latencies, sum(self.errors.values()), elapsed),
+                **{
+                    ENDPOINTS[name]: summarize(self.latencies[name], self.errors[name], elapsed)
+                    for name in self.mix_names
+                },
+                "status_codes": self.status_counts
+            }
+        }
+        if ws_clients:
+            report["websocket"] = {
+                "clients": ws_clients,
+                "connect_errors": self.ws_errors,
+                "messages": self.ws_messages,
+                "events": len(self.ws_latencies),
+                "connect": summarize(self.ws_connect, 0, elapsed).get("latency_ms"),
+                "delivery": summarize(self.ws_latencies, 0, elapsed).get("latency_ms")
+            }
+        return report
+
+    async def wait_ready(self, timeout: float = 120.0):
+        """Poll /ready until the models are warm"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(f"GET /ready HTTP/1.1\r\nHost: {self.host}\r\nConnection: close\r\n\r\n".encode("ascii"))
+                status_line = await reader.readline()
+                writer.close()
+                if b" 200 " in status_line:
+                    return
+            except OSError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"server at {self.host}:{self.port} not ready after {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+def start_in_process_server() -> str:
+    """Run main:app under uvicorn on a free port in a daemon thread"""
+    import uvicorn
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config("main:app", host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, name="loadtest-server", daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Satark HTTP and WebSocket APIs")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of a running server")
+    target.add_argument("--in-process", action="store_true", help="Start main:app in this process")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("cdr=70,check-number=30"),
+                        help="Weighted request mix, e.g. cdr=70,check-number=30")
+    parser.add_argument("--arrival", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed loop: concurrent workers")
+    parser.add_argument("--rate", type=float, default=200.0, help="Open loop: mean arrivals per second")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open loop: connection pool size")
+    parser.add_argument("--ws-clients", type=int, default=0, help="WebSocket clients held open for the run")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    url = start_in_process_server() if args.in_process else args.url
+    test = LoadTest(url, args.mix, seed=args.seed)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    report = asyncio.run(test.run(
+        args.arrival, args.duration, args.concurrency, args.rate, args.max_in_flight, args.ws_clients
+    ))
+    report["config"] = {
+        "target": "in-process" if args.in_process else url,
+        "arrival": args.arrival,
+        "mix": args.mix,
+        "concurrency": args.concurrency if args.arrival == "closed" else None,
+        "rate": args.rate if args.arrival == "open" else None,
+        "ws_clients": args.ws_clients,
+        "duration_s": args.duration,
+        "started_at": started_at
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from pathlib import Path
+from typing import List, Optional
 import asyncio
+import hmac
 import json
+import os
+import time
 from simulator import FraudSimulator
+from sharded_simulator import ShardedSimulator
 from websocket_manager import ConnectionManager
+from response_cache import VersionedResponseCache
+import metrics
+from introspection import SamplingProfiler
 
 app = FastAPI(title="Satark Fraud Simulation API")
 
@@ -16,45 +24,269 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 manager = ConnectionManager()
-simulator = FraudSimulator()
+response_cache = VersionedResponseCache()
+ws_tick_histogram = metrics.registry.histogram(
+    "satark_ws_tick_seconds", "Time to generate one threat-stream batch"
+)
+
+# SATARK_SHARDS=N (N > 1) routes callers to N worker processes
+SHARD_COUNT = int(os.environ.get("SATARK_SHARDS", "1"))
+
+# State snapshots for warm restarts (see snapshot.py); SATARK_SNAPSHOTS=0 disables them
+SNAPSHOT_DIR = None
+if os.environ.get("SATARK_SNAPSHOTS", "1") == "1":
+    SNAPSHOT_DIR = os.environ.get("SATARK_SNAPSHOT_DIR", str(Path(__file__).parent.parent / "data" / "snapshots"))
+SNAPSHOT_INTERVAL = float(os.environ.get("SATARK_SNAPSHOT_INTERVAL", "300"))
+
+# Write-ahead log of CDRs between snapshots (see wal.py); SATARK_WAL=0 disables it
+WAL_DIR = None
+if SNAPSHOT_DIR and os.environ.get("SATARK_WAL", "1") == "1":
+    # LSNs are only meaningful for the shard layout that wrote them
+    WAL_DIR = str(Path(SNAPSHOT_DIR) / f"wal-of-{SHARD_COUNT}")
+
+# SATARK_SPOOL_DIR: ingest CDR files dropped into this directory (see spool_ingest.py)
+SPOOL_DIR = os.environ.get("SATARK_SPOOL_DIR")
+spool_ingestor = None
+
+# Set when warm-up raises; /ready reports it instead of staying 503 silently
+warm_up_error = None
+
+# Built by the startup hook, not at import: `python main.py` re-imports this
+# module in uvicorn's spawned reload worker, and shard processes must not be
+# started while that worker is still bootstrapping
+simulator = None
+
+def create_simulator():
+    if SHARD_COUNT > 1:
+        return ShardedSimulator(SHARD_COUNT, snapshot_dir=SNAPSHOT_DIR, wal_dir=WAL_DIR)
+    return FraudSimulator(snapshot_dir=SNAPSHOT_DIR, wal_dir=WAL_DIR)
+
+@app.on_event("shutdown")
+def shutdown_simulator():
+    for task in ("threat_producer", "snapshotter"):
+        running = getattr(app.state, task, None)
+        if running:
+            running.cancel()
+    if spool_ingestor is not None:
+        spool_ingestor.stop()
+    if simulator is None:
+        return
+    if simulator.is_ready:
+        # Final snapshot so a restart loses nothing processed so far
+        simulator.snapshot()
+    simulator.close()
 
 @app.get("/")
 async def root():
     return {"message": "Satark Intelligence Grid Online"}
 
+@app.get("/health")
+async def health():
+    """Liveness: answers as soon as the app is imported"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 503 until the models and offline index are warm"""
+    if not simulator.is_ready:
+        response.status_code = 503
+    payload = {"ready": simulator.is_ready, "recovery": simulator.recovery}
+    if warm_up_error:
+        payload["error"] = warm_up_error
+    return payload
+
+def require_ready():
+    if not simulator.is_ready:
+        raise HTTPException(status_code=503, detail="Models are warming up", headers={"Retry-After": "1"})
+
+async def produce_threat_batch():
+    """Generate one batch per tick, shared by every client"""
+    started = metrics.now_ns()
+    batch = await asyncio.to_thread(simulator.generate_batch, 5)
+    if metrics.ENABLED:
+        ws_tick_histogram.observe(metrics.now_ns() - started)
+    # Copy stats so later ticks can't mutate a batch still being encoded
+    return {"events": batch["events"], "stats": dict(batch["stats"])}
+
+async def warm_up_and_stream():
+    """Load models off the event loop, then start the threat stream"""
+    global warm_up_error
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(simulator.warm_up)
+    except Exception as e:
+        # /ready stays 503 and reports why, instead of the task dying silently
+        warm_up_error = f"{type(e).__name__}: {e}"
+        print(f"⚠️  Warm-up failed: {warm_up_error}")
+        return
+    print(f"✓ Ready in {time.perf_counter() - started:.2f}s")
+    if SNAPSHOT_DIR and SNAPSHOT_INTERVAL > 0:
+        app.state.snapshotter = asyncio.create_task(snapshot_periodically())
+    if SPOOL_DIR:
+        global spool_ingestor
+        from spool_ingest import SpoolIngestor  # pandas is only needed when ingesting files
+        spool_ingestor = SpoolIngestor(simulator, Path(SPOOL_DIR))
+        spool_ingestor.start()
+        print(f"✓ Ingesting CDR files from {SPOOL_DIR}")
+    await manager.run_producer(produce_threat_batch, interval=1.0)  # Send every second
+
+async def snapshot_periodically():
+    """Start a background snapshot every SNAPSHOT_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await asyncio.to_thread(simulator.snapshot_in_background)
+
+def _log_task_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️  Background task {task.get_name()} failed: {task.exception()!r}")
+
+@app.on_event("startup")
+async def start_threat_producer():
+    global simulator
+    if simulator is None:
+        simulator = create_simulator()
+    # Runs in the background so the server starts answering /health immediately
+    app.state.threat_producer = asyncio.create_task(warm_up_and_stream(), name="warm_up_and_stream")
+    app.state.threat_producer.add_done_callback(_log_task_failure)
+
 @app.websocket("/ws/threat-stream")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # ?encoding=compact negotiates the binary columnar format (see wire_format.py)
+    await manager.connect(websocket, websocket.query_params.get("encoding"))
     try:
         while True:
-            # Simulate fetching a batch of events
-            events = simulator.generate_batch(size=5)
-            await manager.broadcast(json.dumps(events))
-            await asyncio.sleep(1) # Send every second
+            # Events are pushed by the producer; clients may only send subscription filters
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            message = frame.get("text")
+            if message is None:
+                # Binary frames carry nothing we accept; ignore them instead of dropping the client
+                metrics.registry.inc(
+                    "satark_ws_binary_frames_ignored_total", help_text="Binary frames received and ignored"
+                )
+                continue
+            metrics.registry.inc(
+                "satark_ws_messages_received_total", help_text="Messages received from WebSocket clients"
+            )
+            try:
+                request = json.loads(message)
+                if isinstance(request, dict) and request.get("type") == "subscribe":
+                    manager.subscribe(websocket, request)
+            except ValueError as e:
+                print(f"Invalid subscription: {e}")
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         print(f"Error: {e}")
+    finally:
         manager.disconnect(websocket)
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: pipeline stage, HTTP and WebSocket latencies plus counters"""
+    registry = metrics.registry
+    if isinstance(simulator, ShardedSimulator):
+        # Pipeline stages run in the shard processes
+        registry = metrics.MetricsRegistry()
+        registry.merge(metrics.registry.snapshot())
+        registry.merge(simulator.metrics_snapshot())
+
+    stream = manager.metrics()
+    gauges = {
+        "satark_ws_connections": stream["connections"],
+        "satark_ws_messages_sent": stream["messages_sent"],
+        "satark_ws_messages_dropped": stream["messages_dropped"],
+        "satark_ws_slow_consumer_disconnects": stream["slow_consumer_disconnects"],
+    }
+    return Response(
+        content=metrics.render_prometheus(registry, gauges),
+        media_type="text/plain; version=0.0.4"
+    )
+
+# Admin endpoints are disabled unless SATARK_ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get("SATARK_ADMIN_TOKEN")
+profiler = SamplingProfiler()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    # Constant time; bytes, since compare_digest rejects non-ASCII str
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile/start", dependencies=[Depends(require_admin)])
+def start_profile(seconds: float = 30, interval_ms: float = 10):
+    """Sample every thread's stack for `seconds` (API process only)"""
+    seconds = max(0.1, min(seconds, 600))
+    interval_ms = max(1, interval_ms)
+    if not profiler.start(seconds, interval_ms / 1000):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return profiler.status()
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_admin)])
+def stop_profile():
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+def download_profile():
+    """Folded stacks for flamegraph.pl / speedscope"""
+    return Response(
+        content=profiler.folded(),
+        media_type="text/plain",
+        headers={
+            "Content-Disposition": "attachment; filename=satark-profile.folded",
+            "X-Profile-Samples": str(profiler.samples)
+        }
+    )
+
+@app.post("/admin/snapshot", dependencies=[Depends(require_admin), Depends(require_ready)])
+def write_snapshot():
+    """Write a state snapshot now and wait for it"""
+    return simulator.snapshot()
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin), Depends(require_ready)])
+def memory_report():
+    """Approximate bytes and object counts of the major structures"""
+    return simulator.memory_report()
+
+@app.get("/api/stream/metrics")
+def get_stream_metrics():
+    """WebSocket hub connection count and drop metrics"""
+    return manager.metrics()
+
 @app.get("/api/campaigns")
-def get_campaigns():
-    return simulator.get_active_campaigns()
+def get_campaigns(request: Request):
+    return response_cache.respond(
+        request, "campaigns", simulator.campaigns_version, simulator.get_active_campaigns
+    )
 
 @app.get("/api/stats")
-def get_stats():
-    return simulator.get_global_stats()
+def get_stats(request: Request):
+    return response_cache.respond(
+        request, "stats", simulator.global_stats_version, simulator.get_global_stats
+    )
 
 class NumberLookupRequest(BaseModel):
     number: str
 
-@app.post("/api/check-number")
+@app.post("/api/check-number", dependencies=[Depends(require_ready)])
 def check_number(request: NumberLookupRequest):
     """Lookup phone number risk using ML predictions"""
     return simulator.lookup_number(request.number)
 
+class BatchNumberLookupRequest(BaseModel):
+    numbers: List[str] = Field(..., max_length=10000)
+
+@app.post("/api/check-numbers", dependencies=[Depends(require_ready)])
+def check_numbers(request: BatchNumberLookupRequest):
+    """Lookup many phone numbers at once; results are in request order"""
+    return {"results": simulator.lookup_numbers(request.numbers)}
+
 class CDRRequest(BaseModel):
     caller_id: Optional[str] = None
     source: Optional[str] = None
@@ -64,7 +296,7 @@ class CDRRequest(BaseModel):
     origin_region: str
     target_region: str
 
-@app.post("/api/cdr")
+@app.post("/api/cdr", dependencies=[Depends(require_ready)])
 def ingest_cdr(cdr: CDRRequest):
     """
     Ingest CDR (Call Detail Record) for processing
@@ -93,9 +325,13 @@ def ingest_cdr(cdr: CDRRequest):
 @app.get("/api/alerts")
 def get_alerts(severity: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
     """Get alerts with optional filtering"""
-    alerts = simulator.alert_generator.get_alerts(severity, status, limit)
+    alerts = simulator.get_alerts(severity, status, limit)
     return alerts
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # permessage-deflate is negotiated per client when enabled
+    uvicorn.run(
+        "main:app", host="127.0.0.1", port=8000, reload=True,
+        ws_per_message_deflate=os.environ.get("SATARK_WS_DEFLATE", "1") == "1"
+    )
\ No newline at end of file
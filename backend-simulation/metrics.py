@@ -0,0 +1,204 @@
+"""
+Low-overhead latency histograms and counters, exposed in Prometheus text format
+
+Set SATARK_METRICS=0 to disable recording entirely; timers then skip the
+clock reads and record nothing. Updates are not locked: under the GIL a
+concurrent increment can very rarely be lost, which is acceptable for metrics.
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+ENABLED = os.environ.get("SATARK_METRICS", "1") != "0"
+
+# Bucket upper bounds in nanoseconds: 1us .. 10s
+BUCKETS_NS = [
+    1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000,
+    100_000_000, 250_000_000, 500_000_000, 1_000_000_000, 2_500_000_000, 10_000_000_000
+]
+
+now_ns = time.perf_counter_ns
+
+class Histogram:
+    """Fixed-bucket histogram of durations in nanoseconds (non-cumulative counts)"""
+    __slots__ = ("counts", "sum_ns", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_NS) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe(self, duration_ns: int):
+        self.counts[bisect_left(BUCKETS_NS, duration_ns)] += 1
+        self.sum_ns += duration_ns
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound (ns) below which a fraction q of observations fall"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS_NS, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return float(bound)
+        return float("inf")
+
+    def merge(self, counts: List[int], sum_ns: int, count: int):
+        for i, value in enumerate(counts):
+            self.counts[i] += value
+        self.sum_ns += sum_ns
+        self.count += count
+
+class MetricsRegistry:
+    def __init__(self):
+        # name -> labels (tuple of (key, value)) -> Histogram / count
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self.counters: Dict[str, Dict[Tuple, int]] = {}
+        self.help: Dict[str, str] = {}
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        self.help.setdefault(name, help_text)
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        return hist
+
+    def inc(self, name: str, amount: int = 1, help_text: str = "", **labels):
+        if not ENABLED:
+            return
+        self.help.setdefault(name, help_text)
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        """Plain-data copy, so worker processes can ship their metrics to the coordinator"""
+        return {
+            "histograms": {
+                name: [(key, list(h.counts), h.sum_ns, h.count) for key, h in series.items()]
+                for name, series in self.histograms.items()
+            },
+            "counters": {name: list(series.items()) for name, series in self.counters.items()},
+            "help": dict(self.help)
+        }
+
+    def merge(self, snapshot: dict):
+        self.help.update({k: v for k, v in snapshot["help"].items() if k not in self.help})
+        for name, series in snapshot["histograms"].items():
+            target = self.histograms.setdefault(name, {})
+            for key, counts, sum_ns, count in series:
+                key = tuple(tuple(item) for item in key)
+                hist = target.get(key)
+                if hist is None:
+                    hist = target[key] = Histogram()
+                hist.merge(counts, sum_ns, count)
+        for name, series in snapshot["counters"].items():
+            target = self.counters.setdefault(name, {})
+            for key, value in series:
+                key = tuple(tuple(item) for item in key)
+                target[key] = target.get(key, 0) + value
+
+class StageTimer:
+    """
+    Times consecutive stages of one pipeline with a single clock read per stage:
+
+        t = timer.start()
+        ...
+        t = timer.lap("features", t)
+    """
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, stages: List[str]):
+        self.histograms = {
+            stage: registry.histogram(name, help_text, stage=stage) for stage in stages
+        }
+
+    def start(self) -> int:
+        return now_ns() if ENABLED else 0
+
+    def lap(self, stage: str, started: int) -> int:
+        if not ENABLED:
+            return 0
+        now = now_ns()
+        # Histogram.observe inlined: this runs several times per CDR
+        hist = self.histograms[stage]
+        duration = now - started
+        hist.counts[bisect_left(BUCKETS_NS, duration)] += 1
+        hist.sum_ns += duration
+        hist.count += 1
+        return now
+
+def _format_labels(key: Tuple, extra: str = "") -> str:
+    parts = [f'{k}="{str(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def render_prometheus(registry: MetricsRegistry, gauges: Dict[str, float] = None) -> str:
+    """Prometheus text exposition format (version 0.0.4); durations in seconds"""
+    lines = []
+    for name, series in sorted(registry.histograms.items()):
+        lines.append(f"# HELP {name} {registry.help.get(name, '')}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, hist in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS_NS, hist.counts):
+                cumulative += count
+                le = 'le="%g"' % (bound / 1e9)
+                lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_format_labels(key, le)} {hist.count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {hist.sum_ns / 1e9:.9f}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+    for name, series in sorted(registry.counters.items()):
+        lines.append(f"# HELP {name} {registry.help.get(name, '')}")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in sorted(series.items()):
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+PIPELINE_STAGES = ["features", "ml", "fraud_type", "cluster", "alerts", "store"]
+pipeline_timer = StageTimer(
+    registry, "satark_pipeline_stage_seconds",
+    "Time spent in each FraudSimulator.process_cdr stage", PIPELINE_STAGES
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template and method"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = now_ns()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            registry.histogram(
+                "satark_http_request_seconds", "HTTP request latency by route",
+                route=route, method=scope["method"]
+            ).observe(now_ns() - started)
+            registry.inc(
+                "satark_http_requests_total", help_text="HTTP requests by route and status",
+                route=route, method=scope["method"], status=status[0]
+            )
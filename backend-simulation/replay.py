@@ -0,0 +1,235 @@
+"""
+Replay historical CDRs through FraudSimulator.process_cdr
+
+Streams data/call_data.csv (or any file with the same schema) in timestamp
+order with a chunked reader, either at a speed multiplier of the original
+timeline or as fast as possible, and reports sustained CDRs/sec and scoring
+lag. Memory is bounded by --chunk-size regardless of file size: unsorted input
+is first split into sorted runs on disk (.npy record files) and then
+k-way merged, reading every run sequentially in small slices so only about
+--chunk-size rows are in memory across all runs.
+bench_replay_memory.py checks that peak RSS stays flat as the file grows.
+
+Usage:
+    python replay.py ../data/call_data.csv --speed 3600
+    python replay.py ../data/call_data.csv --max-speed --shards 4
+"""
+import argparse
+import heapq
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+
+from metrics import Histogram
+
+COLUMNS = ["caller_id", "receiver_id", "call_duration", "timestamp", "origin_region", "target_region"]
+
+# (timestamp ns, caller_id, receiver_id, duration, origin, target)
+Row = Tuple[int, str, str, float, str, str]
+
+def _read_chunks(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    for chunk in pd.read_csv(
+        path,
+        usecols=COLUMNS,
+        dtype={"caller_id": str, "receiver_id": str, "origin_region": str, "target_region": str},
+        chunksize=chunk_size
+    ):
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], format="ISO8601").astype("int64")
+        yield chunk
+
+def _rows(chunk: pd.DataFrame) -> Iterator[Row]:
+    return zip(
+        chunk["timestamp"].tolist(),
+        chunk["caller_id"].tolist(),
+        chunk["receiver_id"].tolist(),
+        chunk["call_duration"].tolist(),
+        chunk["origin_region"].tolist(),
+        chunk["target_region"].tolist()
+    )
+
+def _sorted_runs(path: Path, chunk_size: int, tmp_dir: str) -> List[Path]:
+    """Write each chunk, sorted by timestamp, to its own .npy run file (one record per row)"""
+    runs = []
+    for i, chunk in enumerate(_read_chunks(path, chunk_size)):
+        chunk = chunk.sort_values("timestamp", kind="stable")
+        # Fixed-width unicode strings so records can be read back by offset; missing -> ""
+        strings = {c: chunk[c].fillna("").to_numpy(dtype=str) for c in COLUMNS if c not in ("timestamp", "call_duration")}
+        records = np.empty(len(chunk), dtype=[
+            ("timestamp", np.int64), ("caller_id", strings["caller_id"].dtype),
+            ("receiver_id", strings["receiver_id"].dtype), ("call_duration", np.float64),
+            ("origin_region", strings["origin_region"].dtype), ("target_region", strings["target_region"].dtype)
+        ])
+        records["timestamp"] = chunk["timestamp"].to_numpy()
+        records["call_duration"] = chunk["call_duration"].to_numpy()
+        for column, values in strings.items():
+            records[column] = values
+        run = Path(tmp_dir) / f"run_{i:05d}.npy"
+        np.save(run, records)
+        runs.append(run)
+    return runs
+
+def _iter_run(run: Path, slice_rows: int) -> Iterator[Row]:
+    """
+    Rows of one run, slice_rows at a time. Each slice is a plain read at its
+    offset (no memory map, whose touched pages would stay in RSS, and no file
+    kept open, so thousands of runs do not exhaust file descriptors).
+    """
+    with open(run, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        (rows,), _, dtype = read_header(f)
+        offset = f.tell()
+    for start in range(0, rows, slice_rows):
+        with open(run, "rb") as f:
+            f.seek(offset + start * dtype.itemsize)
+            records = np.fromfile(f, dtype=dtype, count=min(slice_rows, rows - start))
+        yield from zip(
+            records["timestamp"].tolist(),
+            records["caller_id"].tolist(),
+            records["receiver_id"].tolist(),
+            records["call_duration"].tolist(),
+            records["origin_region"].tolist(),
+            records["target_region"].tolist()
+        )
+
+def stream_cdrs(path: Path, chunk_size: int = 100000, assume_sorted: bool = False) -> Iterator[Row]:
+    """Yield rows in timestamp order"""
+    if assume_sorted:
+        for chunk in _read_chunks(path, chunk_size):
+            yield from _rows(chunk)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="satark-replay-") as tmp_dir:
+        runs = _sorted_runs(path, chunk_size, tmp_dir)
+        # heapq.merge primes every run, so the slices of all runs add up to ~chunk_size rows
+        slice_rows = max(64, chunk_size // max(1, len(runs)))
+        yield from heapq.merge(*(_iter_run(run, slice_rows) for run in runs), key=lambda row: row[0])
+
+def replay(simulator, path: Path, speed: float = None, chunk_size: int = 100000,
+           batch_size: int = 256, assume_sorted: bool = False, report_every: float = 5.0,
+           limit: int = None) -> dict:
+    """
+    Feed CDRs to simulator.process_batch. With speed=None runs as fast as
+    possible; otherwise a CDR is due at (ts - first_ts) / speed after start.
+    Lag = how late each CDR finished scoring relative to when it was due.
+    """
+    lag = Histogram()
+    latency = Histogram()
+    total = 0
+    start = time.perf_counter()
+    last_report = start
+    first_ts = None
+    batch: List[dict] = []
+    due: List[float] = []
+
+    def flush():
+        nonlocal total
+        batch_start = time.perf_counter()
+        simulator.process_batch(batch)
+        finished = time.perf_counter()
+        per_cdr_ns = int((finished - batch_start) * 1e9 / len(batch))
+        for due_at in due:
+            lag.observe(max(0, int((finished - due_at) * 1e9)))
+            latency.observe(per_cdr_ns)
+        total += len(batch)
+        batch.clear()
+        due.clear()
+
+    for ts_ns, caller, receiver, duration, origin, target in stream_cdrs(path, chunk_size, assume_sorted):
+        if first_ts is None:
+            # The clock starts at the first row, after any external sort
+            first_ts = ts_ns
+            start = last_report = time.perf_counter()
+        due_at = start if speed is None else start + (ts_ns - first_ts) / 1e9 / speed
+
+        wait = due_at - time.perf_counter()
+        if wait > 0:
+            if batch:
+                flush()
+            time.sleep(wait)
+
+        batch.append({
+            "caller_id": caller,
+            "destination": receiver,
+            "duration": duration,
+            # Naive datetime keeps the hour-of-day of the source data (no local-time shift)
+            "timestamp": pd.Timestamp(ts_ns).to_pydatetime(),
+            "origin_region": origin,
+            "target_region": target
+        })
+        due.append(due_at)
+        if len(batch) >= batch_size:
+            flush()
+
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            lag_text = "" if speed is None else f", lag p99 {lag.quantile(0.99) / 1e6:.1f} ms"
+            print(f"  {total:,} CDRs, {total / (now - start):,.0f} CDRs/s{lag_text}")
+            last_report = now
+        if limit and total + len(batch) >= limit:
+            break
+
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "file": str(path),
+        "speed": speed or "max",
+        "cdrs": total,
+        "elapsed_s": elapsed,
+        "cdrs_per_sec": total / elapsed if elapsed else 0.0,
+        # Lag is only meaningful against a paced timeline
+        "lag_ms": None if speed is None else {
+            q: lag.quantile(p) / 1e6 for q, p in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+        },
+        "scoring_us_per_cdr": {q: latency.quantile(p) / 1e3 for q, p in [("p50", 0.5), ("p99", 0.99)]},
+        "mean_scoring_us_per_cdr": latency.sum_ns / latency.count / 1e3 if latency.count else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a CDR file through the live scoring pipeline")
+    parser.add_argument("path", nargs="?", default=str(Path(__file__).parent.parent / "data" / "call_data.csv"))
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=60.0, help="Timeline speed multiplier (default 60x)")
+    pace.add_argument("--max-speed", action="store_true", help="Replay as fast as possible")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk / sorted run")
+    parser.add_argument("--batch-size", type=int, default=256, help="CDRs per process_batch call")
+    parser.add_argument("--assume-sorted", action="store_true", help="Skip the external sort")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("SATARK_SHARDS", "1")))
+    parser.add_argument("--limit", type=int, help="Stop after this many CDRs")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.shards > 1:
+        from sharded_simulator import ShardedSimulator
+        simulator = ShardedSimulator(args.shards)
+    else:
+        from simulator import FraudSimulator
+        simulator = FraudSimulator()
+    simulator.warm_up()
+
+    try:
+        report = replay(
+            simulator, Path(args.path),
+            speed=None if args.max_speed else args.speed,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            assume_sorted=args.assume_sorted,
+            limit=args.limit
+        )
+    finally:
+        if hasattr(simulator, "close"):
+            simulator.close()
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
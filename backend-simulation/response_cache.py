@@ -0,0 +1,62 @@
+"""
+Pre-serialised, versioned responses with ETag / If-None-Match support
+"""
+import json
+import time
+import uuid
+from typing import Callable, Dict
+from fastapi import Request, Response
+
+# Versions restart from zero on every boot, so ETags carry a per-process id too;
+# otherwise a client could get a 304 for a body from before the restart
+BOOT_ID = uuid.uuid4().hex[:8]
+
+class CachedResponse:
+    def __init__(self, version: str, body: bytes):
+        self.version = version
+        self.etag = f'"{BOOT_ID}-{version}"'
+        self.body = body
+        self.checked_at = time.monotonic()
+
+class VersionedResponseCache:
+    """
+    Serves a JSON body built once per data version.
+
+    Within `ttl` seconds of the last check the cached body is served without
+    even asking for the version (which costs a round trip per shard in sharded
+    mode); after that the version is re-read and the body rebuilt only if it
+    changed. Clients sending a matching If-None-Match get an empty 304.
+    """
+    def __init__(self, ttl: float = 0.5):
+        self.ttl = ttl
+        self.entries: Dict[str, CachedResponse] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: str, version: Callable[[], str], build: Callable[[], object]) -> CachedResponse:
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.ttl:
+            self.hits += 1
+            return entry
+
+        current = f"{key}-{version()}"
+        if entry is not None and entry.version == current:
+            entry.checked_at = now
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = CachedResponse(current, json.dumps(build()).encode("utf-8"))
+        self.entries[key] = entry
+        return entry
+
+    def respond(self, request: Request, key: str, version: Callable[[], str], build: Callable[[], object]) -> Response:
+        entry = self.get(key, version, build)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,184 @@
+"""
+Offline risk index built from the training pipeline's exported predictions
+
+data/hybrid_fraud_predictions.csv and data/inference_results.csv are compacted
+once into .npy arrays (a sorted int64 caller array plus parallel score arrays
+and a Bloom filter) under data/risk_index/. Later startups memory-map those
+arrays, so loading is independent of the number of rows and the pages are
+shared between shard processes.
+
+Each build goes to a private temporary directory that is renamed into
+data/risk_index/<source signature>/ when complete, so shard processes that
+start together never read (or write into) a half-built index.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_SOURCES = [
+    DATA_DIR / "hybrid_fraud_predictions.csv",
+    DATA_DIR / "inference_results.csv",  # Later sources win for duplicate callers
+]
+DEFAULT_INDEX_DIR = DATA_DIR / "risk_index"
+
+SCORE_COLUMNS = {
+    "final_risk": np.float32,
+    "fraud_probability": np.float32,
+    "anomaly_intensity": np.float32,
+    "predicted_fraud": np.int8,
+}
+
+_MASK = (1 << 64) - 1
+_H1 = 0x9E3779B97F4A7C15
+_H2 = 0xC2B2AE3D27D4EB4F
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+def normalize_number(number) -> Optional[int]:
+    """Phone number -> int64 key (last 10 digits, so +91/0 prefixes match the CSV ids)"""
+    digits = "".join(ch for ch in str(number) if ch.isdigit())
+    if not digits:
+        return None
+    return int(digits[-10:])
+
+def _bloom_positions(keys: np.ndarray, n_bits: int) -> np.ndarray:
+    """Double hashing, vectorised; must match _bloom_position_list"""
+    keys = keys.astype(np.uint64)
+    h1 = keys * np.uint64(_H1)
+    h2 = (keys ^ (keys >> np.uint64(33))) * np.uint64(_H2) | np.uint64(1)
+    return np.stack([(h1 + np.uint64(i) * h2) % np.uint64(n_bits) for i in range(BLOOM_HASHES)])
+
+def _bloom_position_list(key: int, n_bits: int) -> List[int]:
+    h1 = (key * _H1) & _MASK
+    h2 = (((key ^ (key >> 33)) * _H2) & _MASK) | 1
+    return [((h1 + i * h2) & _MASK) % n_bits for i in range(BLOOM_HASHES)]
+
+class OfflineRiskIndex:
+    def __init__(self, callers: np.ndarray, scores: dict, bloom: np.ndarray):
+        self.callers = callers
+        self.scores = scores
+        self.bloom = bloom
+        self.n_bits = len(bloom) * 8
+        self.bloom_rejects = 0
+
+    def __len__(self):
+        return len(self.callers)
+
+    def might_contain(self, key: int) -> bool:
+        bloom = self.bloom
+        for pos in _bloom_position_list(key, self.n_bits):
+            if not bloom[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def lookup(self, number) -> Optional[dict]:
+        """Scores for a number, or None if the offline models never saw it"""
+        key = normalize_number(number)
+        if key is None or not len(self.callers):
+            return None
+        if not self.might_contain(key):
+            self.bloom_rejects += 1
+            return None
+        i = int(np.searchsorted(self.callers, key))
+        if i >= len(self.callers) or self.callers[i] != key:
+            return None
+        return {name: values[i].item() for name, values in self.scores.items()}
+
+    @classmethod
+    def empty(cls) -> "OfflineRiskIndex":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            {name: np.empty(0, dtype=dtype) for name, dtype in SCORE_COLUMNS.items()},
+            np.zeros(1, dtype=np.uint8)
+        )
+
+    @classmethod
+    def load(cls, sources: List[Path] = None, index_dir: Path = None) -> "OfflineRiskIndex":
+        """Memory-map the index, rebuilding it first if the source CSVs changed"""
+        sources = [Path(p) for p in (sources or DEFAULT_SOURCES) if Path(p).exists()]
+        index_dir = Path(index_dir or DEFAULT_INDEX_DIR)
+        if not sources:
+            return cls.empty()
+
+        start = time.perf_counter()
+        signature = [[str(p), p.stat().st_size, p.stat().st_mtime_ns] for p in sources]
+        version = hashlib.sha256(json.dumps(signature).encode()).hexdigest()[:16]
+        target = index_dir / version
+
+        if not target.is_dir():
+            index_dir.mkdir(parents=True, exist_ok=True)
+            tmp = index_dir / f".tmp-{version}-{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            build_index(sources, tmp)
+            (tmp / "meta.json").write_text(json.dumps({"sources": signature}))
+            try:
+                os.replace(tmp, target)
+            except OSError:
+                # Another shard finished the same build first; use its copy
+                shutil.rmtree(tmp, ignore_errors=True)
+            for stale in index_dir.iterdir():
+                # Older versions (and legacy flat files); already mapped pages stay valid.
+                # Temp dirs are kept only while the process building them is alive
+                if stale.name != version and not _building(stale):
+                    if stale.is_dir():
+                        shutil.rmtree(stale, ignore_errors=True)
+                    else:
+                        stale.unlink(missing_ok=True)
+            action = "built"
+        else:
+            action = "loaded"
+
+        index = cls(
+            np.load(target / "callers.npy", mmap_mode="r"),
+            {name: np.load(target / f"{name}.npy", mmap_mode="r") for name in SCORE_COLUMNS},
+            np.load(target / "bloom.npy", mmap_mode="r")
+        )
+        print(f"✓ Offline risk index {action}: {len(index)} callers in {time.perf_counter() - start:.3f}s")
+        return index
+
+# A temp dir older than this is removed even if its pid is alive (the pid was reused)
+STALE_BUILD_SECONDS = 3600
+
+def _building(path: Path) -> bool:
+    """True for the temp dir (.tmp-<version>-<pid>) of a build that may still be running"""
+    if not path.name.startswith(".tmp-"):
+        return False
+    try:
+        pid = int(path.name.rsplit("-", 1)[1])
+        age = time.time() - path.stat().st_mtime
+        os.kill(pid, 0)
+    except (ValueError, FileNotFoundError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return age < STALE_BUILD_SECONDS
+
+def build_index(sources: List[Path], index_dir: Path):
+    """Compact the prediction CSVs into sorted, deduplicated .npy arrays plus a Bloom filter"""
+    import pandas as pd
+
+    frames = [
+        pd.read_csv(path, usecols=["caller_id", *SCORE_COLUMNS], dtype={"caller_id": np.int64, **SCORE_COLUMNS})
+        for path in sources
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates("caller_id", keep="last").sort_values("caller_id")
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    callers = df["caller_id"].to_numpy(dtype=np.int64)
+    np.save(index_dir / "callers.npy", callers)
+    for name, dtype in SCORE_COLUMNS.items():
+        np.save(index_dir / f"{name}.npy", df[name].to_numpy(dtype=dtype))
+
+    n_bits = max(64, len(callers) * BLOOM_BITS_PER_KEY)
+    n_bits += -n_bits % 8
+    bloom = np.zeros(n_bits // 8, dtype=np.uint8)
+    positions = _bloom_positions(callers, n_bits).ravel()
+    np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.int64), (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+    np.save(index_dir / "bloom.npy", bloom)
@@ -0,0 +1,317 @@
+"""
+Sharded execution mode: CDRs are routed by caller hash to worker processes
+"""
+import multiprocessing as mp
+import signal
+import threading
+import time
+import zlib
+from typing import Dict, List
+from simulator import FraudSimulator, build_stream_event
+from metrics import MetricsRegistry
+from wal import WriteAheadLog
+
+REPLAY_BATCH = 1000
+
+def shard_for(caller_id: str, shard_count: int) -> int:
+    """Stable caller -> shard mapping (independent of PYTHONHASHSEED)"""
+    return zlib.crc32(str(caller_id).encode("utf-8")) % shard_count
+
+def _shard_worker(conn, shard_index: int, shard_count: int, snapshot_dir: str = None):
+    """Worker loop: owns one FraudSimulator and serves method calls over a pipe"""
+    # Ctrl+C reaches the whole process group; the coordinator stops shards via close()
+    # after its final snapshot, so they must outlive the interrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    simulator = FraudSimulator(shard_index=shard_index, shard_count=shard_count, snapshot_dir=snapshot_dir)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        method, args = message
+        try:
+            conn.send((True, getattr(simulator, method)(*args)))
+        except Exception as e:
+            conn.send((False, repr(e)))
+    conn.close()
+
+class ShardedSimulator:
+    """
+    Coordinator with the same interface as FraudSimulator.
+
+    Each shard process owns its own FeatureExtractor, MLService, ClusterDetector
+    and AlertGenerator for the callers hashed to it. Per-caller calls go to the
+    owning shard; campaigns, stats and alerts are merged across all shards.
+    Clusters are formed per shard, so a campaign spanning shards shows up as
+    one cluster per shard.
+
+    The write-ahead log is kept here rather than per shard: CDRs are appended
+    in the order they are dispatched, and each shard snapshot records the last
+    LSN it includes so recovery replays exactly the records it is missing.
+    """
+
+    def __init__(self, shard_count: int = None, snapshot_dir: str = None, wal_dir: str = None):
+        self.shard_count = shard_count or mp.cpu_count()
+        self.is_ready = False
+        self.traffic_source = None
+        self.wal_dir = wal_dir if snapshot_dir else None  # Truncation needs snapshots
+        self.wal = None
+        self.recovery = None
+        self._snapshot_lock = threading.Lock()
+        ctx = mp.get_context("spawn")
+        self._conns = []
+        self._locks = []
+        self._processes = []
+        for index in range(self.shard_count):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(child_conn, index, self.shard_count, snapshot_dir),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._locks.append(threading.Lock())
+            self._processes.append(process)
+
+    def _call_shards(self, calls: Dict[int, tuple], log: list = None) -> Dict[int, object]:
+        """
+        Send {shard_index: (method, args)} to all shards first, then collect,
+        so the shards work concurrently. CDRs in `log` are appended to the WAL
+        while the shard locks are held, so log order matches processing order.
+        Every shard that was sent a call has its reply read before the locks
+        are released, even when another shard fails, so no stale reply is left
+        in a pipe for the next call.
+        """
+        indices = sorted(calls)
+        lsn = 0
+        replies, dead, sent = {}, {}, []
+        # Lock in index order to avoid deadlocks between request threads
+        for index in indices:
+            self._locks[index].acquire()
+        try:
+            if log and self.wal is not None:
+                lsn = self.wal.append(log)
+            for index in indices:
+                try:
+                    self._conns[index].send(calls[index])
+                except OSError as e:  # BrokenPipeError: the process is gone
+                    dead[index] = e
+                    continue
+                sent.append(index)
+        finally:
+            for index in sent:
+                try:
+                    replies[index] = self._conns[index].recv()
+                except (EOFError, OSError) as e:
+                    dead[index] = e
+            for index in indices:
+                self._locks[index].release()
+        if lsn:
+            self.wal.wait_durable(lsn)
+
+        for index, error in sorted(dead.items()):
+            process = self._processes[index]
+            raise RuntimeError(
+                f"Shard {index} died (pid {process.pid}, exit code {process.exitcode}): {type(error).__name__}"
+            )
+        results = {}
+        for index, (ok, value) in replies.items():
+            if not ok:
+                raise RuntimeError(f"Shard {index} failed: {value}")
+            results[index] = value
+        return results
+
+    def _broadcast(self, method: str, *args) -> List:
+        results = self._call_shards({i: (method, args) for i in range(self.shard_count)})
+        return [results[i] for i in range(self.shard_count)]
+
+    def warm_up(self) -> bool:
+        """Warm every shard concurrently (see FraudSimulator.warm_up)"""
+        from traffic_source import SyntheticTrafficSource
+        self._broadcast("warm_up")
+        self._recover_wal()
+        self.traffic_source = SyntheticTrafficSource()
+        self.is_ready = True
+        return True
+
+    def _recover_wal(self):
+        """Open the WAL and give each shard the records logged after its own snapshot"""
+        if self.wal_dir is None:
+            return
+        started = time.perf_counter()
+        lsns = self._broadcast("snapshot_wal_lsn")
+        self.wal = WriteAheadLog(self.wal_dir, start_after=max(lsns))
+        replayed = 0
+        pending: Dict[int, list] = {}
+        for lsn, cdr in self.wal.replay(min(lsns)):
+            index = self._shard_of(cdr)
+            if lsn > lsns[index]:
+                pending.setdefault(index, []).append(cdr)
+                replayed += 1
+            if sum(len(cdrs) for cdrs in pending.values()) >= REPLAY_BATCH:
+                self._call_shards({i: ("process_batch", (cdrs,)) for i, cdrs in pending.items()})
+                pending = {}
+        if pending:
+            self._call_shards({i: ("process_batch", (cdrs,)) for i, cdrs in pending.items()})
+        self.recovery = {
+            "snapshot_wal_lsn": lsns,
+            "replayed_cdrs": replayed,
+            "seconds": time.perf_counter() - started
+        }
+        print(f"✓ WAL recovery: replayed {replayed} CDRs across {self.shard_count} shards in {self.recovery['seconds']:.2f}s")
+
+    def _shard_of(self, cdr: dict) -> int:
+        return shard_for(cdr.get("caller_id") or cdr.get("source"), self.shard_count)
+
+    def process_cdr(self, cdr_data: dict) -> dict:
+        """Process a CDR record on the shard that owns its caller"""
+        index = self._shard_of(cdr_data)
+        return self._call_shards({index: ("process_cdr", (cdr_data,))}, log=[cdr_data])[index]
+
+    def _scatter(self, method: str, items: list, shard_of, log: bool = False) -> list:
+        """Split items by shard, run method on each part in parallel, keep input order"""
+        positions: Dict[int, List[int]] = {}
+        for position, item in enumerate(items):
+            positions.setdefault(shard_of(item), []).append(position)
+
+        results = self._call_shards({
+            index: (method, ([items[p] for p in shard_positions],))
+            for index, shard_positions in positions.items()
+        }, log=items if log else None)
+
+        ordered = [None] * len(items)
+        for index, shard_positions in positions.items():
+            for position, result in zip(shard_positions, results[index]):
+                ordered[position] = result
+        return ordered
+
+    def process_batch(self, cdrs: list) -> list:
+        """Process a batch with each shard handling its own callers in parallel"""
+        return self._scatter("process_batch", cdrs, self._shard_of, log=True)
+
+    def generate_batch(self, size=5):
+        """Generate a batch of simulated events for WebSocket streaming"""
+        source = self.traffic_source
+        cdrs = source.draw(size)
+        results = self.process_batch(cdrs)
+        events = [
+            build_stream_event(source.next_event_id(), cdr, result)
+            for cdr, result in zip(cdrs, results)
+        ]
+
+        return {
+            "events": events,
+            "stats": self.get_global_stats()
+        }
+
+    def snapshot(self) -> dict:
+        """Snapshot every shard concurrently (blocking); each shard writes its own directory"""
+        with self._snapshot_lock:
+            self._broadcast("wait_snapshot")
+            self._start_snapshots()
+            shards = self._broadcast("wait_snapshot")
+            truncated = self._truncate_wal()
+        return {"shards": shards, "wal_segments_truncated": truncated}
+
+    def snapshot_in_background(self) -> bool:
+        """Start a background snapshot in every shard that is not already writing one"""
+        with self._snapshot_lock:
+            # Segments covered by the previous round's snapshots can go now
+            self._truncate_wal()
+            return any(self._start_snapshots())
+
+    def _start_snapshots(self) -> List[bool]:
+        """Capture every shard at the same WAL position: no CDR is dispatched in between"""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            lsn = None
+            if self.wal is not None:
+                lsn = self.wal.appended_lsn
+                self.wal.wait_durable(lsn)
+            for conn in self._conns:
+                conn.send(("snapshot_in_background", (lsn,)))
+            replies = [conn.recv() for conn in self._conns]
+        finally:
+            for lock in self._locks:
+                lock.release()
+        for index, (ok, value) in enumerate(replies):
+            if not ok:
+                raise RuntimeError(f"Shard {index} failed: {value}")
+        return [value for _, value in replies]
+
+    def _truncate_wal(self) -> int:
+        """Delete WAL segments every shard's snapshot already includes"""
+        if self.wal is None:
+            return 0
+        return self.wal.truncate(min(self._broadcast("snapshot_wal_lsn")))
+
+    def get_active_campaigns(self):
+        """Get active fraud clusters from all shards"""
+        clusters = [c for shard in self._broadcast("get_active_campaigns") for c in shard]
+        clusters.sort(key=lambda x: x["risk_score"], reverse=True)
+        return clusters
+
+    def get_global_stats(self):
+        """Sum statistics across shards"""
+        totals = {
+            "total_calls": 0,
+            "blocked_threats": 0,
+            "active_campaigns_count": 0,
+            "total_fraud_detected": 0
+        }
+        for stats in self._broadcast("get_global_stats"):
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+        return totals
+
+    def campaigns_version(self) -> str:
+        return "-".join(self._broadcast("campaigns_version"))
+
+    def global_stats_version(self) -> str:
+        return "-".join(self._broadcast("global_stats_version"))
+
+    def metrics_snapshot(self) -> dict:
+        """Per-stage metrics recorded inside the shard processes, merged"""
+        merged = MetricsRegistry()
+        for snapshot in self._broadcast("metrics_snapshot"):
+            merged.merge(snapshot)
+        return merged.snapshot()
+
+    def memory_report(self) -> dict:
+        """Memory report of every shard process"""
+        shards = self._broadcast("memory_report")
+        return {
+            "shards": shards,
+            "total_approx_bytes": sum(shard["total_approx_bytes"] for shard in shards),
+            "snapshot_mapped_bytes": sum(shard["snapshot_mapped_bytes"] for shard in shards)
+        }
+
+    def get_alerts(self, severity: str = None, status: str = None, limit: int = 50):
+        """Merge the newest alerts of every shard"""
+        alerts = [a for shard in self._broadcast("get_alerts", severity, status, limit) for a in shard]
+        alerts.sort(key=lambda x: x["created_at"], reverse=True)
+        return alerts[:limit]
+
+    def lookup_number(self, number: str) -> dict:
+        """Lookup a phone number on the shard that owns it"""
+        index = shard_for(number, self.shard_count)
+        return self._call_shards({index: ("lookup_number", (number,))})[index]
+
+    def lookup_numbers(self, numbers: list) -> list:
+        """Lookup several phone numbers, each on the shard that owns it"""
+        return self._scatter("lookup_numbers", numbers, lambda n: shard_for(n, self.shard_count))
+
+    def close(self):
+        """Stop all shard processes and close the WAL"""
+        if self.wal is not None:
+            self.wal.close()
+        for conn, lock in zip(self._conns, self._locks):
+            with lock:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            process.join(timeout=5)
@@ -1,30 +1,71 @@
-import random
+import threading
 import time
-from faker import Faker
-import uuid
-from ml_service import MLService
+from pathlib import Path
 from feature_extractor import FeatureExtractor
 from cluster_detector import ClusterDetector
 from alert_generator import AlertGenerator
+from metrics import pipeline_timer, registry as metrics_registry
+from introspection import estimate_mapping, estimate_sequence, model_nbytes
+from wal import WriteAheadLog
 
-fake = Faker('en_IN')
+# numpy (also through snapshot.py), joblib, Faker and the models are loaded
+# lazily in FraudSimulator.warm_up()
+
+def build_stream_event(event_id: str, cdr: dict, result: dict) -> dict:
+    """Build a WebSocket event from a CDR and its pipeline result"""
+    return {
+        "id": event_id,
+        "timestamp": time.time(),
+        "source": result["caller_id"],
+        "destination": cdr["destination"],
+        "duration": cdr["duration"],
+        "risk_score": result["risk_score"],
+        "type": "Fraud" if result["is_fraud"] else "Legitimate",
+        "location": cdr["origin_region"],
+        "cluster_id": result.get("cluster_id"),
+        "fraud_type": result.get("fraud_type")
+    }
 
 class FraudSimulator:
-    def __init__(self):
+    def __init__(self, shard_index: int = 0, shard_count: int = 1, snapshot_dir: str = None, wal_dir: str = None):
         # Initialize services
-        self.ml_service = MLService()
+        # Shards interleave cluster/alert ids so they stay unique across shards
         self.feature_extractor = FeatureExtractor()
-        self.cluster_detector = ClusterDetector()
-        self.alert_generator = AlertGenerator()
+        self.cluster_detector = ClusterDetector(counter_offset=shard_index, counter_step=shard_count)
+        self.alert_generator = AlertGenerator(counter_offset=shard_index, counter_step=shard_count)
+        
+        # Set by warm_up()
+        self.ml_service = None
+        self.offline_index = None  # Scores exported by src/train_model.py
+        self.traffic_source = None  # Demo stream, see traffic_source.py
+        self.is_ready = False
         
         # Data storage
         self.caller_predictions = {}  # caller_id -> latest prediction
+        self.lookup_cache = {}  # caller_id -> lookup_number response, dropped when the prediction changes
         self.global_stats = {
             "total_calls": 0,
             "blocked_threats": 0,
             "active_campaigns_count": 0,
             "total_fraud_detected": 0
         }
+        self.stats_version = 0  # Bumped whenever global_stats counters change
+        
+        # Pipeline state is mutated under _lock so snapshots see a consistent cut
+        self._lock = threading.Lock()
+        self.dirty_callers = set()  # Callers changed since the last snapshot
+        self.snapshots = None  # SnapshotStore, opened in warm_up()
+        self.snapshot_path = Path(snapshot_dir) / f"shard-{shard_index}-of-{shard_count}" if snapshot_dir else None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread = None
+        self.last_snapshot = None
+        self.backing_snapshot = None  # Snapshot the lazily-restored stores load from
+        
+        # Write-ahead log of raw CDRs, opened in warm_up() after the snapshot is restored
+        self.wal_dir = wal_dir if self.snapshot_path else None  # Truncation needs snapshots
+        self.wal = None
+        self.wal_lsn = 0  # Last WAL record applied to the in-memory state
+        self.recovery = None
         
         # Initialize with some mock data for demo (will be replaced by real data)
         self._init_demo_data()
@@ -33,6 +74,28 @@ class FraudSimulator:
         """Initialize with some demo data for immediate functionality"""
         # This will be replaced as real CDR data comes in
         pass
+    
+    def warm_up(self) -> bool:
+        """
+        Import the heavy dependencies and load the models and offline index.
+        Must complete before process_cdr/lookup_number are called; idempotent.
+        """
+        if self.is_ready:
+            return True
+        from ml_service import MLService
+        from risk_index import OfflineRiskIndex
+        from traffic_source import SyntheticTrafficSource
+        
+        if self.snapshot_path is not None:
+            from snapshot import SnapshotStore
+            self.snapshots = SnapshotStore(self.snapshot_path)
+        self.ml_service = MLService()
+        self.offline_index = OfflineRiskIndex.load()
+        self.traffic_source = SyntheticTrafficSource()
+        self._restore_snapshot()
+        self._recover_wal()
+        self.is_ready = True
+        return True
 
     def process_cdr(self, cdr_data: dict) -> dict:
         """
@@ -58,19 +121,39 @@ class FraudSimulator:
                 "alerts": list
             }
         """
+        with self._lock:
+            lsn = self._log([cdr_data])
+            result = self._process_cdr(cdr_data)
+        if lsn:
+            self.wal.wait_durable(lsn)
+        return result
+    
+    def _log(self, cdrs: list) -> int:
+        """Append to the WAL before processing (caller holds _lock); durability is awaited after"""
+        if self.wal is None:
+            return 0
+        self.wal_lsn = self.wal.append(cdrs)
+        return self.wal_lsn
+    
+    def _process_cdr(self, cdr_data: dict) -> dict:
         caller_id = cdr_data.get("caller_id") or cdr_data.get("source")
+        timer = pipeline_timer
+        t = timer.start()
         
         # Add CDR to feature extractor
         self.feature_extractor.add_cdr(caller_id, cdr_data)
         
         # Extract features
         features = self.feature_extractor.extract_features(caller_id)
+        t = timer.lap("features", t)
         
         # Run ML prediction
         prediction = self.ml_service.predict(features)
+        t = timer.lap("ml", t)
         
         # Determine fraud type based on features
         fraud_type = self._determine_fraud_type(features, prediction)
+        t = timer.lap("fraud_type", t)
         
         # Detect cluster
         cluster_id = self.cluster_detector.detect_cluster(
@@ -78,29 +161,40 @@ class FraudSimulator:
             prediction["risk_score"], 
             fraud_type
         )
+        t = timer.lap("cluster", t)
         
         # Generate alerts
-        alerts = self.cluster_detector.check_and_generate_alerts(
+        alerts = self.alert_generator.check_and_generate_alerts(
             caller_id,
             prediction["risk_score"],
             cluster_id,
             fraud_type
         )
+        t = timer.lap("alerts", t)
         
         # Store prediction
+        previous = self.caller_predictions.get(caller_id)
+        last_call = cdr_data.get("timestamp")
+        if previous and previous.get("last_call") and (last_call is None or previous["last_call"] > last_call):
+            last_call = previous["last_call"]
         self.caller_predictions[caller_id] = {
             **prediction,
             "cluster_id": cluster_id,
             "fraud_type": fraud_type,
             "features": features,
+            "last_call": last_call,
             "timestamp": time.time()
         }
+        self.lookup_cache.pop(caller_id, None)
+        self.dirty_callers.add(caller_id)
         
         # Update stats
+        self.stats_version += 1
         self.global_stats["total_calls"] += 1
         if prediction["is_fraud"]:
             self.global_stats["blocked_threats"] += 1
             self.global_stats["total_fraud_detected"] += 1
+        timer.lap("store", t)
         
         return {
             "caller_id": caller_id,
@@ -112,6 +206,15 @@ class FraudSimulator:
             "alerts": [a["id"] for a in alerts]
         }
     
+    def process_batch(self, cdrs: list) -> list:
+        """Process several CDR records in order, returning one result per record"""
+        with self._lock:
+            lsn = self._log(cdrs)
+            results = [self._process_cdr(cdr) for cdr in cdrs]
+        if lsn:
+            self.wal.wait_durable(lsn)
+        return results
+    
     def _determine_fraud_type(self, features: list, prediction: dict) -> str:
         """Determine fraud type based on behavioral patterns"""
         avg_duration, total_calls, night_ratio, origin_regions, target_regions = features
@@ -136,40 +239,17 @@ class FraudSimulator:
         Generate a batch of simulated events for WebSocket streaming
         Uses real ML predictions if available, otherwise generates demo data
         """
-        events = []
-        for _ in range(size):
-            # Generate demo CDR
-            caller_id = fake.phone_number()
-            destination = fake.phone_number()
-            duration = random.randint(0, 300)
-            
-            # Create CDR
-            cdr = {
-                "caller_id": caller_id,
-                "destination": destination,
-                "duration": duration,
-                "timestamp": time.time(),
-                "origin_region": fake.city(),
-                "target_region": fake.city()
-            }
-            
-            # Process through pipeline
-            result = self.process_cdr(cdr)
-            
-            # Create event for WebSocket
-            event = {
-                "id": str(uuid.uuid4()),
-                "timestamp": time.time(),
-                "source": caller_id,
-                "destination": destination,
-                "duration": duration,
-                "risk_score": result["risk_score"],
-                "type": "Fraud" if result["is_fraud"] else "Legitimate",
-                "location": cdr["origin_region"],
-                "cluster_id": result.get("cluster_id"),
-                "fraud_type": result.get("fraud_type")
-            }
-            events.append(event)
+        source = self.traffic_source
+        cdrs = source.draw(size)
+        
+        # Process through pipeline
+        results = self.process_batch(cdrs)
+        
+        # Create events for WebSocket
+        events = [
+            build_stream_event(source.next_event_id(), cdr, result)
+            for cdr, result in zip(cdrs, results)
+        ]
         
         # Update campaign count
         self.global_stats["active_campaigns_count"] = len(self.cluster_detector.get_active_clusters())
@@ -179,6 +259,199 @@ class FraudSimulator:
             "stats": self.global_stats
         }
 
+    def snapshot(self, wal_lsn: int = None) -> dict:
+        """
+        Write an incremental snapshot of the pipeline state (blocking).
+        Ingestion only waits while the changed callers' lists are copied; the
+        encoding and writing happen outside the pipeline lock.
+        
+        Args:
+            wal_lsn: Last WAL record included in the state, when the WAL is kept
+                     by a coordinator (sharded mode); defaults to this simulator's own
+        """
+        if self.snapshots is None:
+            return {"enabled": False}
+        with self._snapshot_lock:
+            return self._write_snapshot(self._capture_snapshot(wal_lsn))
+    
+    def snapshot_in_background(self, wal_lsn: int = None) -> bool:
+        """
+        Capture the state now and write it on a background thread.
+        Returns False if snapshots are disabled or one is still being written.
+        """
+        if self.snapshots is None or not self._snapshot_lock.acquire(blocking=False):
+            return False
+        try:
+            capture = self._capture_snapshot(wal_lsn)
+        except Exception:
+            self._snapshot_lock.release()
+            raise
+        self._snapshot_thread = threading.Thread(
+            target=self._write_in_background, args=(capture,), name="snapshot-writer", daemon=True
+        )
+        self._snapshot_thread.start()
+        return True
+    
+    def wait_snapshot(self) -> dict:
+        """Wait for a background snapshot to finish; returns the latest snapshot result"""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+        return self.last_snapshot
+    
+    def snapshot_wal_lsn(self) -> int:
+        """WAL position included in the newest snapshot on disk (0 if none)"""
+        current = self.snapshots.current if self.snapshots else None
+        return current.state.get("wal_lsn", 0) if current else 0
+    
+    def _write_in_background(self, capture: dict):
+        try:
+            self._write_snapshot(capture)
+        except Exception as e:
+            print(f"⚠️  Snapshot failed: {e}")
+        finally:
+            self._snapshot_lock.release()
+    
+    def _capture_snapshot(self, wal_lsn: int = None) -> dict:
+        """Copy the changed callers' state under the pipeline lock (a consistent cut)"""
+        started = time.perf_counter()
+        with self._lock:
+            dirty, self.dirty_callers = self.dirty_callers, set()
+            callers = [caller for caller in dirty if isinstance(caller, str)]
+            store = self.feature_extractor.cdr_store
+            histories = [list(store.get(caller) or ()) for caller in callers]
+            predictions = [self.caller_predictions.get(caller) for caller in callers]
+            state = self._snapshot_state()
+            state["wal_lsn"] = self.wal_lsn if wal_lsn is None else wal_lsn
+        return {
+            "dirty": dirty,
+            "callers": callers,
+            "histories": histories,
+            "predictions": predictions,
+            "state": state,
+            "started": started,
+            "paused": time.perf_counter() - started
+        }
+    
+    def _write_snapshot(self, capture: dict) -> dict:
+        callers = capture["callers"]
+        cut = capture["state"]["wal_lsn"]
+        current = self.snapshots.current
+        if not callers:
+            # No caller changed: at most move the snapshot's WAL position forward
+            truncated = 0
+            if current is not None and cut > current.state.get("wal_lsn", 0):
+                if self.wal is not None:
+                    self.wal.wait_durable(cut)
+                self.snapshots.update_state(capture["state"])
+                truncated = self.wal.truncate(cut) if self.wal is not None else 0
+            return {
+                "enabled": True,
+                "written": False,
+                "snapshot": current.path.name if current else None,
+                "wal_lsn": current.state.get("wal_lsn", 0) if current else 0,
+                "wal_segments_truncated": truncated
+            }
+        try:
+            if self.wal is not None:
+                # Never let a snapshot get ahead of the durable log
+                self.wal.wait_durable(cut)
+            snapshot = self.snapshots.write(callers, capture["histories"], capture["predictions"], capture["state"])
+        except Exception:
+            with self._lock:
+                self.dirty_callers |= capture["dirty"]
+            raise
+        self._attach_snapshot(snapshot)
+        truncated = self.wal.truncate(cut) if self.wal is not None else 0
+        elapsed = time.perf_counter() - capture["started"]
+        print(f"✓ Snapshot {snapshot.path.name}: {len(callers)} changed of {len(snapshot)} callers in {elapsed:.2f}s")
+        self.last_snapshot = {
+            "enabled": True,
+            "written": True,
+            "snapshot": snapshot.path.name,
+            "changed_callers": len(callers),
+            "callers": len(snapshot),
+            "records": snapshot.state["records"],
+            "wal_lsn": cut,
+            "wal_segments_truncated": truncated,
+            "pause_ms": capture["paused"] * 1000,
+            "seconds": elapsed
+        }
+        return self.last_snapshot
+    
+    def _snapshot_state(self) -> dict:
+        """Small, non-per-caller state, copied under the pipeline lock"""
+        detector = self.cluster_detector
+        alerts = self.alert_generator
+        return {
+            "created_at": time.time(),
+            "clusters": [dict(c, callers=list(c["callers"])) for c in detector.clusters.values()],
+            "cluster_counter": detector.cluster_counter,
+            "alerts": [dict(a) for a in alerts.alerts],
+            "alert_counter": alerts.alert_counter,
+            "global_stats": dict(self.global_stats)
+        }
+    
+    def _restore_snapshot(self):
+        """Restore the latest snapshot; per-caller state is loaded lazily from the mapped arrays"""
+        if self.snapshots is None:
+            return
+        snapshot = self.snapshots.load_latest()
+        if snapshot is None:
+            return
+        from snapshot import SnapshotBackedDict
+        state = snapshot.state
+        
+        extractor = self.feature_extractor
+        self.backing_snapshot = snapshot
+        extractor.cdr_store = SnapshotBackedDict(extractor.cdr_store, snapshot.load_history, list)
+        extractor.states = {}  # Rebuilt from the restored histories on first use
+        self.caller_predictions = SnapshotBackedDict(self.caller_predictions, snapshot.load_prediction)
+        
+        detector = self.cluster_detector
+        detector.clusters = {c["id"]: c for c in state["clusters"]}
+        detector.caller_to_cluster = {caller: c["id"] for c in state["clusters"] for caller in c["callers"]}
+        detector.cluster_counter = state["cluster_counter"]
+        detector.version += 1
+        
+        self.alert_generator.alerts = state["alerts"]
+        self.alert_generator.alert_counter = state["alert_counter"]
+        self.global_stats.update(state["global_stats"])
+        self.stats_version += 1
+    
+    def _recover_wal(self):
+        """Open the WAL and replay every CDR logged after the restored snapshot"""
+        if self.wal_dir is None:
+            return
+        started = time.perf_counter()
+        after = self.snapshot_wal_lsn()
+        self.wal = WriteAheadLog(self.wal_dir, start_after=after)
+        replayed = 0
+        with self._lock:
+            for lsn, cdr in self.wal.replay(after):
+                self._process_cdr(cdr)
+                replayed += 1
+            self.wal_lsn = self.wal.appended_lsn
+        self.recovery = {
+            "snapshot_wal_lsn": after,
+            "replayed_cdrs": replayed,
+            "seconds": time.perf_counter() - started
+        }
+        print(f"✓ WAL recovery: replayed {replayed} CDRs after LSN {after} in {self.recovery['seconds']:.2f}s")
+    
+    def close(self):
+        """Flush and close the WAL"""
+        if self.wal is not None:
+            self.wal.close()
+    
+    def _attach_snapshot(self, snapshot):
+        """Point lazily-restored stores at the newest snapshot so older ones can be pruned"""
+        if self.backing_snapshot is None:
+            return  # Nothing was restored, so no store loads from a snapshot
+        self.feature_extractor.cdr_store.load = snapshot.load_history
+        self.caller_predictions.load = snapshot.load_prediction
+        self.backing_snapshot = snapshot
+
     def get_active_campaigns(self):
         """Get active fraud clusters"""
         clusters = self.cluster_detector.get_active_clusters()
@@ -190,6 +463,58 @@ class FraudSimulator:
         self.global_stats["active_campaigns_count"] = len(self.cluster_detector.get_active_clusters())
         return self.global_stats
     
+    def campaigns_version(self) -> str:
+        """Changes whenever get_active_campaigns() may return something different"""
+        return str(self.cluster_detector.active_version())
+    
+    def global_stats_version(self) -> str:
+        """Changes whenever get_global_stats() may return something different"""
+        return f"{self.stats_version}.{self.cluster_detector.active_version()}"
+    
+    def metrics_snapshot(self) -> dict:
+        """Metrics recorded in this process (see metrics.py)"""
+        return metrics_registry.snapshot()
+    
+    def memory_report(self) -> dict:
+        """Approximate entry counts and bytes of the major in-memory structures"""
+        ml = self.ml_service
+        report = {
+            "cdr_store": estimate_mapping(self.feature_extractor.cdr_store),
+            "feature_states": estimate_mapping(self.feature_extractor.states),
+            "caller_predictions": estimate_mapping(self.caller_predictions),
+            "lookup_cache": estimate_mapping(self.lookup_cache),
+            "clusters": estimate_mapping(self.cluster_detector.clusters),
+            "caller_to_cluster": estimate_mapping(self.cluster_detector.caller_to_cluster),
+            "alerts": estimate_sequence(self.alert_generator.alerts),
+            "model_arrays": {
+                "approx_bytes": model_nbytes(ml.model) + model_nbytes(ml.scaler) if ml else 0
+            }
+        }
+        index = self.offline_index
+        report["offline_index"] = {
+            "entries": len(index) if index else 0,
+            "approx_bytes": int(index.callers.nbytes + index.bloom.nbytes
+                                + sum(v.nbytes for v in index.scores.values())) if index else 0,
+            "memory_mapped": True
+        }
+        # After a restore, callers not touched yet exist only in the mapped
+        # snapshot columns, which estimate_mapping cannot see
+        if self.backing_snapshot is not None:
+            summary = self.backing_snapshot.memory_summary()
+            for name, part in (("cdr_store", "history"), ("caller_predictions", "predictions")):
+                report[name]["snapshot_backed"] = dict(summary[part], memory_mapped=True)
+        report["total_approx_bytes"] = sum(
+            v["approx_bytes"] for k, v in report.items() if k != "offline_index"
+        )
+        report["snapshot_mapped_bytes"] = sum(
+            report[name].get("snapshot_backed", {}).get("mapped_bytes", 0) for name in ("cdr_store", "caller_predictions")
+        )
+        return report
+    
+    def get_alerts(self, severity: str = None, status: str = None, limit: int = 50):
+        """Get alerts with optional filtering"""
+        return self.alert_generator.get_alerts(severity, status, limit)
+    
     def lookup_number(self, number: str) -> dict:
         """
         Lookup a phone number and return risk assessment
@@ -205,14 +530,22 @@ class FraudSimulator:
                 "fraud_type": str,
                 "cluster_id": str,
                 "anomaly_score": float,
+                "offline_risk_score": int or None,
                 "explanation": str
             }
+        
+        Live predictions take precedence; numbers never seen live fall back to
+        the offline risk index.
         """
+        cached = self.lookup_cache.get(number)
+        if cached is not None:
+            return cached
+        
         # Check if we have prediction for this number
-        if number in self.caller_predictions:
-            pred = self.caller_predictions[number]
-            stats = self.feature_extractor.get_caller_stats(number)
-            cluster = self.cluster_detector.get_cluster_by_caller(number)
+        pred = self.caller_predictions.get(number)
+        offline = self.offline_index.lookup(number)
+        if pred is not None:
+            stats = self._stats_from_prediction(pred)
             
             # Determine status
             if pred["risk_score"] >= 85:
@@ -225,7 +558,7 @@ class FraudSimulator:
             # Generate explanation
             explanation = self._generate_explanation(pred, stats)
             
-            return {
+            response = {
                 "status": status,
                 "risk_score": int(pred["risk_score"]),
                 "category": pred.get("fraud_type", "Legitimate"),
@@ -235,10 +568,16 @@ class FraudSimulator:
                 "fraud_type": pred.get("fraud_type", "None"),
                 "cluster_id": pred.get("cluster_id"),
                 "anomaly_score": float(pred["anomaly_score"]),
+                "offline_risk_score": int(offline["final_risk"] * 100) if offline else None,
                 "explanation": explanation
             }
+            self.lookup_cache[number] = response
+            return response
         
-        # New number - return safe default
+        if offline is not None:
+            return self._offline_lookup(number, offline)
+        
+        # New number - return safe default (not cached, so unknown numbers can't grow memory)
         return {
             "status": "SAFE",
             "risk_score": 0,
@@ -249,9 +588,56 @@ class FraudSimulator:
             "fraud_type": None,
             "cluster_id": None,
             "anomaly_score": 0.0,
+            "offline_risk_score": None,
             "explanation": "No historical data available for this number."
         }
     
+    def _offline_lookup(self, number: str, offline: dict) -> dict:
+        """Risk assessment for a number only known to the offline models"""
+        risk_score = offline["final_risk"] * 100
+        if risk_score >= 85:
+            status = "DANGEROUS"
+        elif risk_score >= 50:
+            status = "SUSPICIOUS"
+        else:
+            status = "SAFE"
+        
+        if offline["predicted_fraud"]:
+            explanation = f"Flagged by offline hybrid model (risk {risk_score:.1f}/100, fraud probability {offline['fraud_probability']:.2f})."
+        else:
+            explanation = "Scored by offline hybrid model; no significant anomalies detected."
+        
+        return {
+            "status": status,
+            "risk_score": int(risk_score),
+            "category": "Fraud" if offline["predicted_fraud"] else "Legitimate",
+            "reports": 0,
+            "carrier": self._get_carrier(number),
+            "last_active": "Unknown",
+            "fraud_type": None,
+            "cluster_id": None,
+            "anomaly_score": float(offline["anomaly_intensity"]),
+            "offline_risk_score": int(risk_score),
+            "explanation": explanation
+        }
+    
+    def lookup_numbers(self, numbers: list) -> list:
+        """Lookup several phone numbers, one response per number in input order"""
+        return [{"number": number, **self.lookup_number(number)} for number in numbers]
+    
+    def _stats_from_prediction(self, prediction: dict) -> dict:
+        """Caller stats as in FeatureExtractor.get_caller_stats, from the features stored at prediction time"""
+        avg_duration, total_calls, night_ratio, origin_regions, target_regions = prediction["features"]
+        last_call = prediction.get("last_call")
+        return {
+            "total_calls": int(total_calls),
+            "avg_duration": avg_duration,
+            "night_call_ratio": night_ratio,
+            "unique_origin_regions": int(origin_regions),
+            "unique_target_regions": int(target_regions),
+            "last_call": last_call.isoformat() if hasattr(last_call, "isoformat") else None
+        }
+    
     def _generate_explanation(self, prediction: dict, stats: dict) -> str:
         """Generate human-readable explanation"""
         parts = []
@@ -0,0 +1,102 @@
+"""
+Smoke check: start the server the documented way (python main.py, which runs
+uvicorn with reload) in sharded mode and check that it answers.
+
+Passes when /health answers and the server log has no traceback, neither at
+startup (e.g. shard processes started while uvicorn's reload worker was still
+bootstrapping) nor at the Ctrl+C shutdown.
+/ready is reported as well; it stays 503 with an "error" when the models in
+models/ have not been trained yet.
+
+Snapshots are disabled so the check never touches data/snapshots.
+
+Usage: python smoke_server.py [--shards 2] [--timeout 60]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+HERE = Path(__file__).parent
+BASE_URL = "http://127.0.0.1:8000"  # Fixed in main.py
+
+def get(path: str):
+    """(status, JSON body) or None if the server does not answer yet"""
+    try:
+        with urllib.request.urlopen(BASE_URL + path, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+def ready_or_failed():
+    """/ready once warm-up has finished either way, else None"""
+    result = get("/ready")
+    if result and (result[0] == 200 or "error" in (result[1] or {})):
+        return result
+    return None
+
+def wait_for(check, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = check()
+        if result:
+            return result
+        time.sleep(0.5)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the backend with shards and check that it answers")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for /health and /ready")
+    args = parser.parse_args()
+
+    if get("/health") is not None:
+        print(f"⚠️  Something is already listening on {BASE_URL}; stop it first")
+        sys.exit(1)
+
+    env = dict(os.environ, SATARK_SHARDS=str(args.shards), SATARK_SNAPSHOTS="0", PYTHONUNBUFFERED="1")
+    with tempfile.TemporaryFile("w+") as log:
+        # Own process group, so the reloader, its worker and the shards are stopped together
+        server = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+        try:
+            started = time.perf_counter()
+            health = wait_for(lambda: get("/health"), args.timeout)
+            health_s = time.perf_counter() - started
+            ready = wait_for(ready_or_failed, args.timeout)
+        finally:
+            os.killpg(server.pid, signal.SIGINT)  # Ctrl+C: graceful shutdown, including the shards
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(server.pid, signal.SIGKILL)
+                server.wait()
+        log.seek(0)
+        output = log.read()
+
+    failed = health is None or health[0] != 200 or "Traceback" in output
+    if failed:
+        print(output)
+        print(f"⚠️  Server with {args.shards} shards did not start cleanly (see log above)")
+        sys.exit(1)
+    print(f"✓ /health answered in {health_s:.1f}s with {args.shards} shards")
+    if ready is None:
+        print("⚠️  /ready did not settle in time")
+    elif ready[0] == 200:
+        print("✓ /ready: ready")
+    else:
+        print(f"⚠️  /ready: {ready[1]['error']} (train the models with src/train_model.py)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Snapshots of the live pipeline state for fast warm restarts
+
+A snapshot is a directory of .npy columns plus a small state.json:
+
+    callers.npy                 sorted caller ids (fixed-width utf-8)
+    offsets.npy                 CSR offsets into the history columns (len = callers + 1)
+    h_<field>.npy               FeatureExtractor history, one row per stored CDR
+    p_<field>.npy, p_mask.npy   latest prediction per caller (mask = has a prediction)
+    state.json                  clusters, alerts, counters and global stats
+
+String columns are dictionary-encoded (<name>.codes.npy + <name>.values.npy,
+code -1 = None) and timestamps are datetime64[us], so every column can be
+memory-mapped. Restore only maps the arrays; a caller's history and prediction
+are turned back into Python objects the first time the caller is touched (see
+SnapshotBackedDict), so startup time does not grow with the number of callers.
+
+Snapshots are incremental: only callers changed since the previous snapshot
+are re-encoded, everyone else is copied column-wise from the previous
+snapshot with NumPy.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+DEFAULT_SNAPSHOT_DIR = Path(__file__).parent.parent / "data" / "snapshots"
+KEEP_SNAPSHOTS = 2
+
+# field -> column kind; records are rebuilt with caller_id first, then these keys
+HISTORY_FIELDS = {
+    "destination": "str",
+    "duration": "float",
+    "timestamp": "datetime",
+    "origin_region": "str",
+    "target_region": "str",
+}
+PREDICTION_FIELDS = {
+    "is_fraud": "bool",
+    "risk_score": "float",
+    "anomaly_score": "float",
+    "prediction": "int",
+    "cluster_id": "str",
+    "fraud_type": "str",
+    "features": "vector",
+    "last_call": "datetime",
+    "timestamp": "float",
+}
+
+# ==========================================
+# Column encoding
+# ==========================================
+
+def _naive(value):
+    """datetime64 has no time zone: keep the wall-clock time, which is what the features use"""
+    if value is None or not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+def _datetime_array(values: list) -> np.ndarray:
+    import pandas as pd
+    try:
+        index = pd.DatetimeIndex(pd.to_datetime(values))
+        if index.tz is not None:
+            index = index.tz_localize(None)
+    except (TypeError, ValueError):
+        # Mixed time zones or unexpected types
+        index = pd.DatetimeIndex([_naive(v) for v in values])
+    return index.to_numpy().astype("datetime64[us]")
+
+def _string_array(values) -> np.ndarray:
+    return np.array([v.encode("utf-8") for v in values], dtype="S") if len(values) else np.empty(0, dtype="S1")
+
+def encode_column(kind: str, values: list) -> Dict[str, np.ndarray]:
+    """Python values -> {suffix: array}; suffix is "" or ".codes"/".values" for strings"""
+    if kind == "str":
+        import pandas as pd  # C-speed factorize; only needed when writing snapshots
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+        return _sorted_dictionary(codes.astype(np.int32), _string_array([str(u) for u in uniques]))
+    if kind == "float":
+        return {"": np.array([np.nan if v is None else v for v in values], dtype=np.float64)}
+    if kind == "int":
+        return {"": np.array([0 if v is None else v for v in values], dtype=np.int64)}
+    if kind == "bool":
+        return {"": np.array([bool(v) for v in values], dtype=bool)}
+    if kind == "datetime":
+        return {"": _datetime_array(values)}
+    if kind == "vector":
+        width = max((len(v) for v in values if v is not None), default=0)
+        return {"": np.array([v if v is not None else [0.0] * width for v in values], dtype=np.float64).reshape(len(values), width)}
+    raise ValueError(f"Unknown column kind: {kind}")
+
+def _sorted_dictionary(codes: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sort the dictionary so two dictionaries can be merged with searchsorted"""
+    order = np.argsort(values, kind="stable")
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return {".codes": _remap(codes, rank), ".values": values[order]}
+
+def _remap(codes: np.ndarray, mapping: np.ndarray) -> np.ndarray:
+    if not len(mapping):
+        return np.full(len(codes), -1, dtype=np.int32)
+    return np.where(codes >= 0, mapping[np.maximum(codes, 0)], -1).astype(np.int32)
+
+def _merge_strings(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray], gather: np.ndarray) -> Dict[str, np.ndarray]:
+    """Concatenate two dictionary-encoded columns, gather rows, drop unused values"""
+    values = np.unique(np.concatenate([old[".values"], new[".values"]]))
+    codes = np.concatenate([
+        _remap(np.asarray(old[".codes"]), np.searchsorted(values, old[".values"]).astype(np.int32)),
+        _remap(new[".codes"], np.searchsorted(values, new[".values"]).astype(np.int32))
+    ])[gather]
+    used = np.zeros(len(values), dtype=bool)
+    used[codes[codes >= 0]] = True
+    compact = (np.cumsum(used) - 1).astype(np.int32)
+    return {".codes": _remap(codes, compact), ".values": values[used]}
+
+def decode_column(kind: str, columns: Dict[str, np.ndarray], start: int, stop: int) -> list:
+    if kind == "str":
+        values = columns[".values"]
+        return [None if c < 0 else values[c].decode("utf-8") for c in columns[".codes"][start:stop].tolist()]
+    values = columns[""][start:stop]
+    if kind == "datetime":
+        return values.astype("datetime64[us]").tolist()  # NaT -> None
+    if kind == "float":
+        return [None if v != v else v for v in values.tolist()]
+    return values.tolist()
+
+# ==========================================
+# Reading
+# ==========================================
+
+class Snapshot:
+    """A memory-mapped snapshot directory"""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.state = json.loads((self.path / "state.json").read_text())
+        self.seq = self.state["seq"]
+        self.callers = self._load("callers")
+        self.offsets = self._load("offsets")
+        self.history = {field: self._columns(f"h_{field}", kind) for field, kind in HISTORY_FIELDS.items()}
+        self.prediction_mask = self._load("p_mask")
+        self.predictions = {field: self._columns(f"p_{field}", kind) for field, kind in PREDICTION_FIELDS.items()}
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    def _columns(self, name: str, kind: str) -> Dict[str, np.ndarray]:
+        suffixes = [".codes", ".values"] if kind == "str" else [""]
+        return {suffix: self._load(name + suffix) for suffix in suffixes}
+
+    def __len__(self):
+        return len(self.callers)
+
+    def index(self, caller) -> int:
+        """Row of a caller, or -1"""
+        if not isinstance(caller, str) or not len(self.callers):
+            return -1
+        key = caller.encode("utf-8")
+        i = int(np.searchsorted(self.callers, key))
+        if i < len(self.callers) and self.callers[i] == key:
+            return i
+        return -1
+
+    def memory_summary(self) -> Dict[str, dict]:
+        """
+        Callers with a history / prediction in this snapshot and the bytes of
+        their mapped columns (callers.npy is counted with the histories)
+        """
+        def nbytes(columns) -> int:
+            return sum(int(array.nbytes) for array in columns.values())
+
+        return {
+            "history": {
+                "entries": int(np.count_nonzero(np.diff(self.offsets))),
+                "mapped_bytes": int(self.callers.nbytes + self.offsets.nbytes)
+                + sum(nbytes(columns) for columns in self.history.values())
+            },
+            "predictions": {
+                "entries": int(np.count_nonzero(self.prediction_mask)),
+                "mapped_bytes": int(self.prediction_mask.nbytes)
+                + sum(nbytes(columns) for columns in self.predictions.values())
+            }
+        }
+
+    def load_history(self, caller) -> Optional[list]:
+        i = self.index(caller)
+        if i < 0:
+            return None
+        start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+        if start == stop:
+            return None
+        columns = [decode_column(kind, self.history[field], start, stop) for field, kind in HISTORY_FIELDS.items()]
+        fields = list(HISTORY_FIELDS)
+        return [
+            {"caller_id": caller, **dict(zip(fields, row))}
+            for row in zip(*columns)
+        ]
+
+    def load_prediction(self, caller) -> Optional[dict]:
+        i = self.index(caller)
+        if i < 0 or not self.prediction_mask[i]:
+            return None
+        return {
+            field: decode_column(kind, self.predictions[field], i, i + 1)[0]
+            for field, kind in PREDICTION_FIELDS.items()
+        }
+
+class SnapshotBackedDict(dict):
+    """
+    dict that loads missing keys from a snapshot on first access.
+    With default_factory it creates missing keys like a defaultdict.
+    """
+    def __init__(self, data: dict, load, default_factory=None):
+        super().__init__(data)
+        self.load = load  # key -> value or None; replaced when a newer snapshot is written
+        self.default_factory = default_factory
+
+    def _hydrate(self, key):
+        value = self.load(key)
+        if value is not None:
+            value = self.setdefault(key, value)
+        return value
+
+    def __missing__(self, key):
+        value = self._hydrate(key)
+        if value is None:
+            if self.default_factory is None:
+                raise KeyError(key)
+            value = self.setdefault(key, self.default_factory())
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._hydrate(key) is not None
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        value = self._hydrate(key)
+        return default if value is None else value
+
+# ==========================================
+# Writing
+# ==========================================
+
+def _save(path: Path, array: np.ndarray):
+    with open(path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _save_columns(directory: Path, name: str, columns: Dict[str, np.ndarray]):
+    for suffix, array in columns.items():
+        _save(directory / f"{name}{suffix}.npy", array)
+
+def _gather_index(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Indices of the rows [starts[i], starts[i] + lengths[i]) for all i, concatenated"""
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+
+class SnapshotStore:
+    """
+    A directory of numbered snapshots, newest named in LATEST. Writing is
+    crash-safe: a snapshot is built in a temporary directory, renamed, and
+    only then made LATEST.
+    """
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.current: Optional[Snapshot] = None
+
+    def load_latest(self) -> Optional[Snapshot]:
+        """Memory-map the newest snapshot, or None if there is none"""
+        for stale in self.directory.glob(".tmp-*"):
+            shutil.rmtree(stale, ignore_errors=True)
+        if not (self.directory / "LATEST").exists():
+            self.current = None
+            return None
+
+        start = time.perf_counter()
+        try:
+            name = (self.directory / "LATEST").read_text().strip()
+            self.current = Snapshot(self.directory / name)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Could not read snapshot in {self.directory}: {e}")
+            self.current = None
+            return None
+        print(
+            f"✓ Snapshot {name} mapped: {len(self.current)} callers, "
+            f"{self.current.state['records']} CDRs in {time.perf_counter() - start:.3f}s"
+        )
+        return self.current
+
+    def write(self, callers: List[str], histories: List[list], predictions: List[Optional[dict]], state: dict) -> Snapshot:
+        """
+        Write a new snapshot: `callers` (with their full histories and latest
+        predictions) replace the same callers in the current snapshot; every
+        other caller is carried over from it.
+        """
+        previous = self.current
+        seq = previous.seq + 1 if previous else 1
+        name = f"snapshot-{seq:06d}"
+        tmp = self.directory / f".tmp-{name}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        # New rows: changed callers, then unchanged callers from the previous snapshot
+        new_callers = _string_array(callers)
+        lengths_new = np.array([len(h) for h in histories], dtype=np.int64)
+        if previous is not None and len(previous):
+            keep = ~np.isin(previous.callers, new_callers)
+            old_offsets = np.asarray(previous.offsets)
+            old_starts = old_offsets[:-1][keep]
+            old_lengths = np.diff(old_offsets)[keep]
+            old_rows = np.flatnonzero(keep)
+            old_callers = previous.callers[keep]
+            old_records = int(old_offsets[-1])
+        else:
+            old_starts = old_lengths = old_rows = np.empty(0, dtype=np.int64)
+            old_callers = np.empty(0, dtype="S1")
+            old_records = 0
+
+        all_callers = np.concatenate([old_callers, new_callers])
+        order = np.argsort(all_callers, kind="stable")
+        starts = np.concatenate([old_starts, old_records + np.concatenate([[0], np.cumsum(lengths_new)[:-1]])])[order]
+        lengths = np.concatenate([old_lengths, lengths_new])[order]
+        record_gather = _gather_index(starts.astype(np.int64), lengths)
+        row_gather = order
+
+        _save(tmp / "callers.npy", all_callers[order])
+        _save(tmp / "offsets.npy", np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+        # History columns, one at a time to bound peak memory
+        records = [record for history in histories for record in history]
+        for field, kind in HISTORY_FIELDS.items():
+            new = encode_column(kind, [record.get(field) for record in records])
+            old = previous.history[field] if previous is not None else None
+            _save_columns(tmp, f"h_{field}", self._combine(kind, old, new, record_gather, old_records))
+
+        # Prediction columns, one row per caller
+        present = [p is not None for p in predictions]
+        old_mask = np.asarray(previous.prediction_mask)[old_rows] if previous is not None else np.empty(0, dtype=bool)
+        _save(tmp / "p_mask.npy", np.concatenate([old_mask, np.array(present, dtype=bool)])[row_gather])
+        for field, kind in PREDICTION_FIELDS.items():
+            new = encode_column(kind, [p.get(field) if p is not None else None for p in predictions])
+            old = previous.predictions[field] if previous is not None else None
+            if old is not None:
+                old = {suffix: (array if suffix == ".values" else np.asarray(array)[old_rows]) for suffix, array in old.items()}
+            _save_columns(tmp, f"p_{field}", self._combine(kind, old, new, row_gather, len(old_rows)))
+
+        state = {**state, "seq": seq, "callers": len(all_callers), "records": int(lengths.sum())}
+        with open(tmp / "state.json", "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        final = self.directory / name
+        shutil.rmtree(final, ignore_errors=True)  # Left over from a write that never became LATEST
+        os.replace(tmp, final)
+        latest_tmp = self.directory / "LATEST.tmp"
+        latest_tmp.write_text(name)
+        os.replace(latest_tmp, self.directory / "LATEST")
+
+        self.current = Snapshot(final)
+        self._prune()
+        return self.current
+
+    def update_state(self, state: dict):
+        """Replace state.json of the current snapshot (used when no caller changed)"""
+        current = self.current
+        state = {**state, "seq": current.seq, "callers": current.state["callers"], "records": current.state["records"]}
+        tmp = current.path / "state.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, current.path / "state.json")
+        current.state = state
+
+    @staticmethod
+    def _combine(kind: str, old: Optional[Dict[str, np.ndarray]], new: Dict[str, np.ndarray],
+                 gather: np.ndarray, old_rows: int) -> Dict[str, np.ndarray]:
+        if old is None or old_rows == 0:
+            old = {suffix: array[:0] for suffix, array in new.items()}
+            if kind == "str":
+                old = {".codes": np.empty(0, dtype=np.int32), ".values": np.empty(0, dtype="S1")}
+        if kind == "str":
+            return _merge_strings(old, new, gather)
+        old_values = np.asarray(old[""])
+        new_values = new[""]
+        if new_values.ndim > 1 and new_values.shape[1] == 0 and old_values.shape[1] > 0:
+            # Only missing vectors among the new rows
+            new_values = np.zeros((len(new_values), old_values.shape[1]), dtype=new_values.dtype)
+        return {"": np.concatenate([old_values, new_values])[gather]}
+
+    def _prune(self):
+        """Keep the newest snapshots; deleting a still-mapped one may fail on Windows, retried next time"""
+        snapshots = sorted(self.directory.glob("snapshot-*"))
+        for path in snapshots[:-KEEP_SNAPSHOTS]:
+            try:
+                shutil.rmtree(path)
+            except OSError:
+                pass
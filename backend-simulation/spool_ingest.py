@@ -0,0 +1,307 @@
+"""
+Ingest CDR files dropped into a spool directory
+
+Switches write rotating CSV files (the data/call_data.csv schema) into a
+directory. The ingestor polls it, reads new bytes of every *.csv file in large
+chunks (only complete lines), parses each chunk with one pandas read_csv call
+and feeds the rows to simulator.process_batch. Reading and parsing run on
+their own thread, one chunk ahead of scoring.
+
+Per-file byte offsets are checkpointed to a JSON file (atomically) after every
+batch, so a restart resumes at the first unprocessed line. A file is tracked
+by name and inode: a file replaced under the same name, or truncated below
+its offset, is read again from the start. A file that is deleted or rotated
+away is forgotten only once every chunk already read from it is scored and
+checkpointed.
+
+Usage:
+    python spool_ingest.py /var/spool/cdr
+    python spool_ingest.py /var/spool/cdr --shards 4 --once
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+import metrics
+from replay import COLUMNS
+
+CHECKPOINT_NAME = ".satark-offsets.json"
+
+# (file name, inode, start offset, end offset, offset after each row, cdrs)
+Chunk = Tuple[str, int, int, int, np.ndarray, List[dict]]
+
+def parse_chunk(data: bytes, header: List[str]) -> Tuple[np.ndarray, List[dict]]:
+    """
+    Parse complete CSV lines; returns the byte offset just past each kept
+    row (relative to data) and the rows as CDR dicts
+    """
+    line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")) + 1
+    frame = pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        names=header,
+        usecols=COLUMNS,
+        dtype={"caller_id": str, "receiver_id": str, "origin_region": str, "target_region": str},
+        skip_blank_lines=False  # Keep row i == line i so offsets stay exact
+    )
+    keep = frame["caller_id"].notna().to_numpy()
+    frame = frame[keep]
+    timestamps = pd.to_datetime(frame["timestamp"], format="ISO8601")
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert(None)  # Same wall clock as replay.py
+    cdrs = [
+        {
+            "caller_id": caller,
+            "destination": receiver,
+            "duration": duration,
+            "timestamp": ts,
+            "origin_region": origin,
+            "target_region": target
+        }
+        for caller, receiver, duration, ts, origin, target in zip(
+            frame["caller_id"].tolist(),
+            frame["receiver_id"].tolist(),
+            frame["call_duration"].tolist(),
+            timestamps.dt.to_pydatetime().tolist(),
+            frame["origin_region"].tolist(),
+            frame["target_region"].tolist()
+        )
+    ]
+    return line_ends[keep], cdrs
+
+class SpoolIngestor:
+    def __init__(self, simulator, directory: Path, checkpoint: Path = None, chunk_bytes: int = 8 * 1024 * 1024,
+                 batch_size: int = 2000, poll_interval: float = 1.0, pattern: str = "*.csv"):
+        """
+        Args:
+            simulator: FraudSimulator or ShardedSimulator (must be warmed up)
+            directory: Spool directory to watch
+            checkpoint: Offsets file (default: <directory>/.satark-offsets.json)
+            chunk_bytes: Bytes read and parsed at once per file
+            batch_size: CDRs per process_batch call (and per checkpoint)
+            poll_interval: Seconds to wait when no file has new data
+        """
+        self.simulator = simulator
+        self.directory = Path(directory)
+        self.checkpoint = Path(checkpoint) if checkpoint else self.directory / CHECKPOINT_NAME
+        self.chunk_bytes = chunk_bytes
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.pattern = pattern
+        self.files: Dict[str, dict] = {}
+        if self.checkpoint.exists():
+            self.files = json.loads(self.checkpoint.read_text())["files"]
+        self._files_lock = threading.Lock()  # Shared by the reader thread and checkpoints
+        self.cdrs = 0
+        self.bytes = 0
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ==========================================
+    # Reading
+    # ==========================================
+
+    def _state(self, path: Path, stat, reading: Dict[str, int]) -> dict:
+        """Offset state of a file, reset if it was replaced or truncated"""
+        state = self.files.get(path.name)
+        if state is None or state["inode"] != stat.st_ino or stat.st_size < reading.get(path.name, state["offset"]):
+            if state is not None:
+                print(f"⚠️  Spool: {path.name} was replaced or truncated, reading it from the start")
+            state = {"inode": stat.st_ino, "offset": 0, "header": None}
+            with self._files_lock:
+                self.files[path.name] = state
+            reading.pop(path.name, None)
+        return state
+
+    def _read_new(self, path: Path, state: dict, reading: Dict[str, int]) -> Optional[Chunk]:
+        """Next chunk of complete lines after what has been read so far"""
+        start = offset = reading.get(path.name, state["offset"])
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(self.chunk_bytes)
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            if len(data) == self.chunk_bytes:
+                raise ValueError(f"{path.name}: line longer than chunk_bytes at offset {offset}")
+            return None  # Only a partial line so far
+        data = data[:end]
+        if start == 0:
+            # The header may have been read ahead but not checkpointed past yet
+            newline = data.index(b"\n") + 1
+            with self._files_lock:
+                state["header"] = data[:newline].decode("utf-8").strip().split(",")
+            offset += newline
+            data = data[newline:]
+        end = offset + len(data)
+        reading[path.name] = end
+        if not data:
+            return path.name, state["inode"], start, end, np.empty(0, dtype=np.int64), []
+        line_ends, cdrs = parse_chunk(data, state["header"])
+        return path.name, state["inode"], start, end, offset + line_ends, cdrs
+
+    def _chunks(self, once: bool) -> Iterator[Chunk]:
+        """Yield parsed chunks of every file in name order until stopped"""
+        reading: Dict[str, int] = {}  # Read-ahead offsets, past the checkpointed ones
+        while not self._stop.is_set():
+            found = False
+            present = set()
+            for path in sorted(self.directory.glob(self.pattern)):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                present.add(path.name)
+                state = self._state(path, stat, reading)
+                if stat.st_size <= reading.get(path.name, state["offset"]):
+                    continue
+                chunk = self._read_new(path, state, reading)
+                if chunk is not None:
+                    found = True
+                    yield chunk
+            with self._files_lock:
+                for name in set(self.files) - present:
+                    # Rotated away: forget it, unless chunks read from it are still being scored
+                    if self.files[name]["offset"] >= reading.get(name, 0):
+                        self.files.pop(name)
+                        reading.pop(name, None)
+            if not found:
+                if once:
+                    return
+                self._stop.wait(self.poll_interval)
+
+    def _prefetch(self, once: bool) -> Iterator[Chunk]:
+        """Run _chunks on a reader thread, one chunk ahead of scoring"""
+        chunks = queue.Queue(maxsize=1)
+        done = object()
+
+        def read():
+            try:
+                for chunk in self._chunks(once):
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            chunks.put(done)
+
+        reader = threading.Thread(target=read, name="spool-reader", daemon=True)
+        reader.start()
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # ==========================================
+    # Scoring and checkpoints
+    # ==========================================
+
+    def _save_checkpoint(self):
+        with self._files_lock:
+            data = json.dumps({"files": self.files})
+        tmp = self.checkpoint.with_name(self.checkpoint.name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+
+    def run(self, once: bool = False):
+        """Ingest until stop() (or, with once=True, until no file has new data)"""
+        self.started = time.perf_counter()
+        for name, inode, start, end, offsets, cdrs in self._prefetch(once):
+            # _chunks keeps a deleted file's state until its read chunks are checkpointed,
+            # so a missing or different state means the file was replaced under its name
+            state = self.files.get(name)
+            if state is None or state["inode"] != inode:
+                continue
+            for begin in range(0, len(cdrs), self.batch_size):
+                if self._stop.is_set():
+                    return
+                batch = cdrs[begin:begin + self.batch_size]
+                self.simulator.process_batch(batch)
+                # Checkpoint right after each batch: a crash in between re-feeds at most this batch
+                state["offset"] = int(offsets[begin + len(batch) - 1])
+                self._save_checkpoint()
+                self.cdrs += len(batch)
+                if metrics.ENABLED:
+                    metrics.registry.inc(
+                        "satark_spool_cdrs_total", len(batch), help_text="CDRs ingested from the spool directory"
+                    )
+            if state["offset"] < end:
+                state["offset"] = end  # Header and blank lines after the last row
+                self._save_checkpoint()
+            self.bytes += end - start
+
+    def start(self):
+        """Run on a background thread (used by the API server)"""
+        self._thread = threading.Thread(target=self._run_quietly, name="spool-ingestor", daemon=True)
+        self._thread.start()
+
+    def _run_quietly(self):
+        try:
+            self.run()
+        except Exception as e:
+            print(f"⚠️  Spool ingestion stopped: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "directory": str(self.directory),
+            "files": len(self.files),
+            "cdrs": self.cdrs,
+            "bytes": self.bytes,
+            "elapsed_s": elapsed,
+            "cdrs_per_sec": self.cdrs / elapsed if elapsed else 0.0
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest CDR CSV files from a spool directory")
+    parser.add_argument("directory")
+    parser.add_argument("--checkpoint", help=f"Offsets file (default: <directory>/{CHECKPOINT_NAME})")
+    parser.add_argument("--chunk-mb", type=float, default=8.0, help="MB read and parsed at once")
+    parser.add_argument("--batch-size", type=int, default=2000, help="CDRs per process_batch call")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between directory scans when idle")
+    parser.add_argument("--once", action="store_true", help="Exit when every file is fully ingested")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("SATARK_SHARDS", "1")))
+    args = parser.parse_args()
+
+    if args.shards > 1:
+        from sharded_simulator import ShardedSimulator
+        simulator = ShardedSimulator(args.shards)
+    else:
+        from simulator import FraudSimulator
+        simulator = FraudSimulator()
+    simulator.warm_up()
+
+    ingestor = SpoolIngestor(
+        simulator, Path(args.directory),
+        checkpoint=args.checkpoint,
+        chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+        batch_size=args.batch_size,
+        poll_interval=args.poll
+    )
+    try:
+        ingestor.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+    print(json.dumps(ingestor.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
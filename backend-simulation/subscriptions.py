@@ -0,0 +1,103 @@
+"""
+Server-side subscription filters for /ws/threat-stream
+
+Clients send a JSON text message such as:
+
+    {
+        "type": "subscribe",
+        "min_risk_score": 70,
+        "event_types": ["Fraud"],
+        "fraud_types": ["Wangiri", "KYC Phishing"],
+        "cluster_ids": ["cluster_101"],      # "*" = any cluster-linked event
+        "regions": ["Mumbai"]
+    }
+
+Every field is optional; an empty subscription receives every event. Filters
+are normalised into a hashable key so clients with identical subscriptions
+share one compiled predicate, evaluated once per event.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+ANY_CLUSTER = "*"
+_LIST_FIELDS = {
+    "event_types": "type",
+    "fraud_types": "fraud_type",
+    "cluster_ids": "cluster_id",
+    "regions": "location"
+}
+
+class Subscription:
+    """A normalised filter with its compiled predicate"""
+    def __init__(self, key: Tuple):
+        self.key = key
+        self.predicate = _compile(key)
+
+    def matches(self, event: dict) -> bool:
+        return self.predicate is None or self.predicate(event)
+
+    def apply(self, events: List[dict]) -> List[dict]:
+        if self.predicate is None:
+            return events
+        predicate = self.predicate
+        return [e for e in events if predicate(e)]
+
+def _compile(key: Tuple) -> Optional[Callable[[dict], bool]]:
+    """Build one closure per active field, cheapest (numeric) check first"""
+    checks = []
+    for name, value in key:
+        if name == "min_risk_score":
+            checks.append(lambda e, v=value: e.get("risk_score", 0) >= v)
+        elif name == "cluster_ids" and ANY_CLUSTER in value:
+            checks.append(lambda e: e.get("cluster_id") is not None)
+        else:
+            field = _LIST_FIELDS[name]
+            checks.append(lambda e, f=field, allowed=value: e.get(f) in allowed)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda e: all(check(e) for check in checks)
+
+def subscription_key(message: Dict) -> Tuple:
+    """Normalise a subscribe message into a hashable key (raises ValueError)"""
+    key = []
+    if message.get("min_risk_score") is not None:
+        try:
+            key.append(("min_risk_score", float(message["min_risk_score"])))
+        except (TypeError, ValueError):
+            raise ValueError("min_risk_score must be a number")
+    for name in _LIST_FIELDS:
+        values = message.get(name)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            raise ValueError(f"{name} must be a list")
+        if values:
+            key.append((name, frozenset(str(v) for v in values)))
+    return tuple(key)
+
+class SubscriptionRegistry:
+    """Shares one Subscription per distinct key and tracks how many clients use it"""
+    def __init__(self):
+        self.subscriptions: Dict[Tuple, Subscription] = {}
+        self.refcounts: Dict[Tuple, int] = {}
+        self.default = self.acquire(())
+
+    def acquire(self, key: Tuple) -> Subscription:
+        subscription = self.subscriptions.get(key)
+        if subscription is None:
+            subscription = Subscription(key)
+            self.subscriptions[key] = subscription
+            self.refcounts[key] = 0
+        self.refcounts[key] += 1
+        return subscription
+
+    def release(self, subscription: Subscription):
+        key = subscription.key
+        if key not in self.refcounts:
+            return
+        self.refcounts[key] -= 1
+        if self.refcounts[key] <= 0 and key != ():
+            del self.refcounts[key]
+            del self.subscriptions[key]
@@ -0,0 +1,122 @@
+"""
+Vectorized synthetic CDR source for the demo threat stream
+
+Callers, destinations and regions are pre-generated once; events are then
+drawn in bulk with NumPy. Caller activity is heavy-tailed (Pareto weights), so
+a small set of callers places most calls and their features build up exactly
+as they would in production. A small fraction of callers behave like
+fraudsters (short calls, night hours, many target regions): their calls are
+timestamped inside the most recent 22:00-06:00 local night, never after now.
+"""
+import itertools
+import os
+import time
+import numpy as np
+
+NIGHT_START = 22  # Same night window as src/feature_kernel.py
+NIGHT_HOURS = 8
+
+class SyntheticTrafficSource:
+    def __init__(self,
+                 n_callers: int = 50000,
+                 n_destinations: int = 200000,
+                 n_regions: int = 60,
+                 fraud_ratio: float = 0.02,
+                 activity_alpha: float = 1.2,
+                 seed: int = None):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+
+        # Indian mobile numbers: 10 digits starting with 6-9
+        self.callers = self._numbers(n_callers)
+        self.destinations = self._numbers(n_destinations)
+        self.regions = np.array(self._region_pool(n_regions), dtype=object)
+
+        # Heavy-tailed activity: sample callers through the CDF of Pareto weights
+        weights = rng.pareto(activity_alpha, n_callers) + 1
+        self.activity_cdf = np.cumsum(weights / weights.sum())
+        self.home_region = rng.integers(0, len(self.regions), n_callers)
+        self.is_fraudster = rng.random(n_callers) < fraud_ratio
+
+        # Event ids: random per-process prefix + counter (no uuid4 per event)
+        self._event_prefix = os.urandom(4).hex()
+        self._event_counter = itertools.count(1)
+
+    def _numbers(self, n: int) -> np.ndarray:
+        first = self.rng.integers(6, 10, n)
+        rest = self.rng.integers(0, 10**9, n)
+        return (first * 10**9 + rest).astype(str).astype(object)
+
+    def _region_pool(self, n: int) -> list:
+        """Unique en_IN city names, generated once"""
+        from faker import Faker
+        fake = Faker('en_IN')
+        fake.seed_instance(int(self.rng.integers(0, 2**31)))
+        cities = []
+        seen = set()
+        for _ in range(n * 20):
+            city = fake.city()
+            if city not in seen:
+                seen.add(city)
+                cities.append(city)
+                if len(cities) == n:
+                    break
+        return cities
+
+    def next_event_id(self) -> str:
+        return f"{self._event_prefix}-{next(self._event_counter):x}"
+
+    def draw(self, size: int, now: float = None) -> list:
+        """Draw `size` CDRs (same schema as POST /api/cdr) in one vectorized pass"""
+        rng = self.rng
+        now = time.time() if now is None else now
+
+        callers = np.searchsorted(self.activity_cdf, rng.random(size))
+        callers = np.minimum(callers, len(self.callers) - 1)
+        fraud = self.is_fraudster[callers]
+
+        durations = np.where(
+            fraud,
+            rng.exponential(4.0, size),
+            np.maximum(0, rng.normal(160, 60, size))
+        ).round(2)
+
+        home = self.home_region[callers]
+        n_regions = len(self.regions)
+        roaming = rng.random(size) < np.where(fraud, 0.6, 0.1)
+        origin = np.where(roaming, rng.integers(0, n_regions, size), home)
+        target = np.where(
+            rng.random(size) < np.where(fraud, 0.9, 0.2),
+            rng.integers(0, n_regions, size),
+            origin
+        )
+
+        destinations = rng.integers(0, len(self.destinations), size)
+
+        # Local wall clock, as FeatureExtractor reads epoch timestamps with datetime.fromtimestamp
+        local = time.localtime(now)
+        midnight = now - (local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec)
+        night_start = midnight + NIGHT_START * 3600
+        if night_start > now:
+            night_start -= 86400
+        timestamps = np.where(
+            fraud,
+            np.minimum(now, night_start + rng.random(size) * NIGHT_HOURS * 3600),
+            now
+        )
+
+        caller_ids = self.callers[callers]
+        destination_ids = self.destinations[destinations]
+        origin_names = self.regions[origin]
+        target_names = self.regions[target]
+        return [
+            {
+                "caller_id": caller_ids[i],
+                "destination": destination_ids[i],
+                "duration": float(durations[i]),
+                "timestamp": float(timestamps[i]),
+                "origin_region": origin_names[i],
+                "target_region": target_names[i]
+            }
+            for i in range(size)
+        ]
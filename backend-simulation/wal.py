@@ -0,0 +1,241 @@
+"""
+Write-ahead log of raw CDRs
+
+Every CDR is appended here before it is processed. Records are numbered with
+a log sequence number (LSN); snapshots store the LSN they include, so startup
+replays only the records after it, and segments entirely covered by a
+snapshot are deleted.
+
+Group commit: appends only add framed records to an in-memory buffer. A single
+flusher thread writes everything buffered so far with one write + fsync and
+then wakes all waiters, so while one fsync is in flight the next batch
+accumulates and the fsync cost is shared by every CDR in it.
+
+Segment files are named by their first LSN ({first_lsn:020d}.wal). Each record
+is framed as <payload length u32><crc32 u32><lsn u64><json payload>; a torn
+or corrupt tail (crash mid-write) is truncated on open.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from metrics import ENABLED as METRICS_ENABLED, registry as metrics_registry
+
+HEADER = struct.Struct("<IIQ")
+
+# SATARK_WAL_SEGMENT_MB: segment size; SATARK_WAL_COMMIT_DELAY_MS: extra time to grow each group
+DEFAULT_SEGMENT_BYTES = int(float(os.environ.get("SATARK_WAL_SEGMENT_MB", "64")) * 1024 * 1024)
+DEFAULT_COMMIT_DELAY = float(os.environ.get("SATARK_WAL_COMMIT_DELAY_MS", "0")) / 1000
+
+commit_histogram = metrics_registry.histogram(
+    "satark_wal_commit_seconds", "Time to write and fsync one WAL group commit"
+)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()  # FeatureExtractor.add_cdr parses it back with fromisoformat
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def encode_record(cdr: dict) -> bytes:
+    return json.dumps(cdr, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+def _read_segment(path: Path) -> Iterator[Tuple[int, bytes, int]]:
+    """Yield (lsn, payload, end offset) for every intact record, stopping at the first bad one"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc, lsn = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield lsn, payload, offset
+
+class WriteAheadLog:
+    def __init__(self, directory: Path, start_after: int = 0,
+                 segment_bytes: int = DEFAULT_SEGMENT_BYTES, commit_delay: float = DEFAULT_COMMIT_DELAY):
+        """
+        Args:
+            directory: Segment directory (created if missing)
+            start_after: Number new records after this LSN at least (the restored
+                         snapshot's LSN, in case the log was lost or deleted)
+            segment_bytes: Start a new segment once the current one is this large
+            commit_delay: Extra seconds the flusher waits to grow a group (0 = commit
+                          as soon as the previous fsync finishes)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.commit_delay = commit_delay
+
+        recovered_lsn = self._recover_tail()
+        last_lsn = max(recovered_lsn, start_after)
+        self.appended_lsn = last_lsn
+        self.durable_lsn = last_lsn
+        self.commits = 0
+        self.committed_records = 0
+        self.error: Optional[BaseException] = None
+
+        segments = self.segments()
+        if segments and recovered_lsn >= start_after:
+            self._segment_path = segments[-1][1]
+        else:
+            self._segment_path = self._segment_name(last_lsn + 1)
+        self._file = open(self._segment_path, "ab")
+
+        self._buffer: List[bytes] = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def _segment_name(self, first_lsn: int) -> Path:
+        return self.directory / f"{first_lsn:020d}.wal"
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        """(first lsn, path) of every segment, oldest first"""
+        return sorted((int(p.stem), p) for p in self.directory.glob("*.wal"))
+
+    def _recover_tail(self) -> int:
+        """Truncate a torn tail of the newest segment; returns the last intact LSN"""
+        segments = self.segments()
+        if not segments:
+            return 0
+        first_lsn, path = segments[-1]
+        last_lsn, end = first_lsn - 1, 0
+        for lsn, _, offset in _read_segment(path):
+            last_lsn, end = lsn, offset
+        if end < path.stat().st_size:
+            print(f"⚠️  WAL: truncating {path.stat().st_size - end} bytes of torn tail in {path.name}")
+            with open(path, "r+b") as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+        return last_lsn
+
+    # ==========================================
+    # Appending
+    # ==========================================
+
+    def append(self, cdrs: List[dict]) -> int:
+        """Buffer records for the next group commit; returns the LSN of the last one"""
+        payloads = [encode_record(cdr) for cdr in cdrs]
+        with self._cond:
+            if self.error is not None:
+                raise RuntimeError(f"WAL unavailable: {self.error!r}")
+            lsn = self.appended_lsn
+            for payload in payloads:
+                lsn += 1
+                self._buffer.append(HEADER.pack(len(payload), zlib.crc32(payload), lsn))
+                self._buffer.append(payload)
+            self.appended_lsn = lsn
+            self._cond.notify_all()
+        return lsn
+
+    def wait_durable(self, lsn: int, timeout: float = 30.0):
+        """Block until every record up to lsn is fsynced"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.durable_lsn >= lsn or self.error is not None, timeout):
+                raise TimeoutError(f"WAL commit of LSN {lsn} timed out")
+            if self.durable_lsn < lsn:
+                raise RuntimeError(f"WAL unavailable: {self.error!r}")
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._buffer or self._closed)
+                if not self._buffer and self._closed:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._cond:
+                chunks, self._buffer = self._buffer, []
+                target = self.appended_lsn
+
+            started = time.perf_counter_ns()
+            try:
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                if self._file.tell() >= self.segment_bytes:
+                    self._rotate(target + 1)
+            except OSError as e:
+                with self._cond:
+                    self.error = e
+                    self._cond.notify_all()
+                print(f"⚠️  WAL write failed: {e}")
+                return
+            if METRICS_ENABLED:
+                commit_histogram.observe(time.perf_counter_ns() - started)
+
+            with self._cond:
+                self.commits += 1
+                self.committed_records += target - self.durable_lsn
+                self.durable_lsn = target
+                self._cond.notify_all()
+
+    def _rotate(self, next_lsn: int):
+        self._file.close()
+        self._segment_path = self._segment_name(next_lsn)
+        self._file = open(self._segment_path, "ab")
+        # Make the new directory entry durable
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # ==========================================
+    # Recovery and truncation
+    # ==========================================
+
+    def replay(self, after_lsn: int = 0) -> Iterator[Tuple[int, dict]]:
+        """Yield (lsn, cdr) for every durable record with lsn > after_lsn, in order"""
+        segments = self.segments()
+        for i, (first_lsn, path) in enumerate(segments):
+            next_first = segments[i + 1][0] if i + 1 < len(segments) else None
+            if next_first is not None and next_first <= after_lsn + 1:
+                continue  # Entirely covered
+            for lsn, payload, _ in _read_segment(path):
+                if lsn > after_lsn:
+                    yield lsn, json.loads(payload)
+
+    def truncate(self, upto_lsn: int) -> int:
+        """Delete segments whose records all have lsn <= upto_lsn; returns how many"""
+        segments = self.segments()
+        removed = 0
+        for (first_lsn, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first - 1 > upto_lsn or path == self._segment_path:
+                break
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                break
+        return removed
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "bytes": sum(path.stat().st_size for _, path in segments if path.exists()),
+            "appended_lsn": self.appended_lsn,
+            "durable_lsn": self.durable_lsn,
+            "commits": self.commits,
+            "avg_records_per_commit": self.committed_records / self.commits if self.commits else 0.0
+        }
+
+    def close(self):
+        """Flush what is buffered and stop the flusher"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join(timeout=10)
+        self._file.close()
@@ -1,17 +1,185 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Awaitable, Callable, Dict
+import asyncio
+from metrics import registry as metrics_registry
+from wire_format import make_encoders, resolve_encoding
+from subscriptions import Subscription, SubscriptionRegistry, subscription_key
+
+class ClientConnection:
+    """A connected WebSocket with its own bounded outgoing queue and sender task"""
+    def __init__(self, websocket: WebSocket, queue_size: int, encoding: str, subscription: Subscription):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.subscription = subscription
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: asyncio.Task = None
+        self.sent = 0
+        self.dropped = 0
+        self.consecutive_drops = 0
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Single-producer broadcast hub.
+
+    The producer builds each tick once and broadcast() serialises it once per
+    encoding in use (see wire_format.py), then only enqueues the message on
+    every client's bounded queue. Clients with identical subscription filters
+    share one filtered view per tick (see subscriptions.py). Each client has its own sender task, so a
+    slow socket never stalls the others. When a queue is full the oldest
+    message is dropped; a client that keeps falling behind is disconnected.
+    """
+    def __init__(self, queue_size: int = 32, max_consecutive_drops: int = 64, send_timeout: float = 5.0):
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.encoders = make_encoders()
+        self.subscriptions = SubscriptionRegistry()
+        self.last_payload: dict = None
+        self.queue_size = queue_size
+        self.max_consecutive_drops = max_consecutive_drops
+        self.send_timeout = send_timeout
+        self.total_sent = 0
+        self.total_dropped = 0
+        self.slow_disconnects = 0
+        self.ticks = 0
+        self.producer_errors = 0
+        self.bytes_encoded: Dict[str, int] = {name: 0 for name in self.encoders}
+        self.events_filtered = 0
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, encoding: str = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        encoding = resolve_encoding(encoding, self.encoders)
+        client = ClientConnection(websocket, self.queue_size, encoding, self.subscriptions.acquire(()))
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self.clients[websocket] = client
+
+        # Stateful encodings start new clients from a full-state keyframe
+        if self.last_payload is not None:
+            snapshot = self.encoders[encoding].snapshot(self.last_payload.get("stats", {}))
+            if snapshot is not None:
+                self._enqueue(client, snapshot)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.subscriptions.release(client.subscription)
+        if client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+
+    def subscribe(self, websocket: WebSocket, message: dict):
+        """Replace a client's filter with the one in a subscribe message (raises ValueError)"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        key = subscription_key(message)
+        if key == client.subscription.key:
+            return
+        subscription = self.subscriptions.acquire(key)
+        self.subscriptions.release(client.subscription)
+        client.subscription = subscription
+
+    def broadcast(self, payload: dict):
+        """
+        Filter payload once per distinct subscription and encode it once per
+        (subscription, encoding) in use, then enqueue it for every client (never blocks)
+        """
+        self.last_payload = payload
+        events = payload.get("events", [])
+        filtered = {}
+        encoded = {}
+        for client in list(self.clients.values()):
+            subscription = client.subscription
+            view = filtered.get(subscription.key)
+            if view is None:
+                view = subscription.apply(events)
+                filtered[subscription.key] = view
+                self.events_filtered += len(events) - len(view)
+
+            cache_key = (subscription.key, client.encoding)
+            message = encoded.get(cache_key)
+            if message is None:
+                message = self.encoders[client.encoding].encode(payload, view)
+                encoded[cache_key] = message
+                self.bytes_encoded[client.encoding] += len(message)
+            self._enqueue(client, message)
+
+    def _enqueue(self, client: ClientConnection, message):
+        if client.queue.full():
+            # Drop the oldest pending message to make room for the newest
+            client.queue.get_nowait()
+            client.dropped += 1
+            client.consecutive_drops += 1
+            self.total_dropped += 1
+            if client.consecutive_drops > self.max_consecutive_drops:
+                self.slow_disconnects += 1
+                self.disconnect(client.websocket)
+                asyncio.create_task(self._close(client.websocket))
+                return
+        client.queue.put_nowait(message)
+
+    async def _send_loop(self, client: ClientConnection):
+        websocket = client.websocket
+        try:
+            while True:
+                message = await client.queue.get()
+                if isinstance(message, bytes):
+                    send = websocket.send_bytes(message)
+                else:
+                    send = websocket.send_text(message)
+                await asyncio.wait_for(send, self.send_timeout)
+                client.sent += 1
+                client.consecutive_drops = 0
+                self.total_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(websocket)
+            await self._close(websocket)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def run_producer(self, produce: Callable[[], Awaitable[dict]], interval: float = 1.0):
+        """
+        Call produce() once per tick while clients are connected and broadcast
+        the result. A failing tick is logged and counted; the stream keeps going.
+        """
+        while True:
+            if self.clients:
+                try:
+                    payload = await produce()
+                    self.ticks += 1
+                    self.broadcast(payload)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.producer_errors += 1
+                    metrics_registry.inc(
+                        "satark_ws_producer_errors_total", help_text="Threat stream ticks that raised an exception"
+                    )
+                    print(f"⚠️  Threat stream tick failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(interval)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    def metrics(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "connections_by_encoding": {
+                name: sum(1 for c in self.clients.values() if c.encoding == name)
+                for name in self.encoders
+            },
+            "bytes_encoded": dict(self.bytes_encoded),
+            "distinct_subscriptions": len({c.subscription.key for c in self.clients.values()}),
+            "events_filtered": self.events_filtered,
+            "ticks": self.ticks,
+            "producer_errors": self.producer_errors,
+            "messages_sent": self.total_sent,
+            "messages_dropped": self.total_dropped,
+            "slow_consumer_disconnects": self.slow_disconnects,
+            "queued": sum(c.queue.qsize() for c in self.clients.values())
+        }
@@ -0,0 +1,214 @@
+"""
+Wire encodings for the /ws/threat-stream WebSocket
+
+json    - default, one JSON object per tick: {"events": [...], "stats": {...}}
+compact - binary columnar frame per tick (all integers little-endian):
+
+    header   uint8 version, uint8 flags (bit 0 = keyframe), uint32 seq,
+             float64 base_timestamp, uint32 first_event_id, uint16 n_events
+    stats    uint8 n, then n x (uint8 key index into STATS_KEYS, int64 value)
+             only the keys that changed since the previous frame,
+             all keys on keyframes
+    strings  uint16 n, then n x (uint8 length, utf-8 bytes)
+    columns  n_events values each, in this order:
+             uint16  event id offset from first_event_id
+             int32   timestamp offset from base_timestamp (ms)
+             float32 duration
+             uint16  risk_score x 100
+             uint8   flags (bit 0 = fraud)
+             uint16  string index of source, destination, location,
+                     cluster_id, fraud_type (0xFFFF = null)
+
+Event ids are small integers assigned per tick: first_event_id + offset.
+Offsets are not contiguous when a subscription filter (subscriptions.py)
+removes events from the frame.
+"""
+import json
+import struct
+from typing import Dict, List, Optional
+
+COMPACT_VERSION = 1
+FLAG_KEYFRAME = 0x01
+NULL_STRING = 0xFFFF
+
+STATS_KEYS = [
+    "total_calls",
+    "blocked_threats",
+    "active_campaigns_count",
+    "total_fraud_detected"
+]
+STRING_COLUMNS = ["source", "destination", "location", "cluster_id", "fraud_type"]
+
+_HEADER = struct.Struct("<BBIdIH")
+_STAT = struct.Struct("<Bq")
+
+class JsonEncoder:
+    """Default encoding: the batch as a JSON text frame"""
+    def encode(self, batch: dict, events: List[dict] = None) -> str:
+        if events is None:
+            return json.dumps(batch)
+        return json.dumps({"events": events, "stats": batch.get("stats", {})})
+
+    def snapshot(self, stats: dict):
+        return None
+
+class CompactEncoder:
+    """
+    Stateful binary encoder shared by every compact client.
+
+    Event ids and the stats delta are computed once per tick (the first time a
+    batch is seen), so every filtered view of the same tick shares them. Stats
+    changes carry the new absolute value, so a client that misses a frame only
+    loses values until they next change or the next keyframe.
+    """
+    def __init__(self, keyframe_interval: int = 30):
+        self.keyframe_interval = keyframe_interval
+        self.seq = -1
+        self.next_event_id = 1
+        self.last_stats: Dict[str, int] = {}
+        self._tick_batch = None
+        self._tick_first_id = 0
+        self._tick_offsets: Dict[int, int] = {}
+        self._tick_keyframe = False
+        self._tick_stats = b""
+
+    def _begin_tick(self, batch: dict):
+        self._tick_batch = batch
+        self.seq += 1
+        self._tick_keyframe = self.seq % self.keyframe_interval == 0
+        events = batch.get("events", [])
+        self._tick_first_id = self.next_event_id
+        self._tick_offsets = {id(e): i for i, e in enumerate(events)}
+        self.next_event_id += len(events)
+        self._tick_stats = self._stats_section(batch.get("stats", {}), self._tick_keyframe)
+
+    def encode(self, batch: dict, events: List[dict] = None) -> bytes:
+        if batch is not self._tick_batch:
+            self._begin_tick(batch)
+        if events is None:
+            events = batch.get("events", [])
+        return self._frame(events, self._tick_stats, self._tick_keyframe, self._tick_first_id, self._tick_offsets)
+
+    def snapshot(self, stats: dict) -> bytes:
+        """Keyframe with full stats and no events, sent to newly connected clients"""
+        return self._frame([], self._stats_section(stats, True), True, self.next_event_id, {})
+
+    def _stats_section(self, stats: dict, keyframe: bool) -> bytes:
+        changed = []
+        for index, key in enumerate(STATS_KEYS):
+            value = int(stats.get(key, 0))
+            if keyframe or self.last_stats.get(key) != value:
+                changed.append(_STAT.pack(index, value))
+            self.last_stats[key] = value
+        return struct.pack("<B", len(changed)) + b"".join(changed)
+
+    def _frame(self, events: List[dict], stats_section: bytes, keyframe: bool,
+               first_id: int, offsets: Dict[int, int]) -> bytes:
+        base_ts = events[0]["timestamp"] if events else 0.0
+        parts = [_HEADER.pack(
+            COMPACT_VERSION,
+            FLAG_KEYFRAME if keyframe else 0,
+            max(self.seq, 0),
+            base_ts,
+            first_id,
+            len(events)
+        ), stats_section]
+
+        strings: Dict[str, int] = {}
+        string_columns = []
+        for column in STRING_COLUMNS:
+            indices = []
+            for event in events:
+                value = event.get(column)
+                if value is None:
+                    indices.append(NULL_STRING)
+                    continue
+                value = str(value)
+                if value not in strings:
+                    strings[value] = len(strings)
+                indices.append(strings[value])
+            string_columns.append(indices)
+
+        parts.append(struct.pack("<H", len(strings)))
+        for value in strings:
+            raw = value.encode("utf-8")
+            if len(raw) > 255:
+                # Cut on a character boundary so clients still get valid UTF-8
+                raw = raw[:255].decode("utf-8", "ignore").encode("utf-8")
+            parts.append(struct.pack("<B", len(raw)))
+            parts.append(raw)
+
+        n = len(events)
+        if n:
+            parts.append(struct.pack(f"<{n}H", *(offsets[id(e)] for e in events)))
+            parts.append(struct.pack(f"<{n}i", *(int(round((e["timestamp"] - base_ts) * 1000)) for e in events)))
+            parts.append(struct.pack(f"<{n}f", *(float(e.get("duration") or 0) for e in events)))
+            parts.append(struct.pack(f"<{n}H", *(min(10000, max(0, int(round(e["risk_score"] * 100)))) for e in events)))
+            parts.append(struct.pack(f"<{n}B", *(1 if e.get("type") == "Fraud" else 0 for e in events)))
+            for indices in string_columns:
+                parts.append(struct.pack(f"<{n}H", *indices))
+
+        return b"".join(parts)
+
+def decode_compact(frame: bytes) -> dict:
+    """Decode a compact frame back into {"events", "stats", "keyframe", "seq"}"""
+    version, flags, seq, base_ts, first_id, n = _HEADER.unpack_from(frame, 0)
+    if version != COMPACT_VERSION:
+        raise ValueError(f"Unsupported compact frame version: {version}")
+    offset = _HEADER.size
+
+    (n_stats,) = struct.unpack_from("<B", frame, offset)
+    offset += 1
+    stats = {}
+    for _ in range(n_stats):
+        index, value = _STAT.unpack_from(frame, offset)
+        offset += _STAT.size
+        stats[STATS_KEYS[index]] = value
+
+    (n_strings,) = struct.unpack_from("<H", frame, offset)
+    offset += 2
+    strings = []
+    for _ in range(n_strings):
+        length = frame[offset]
+        strings.append(frame[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+
+    def column(fmt: str, size: int):
+        nonlocal offset
+        values = struct.unpack_from(f"<{n}{fmt}", frame, offset)
+        offset += n * size
+        return values
+
+    events = []
+    if n:
+        ids = column("H", 2)
+        offsets = column("i", 4)
+        durations = column("f", 4)
+        risks = column("H", 2)
+        flags_col = column("B", 1)
+        string_values = [column("H", 2) for _ in STRING_COLUMNS]
+        for i in range(n):
+            event = {
+                "id": first_id + ids[i],
+                "timestamp": base_ts + offsets[i] / 1000,
+                "duration": durations[i],
+                "risk_score": risks[i] / 100,
+                "type": "Fraud" if flags_col[i] & 1 else "Legitimate"
+            }
+            for name, values in zip(STRING_COLUMNS, string_values):
+                event[name] = None if values[i] == NULL_STRING else strings[values[i]]
+            events.append(event)
+
+    return {
+        "seq": seq,
+        "keyframe": bool(flags & FLAG_KEYFRAME),
+        "events": events,
+        "stats": stats
+    }
+
+def make_encoders() -> Dict[str, object]:
+    return {"json": JsonEncoder(), "compact": CompactEncoder()}
+
+def resolve_encoding(requested: Optional[str], encoders: Dict[str, object]) -> str:
+    """Pick the negotiated encoding, falling back to json"""
+    return requested if requested in encoders else "json"
@@ -0,0 +1,97 @@
+"""
+Benchmark feature_engineering.py modes across input sizes
+
+For each size a call_data.csv is generated (fixed seed), then every mode runs
+in its own process so wall time and peak RSS are measured separately. The
+outputs must be byte-identical to the in-memory mode.
+
+Usage (from the repository root):
+    python src/bench_feature_engineering.py
+    python src/bench_feature_engineering.py --sizes 1e5 1e6 1e7 --json fe_bench.json
+    python src/bench_feature_engineering.py --sizes 1e8 --modes stream parallel --workers 16
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+
+MODES = {
+    "in-memory": [],
+    "stream": ["--stream"],
+    "parallel": []  # --workers is added from the command line
+}
+
+def run_mode(input_path: Path, output_path: Path, extra: list) -> dict:
+    """Run feature_engineering.py once; wall time and peak RSS of that process"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(SCRIPT_DIR / "feature_engineering.py"),
+         "--input", str(input_path), "--output", str(output_path), *extra],
+        stdout=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    if status != 0:
+        raise RuntimeError(f"feature_engineering.py {' '.join(extra)} failed with status {status}")
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": usage.ru_maxrss / 1024,  # KB on Linux
+        "md5": hashlib.md5(output_path.read_bytes()).hexdigest()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature engineering modes")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e5, 1e6, 5e6], help="Target row counts")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    # feature_engineering.py only runs the parallel mode with --workers > 1
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1),
+                        help="Processes for the parallel mode (at least 2)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    if "parallel" in args.modes and args.workers <= 1:
+        parser.error("the parallel mode needs --workers 2 or more")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="satark-fe-bench-") as tmp:
+        tmp = Path(tmp)
+        for size in args.sizes:
+            data = tmp / "call_data.csv"
+            subprocess.run(
+                [sys.executable, str(SCRIPT_DIR / "generate_data.py"), "--seed", "42", "--days", "30",
+                 "--start", "2026-01-31", "--rows", str(int(size)), "--output", str(data)],
+                check=True, stdout=subprocess.DEVNULL
+            )
+            rows = sum(1 for _ in open(data)) - 1
+            row = {"rows": rows, "input_mb": data.stat().st_size / 1e6, "modes": {}}
+            for mode in args.modes:
+                extra = MODES[mode]
+                if mode == "stream":
+                    extra = extra + ["--chunk-rows", str(args.chunk_rows)]
+                elif mode == "parallel":
+                    extra = extra + ["--workers", str(args.workers)]
+                row["modes"][mode] = run_mode(data, tmp / f"features_{mode}.csv", extra)
+            hashes = {m["md5"] for m in row["modes"].values()}
+            row["identical"] = len(hashes) == 1
+            results.append(row)
+
+            print(f"\n{rows:,} rows ({row['input_mb']:.0f} MB), outputs identical: {row['identical']}")
+            for mode, result in row["modes"].items():
+                print(f"  {mode:<12}{result['seconds']:>8.1f} s{result['peak_rss_mb']:>10.0f} MB peak RSS")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    if not all(row["identical"] for row in results):
+        print("[ERROR] Outputs differ between modes")
+        sys.exit(1)
+    print("\n[OK] All modes produced byte-identical caller_features.csv")
+
+if __name__ == "__main__":
+    main()
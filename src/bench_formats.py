@@ -0,0 +1,101 @@
+"""
+Compare on-disk table formats against CSV: size, load time and feature engineering time
+
+The same call_data table (fixed seed) is generated in every available
+format (see columnar.py); each is then loaded in a fresh process (cold
+Python, warm page cache) and fed to feature_engineering.py.
+
+Usage (from the repository root):
+    python src/bench_formats.py
+    python src/bench_formats.py --rows 1e7 --json formats.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+from columnar import SUFFIXES, count_rows, has_pyarrow  # noqa: E402
+
+LOAD = """
+import sys, time
+sys.path.insert(0, {src!r})
+from columnar import load_table
+started = time.perf_counter()
+df = load_table({path!r})
+# Touch every column so memory-mapped formats pay for their reads too
+for column in df.columns:
+    df[column].to_numpy().sum() if df[column].dtype.kind in "biuf" else len(df[column].unique())
+print(time.perf_counter() - started)
+"""
+
+def size_on_disk(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.iterdir())
+    return path.stat().st_size
+
+def timed_load(path: Path, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", LOAD.format(src=str(SCRIPT_DIR), path=str(path))],
+            check=True, capture_output=True, text=True
+        ).stdout
+        timings.append(float(out.strip().splitlines()[-1]))
+    return min(timings)
+
+def timed_features(path: Path, output: Path) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "feature_engineering.py"), "--input", str(path), "--output", str(output)],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark table formats against CSV")
+    parser.add_argument("--rows", type=float, default=2e6, help="Target call_data rows")
+    parser.add_argument("--repeat", type=int, default=3, help="Load timings per format (best is kept)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    formats = [fmt for fmt in SUFFIXES if fmt == "npy" or fmt == "csv" or has_pyarrow()]
+    if not has_pyarrow():
+        print("[INFO] pyarrow not installed: comparing csv and npy only")
+
+    results, rows = {}, None
+    with tempfile.TemporaryDirectory(prefix="satark-formats-") as tmp:
+        tmp = Path(tmp)
+        for fmt in formats:
+            path = tmp / f"call_data{SUFFIXES[fmt]}"
+            subprocess.run(
+                [sys.executable, str(SCRIPT_DIR / "generate_data.py"), "--seed", "42", "--days", "30",
+                 "--start", "2026-01-31", "--rows", str(int(args.rows)), "--format", fmt, "--output", str(path)],
+                check=True, stdout=subprocess.DEVNULL
+            )
+            rows = count_rows(path) or rows  # None for CSV; npy is always measured
+            results[fmt] = {
+                "bytes": size_on_disk(path),
+                "load_s": timed_load(path, args.repeat),
+                "features_s": timed_features(path, tmp / f"caller_features_{fmt}.csv")
+            }
+        outputs = {(tmp / f"caller_features_{fmt}.csv").read_bytes() for fmt in formats}
+
+    base = results["csv"]
+    print(f"\ncall_data: {rows:,} rows; caller_features identical across formats: {len(outputs) == 1}")
+    print(f"{'format':<10}{'size MB':>10}{'vs csv':>8}{'load s':>9}{'speedup':>9}{'features s':>12}{'speedup':>9}")
+    for fmt, result in results.items():
+        print(
+            f"{fmt:<10}{result['bytes'] / 1e6:>10.1f}{result['bytes'] / base['bytes']:>8.2f}"
+            f"{result['load_s']:>9.2f}{base['load_s'] / result['load_s']:>8.1f}x"
+            f"{result['features_s']:>12.2f}{base['features_s'] / result['features_s']:>8.1f}x"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps({"rows": rows, "formats": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Dependency-free part of the caller feature kernel (see feature_kernel.py):
+the feature order, the night window and CallerState, the incremental kernel
+
+Kept apart so the live backend can import it without loading numpy or pandas.
+"""
+from typing import Dict, List, Optional
+
+# Model input order (the backend passes extract_features() straight to the model)
+FEATURES = [
+    "avg_call_duration",
+    "total_calls",
+    "night_call_ratio",
+    "unique_origin_regions",
+    "unique_target_regions"
+]
+
+NIGHT_START = 22  # Night is [22:00, 06:00)
+NIGHT_END = 6
+
+def is_night_hour(hour):
+    """True for night hours; works on ints and NumPy arrays"""
+    return (hour >= NIGHT_START) | (hour < NIGHT_END)
+
+# ==========================================
+# INCREMENTAL KERNEL
+# ==========================================
+
+class CallerState:
+    """Running features of one caller; add() / remove() one call at a time"""
+    __slots__ = ("sum", "compensation", "count", "calls", "night", "origins", "targets")
+
+    def __init__(self):
+        self.sum = 0.0
+        self.compensation = 0.0
+        self.count = 0  # Calls with a duration
+        self.calls = 0  # All calls
+        self.night = 0
+        self.origins: Dict[str, int] = {}  # region -> calls, so removals know when a region is gone
+        self.targets: Dict[str, int] = {}
+
+    # add() and remove() run for every live CDR, so the checks are inlined:
+    # "x == x" is False only for NaN, and missing regions are None or NaN
+
+    def add(self, duration: Optional[float], hour: Optional[int], origin_region, target_region):
+        if duration is not None and duration == duration:
+            # Same steps as pandas' group_mean
+            y = duration - self.compensation
+            t = self.sum + y
+            compensation = t - self.sum - y
+            self.compensation = compensation if compensation == compensation else 0.0
+            self.sum = t
+            self.count += 1
+        self.calls += 1
+        if hour is not None and (hour >= NIGHT_START or hour < NIGHT_END):
+            self.night += 1
+        if origin_region is not None and origin_region == origin_region:
+            self.origins[origin_region] = self.origins.get(origin_region, 0) + 1
+        if target_region is not None and target_region == target_region:
+            self.targets[target_region] = self.targets.get(target_region, 0) + 1
+
+    def remove(self, duration: Optional[float], hour: Optional[int], origin_region, target_region):
+        """
+        Undo add() with the same arguments (a call leaving a rolling window).
+        The duration is subtracted with the same compensated step, so the mean
+        can differ from a fresh sum over the remaining calls in the last bits.
+        """
+        if duration is not None and duration == duration:
+            self.count -= 1
+            if self.count:
+                y = -duration - self.compensation
+                t = self.sum + y
+                compensation = t - self.sum - y
+                self.compensation = compensation if compensation == compensation else 0.0
+                self.sum = t
+            else:
+                self.sum = self.compensation = 0.0
+        self.calls -= 1
+        if hour is not None and (hour >= NIGHT_START or hour < NIGHT_END):
+            self.night -= 1
+        for regions, region in ((self.origins, origin_region), (self.targets, target_region)):
+            if region is not None and region == region:
+                remaining = regions[region] - 1
+                if remaining:
+                    regions[region] = remaining
+                else:
+                    del regions[region]
+
+    def features(self) -> List[float]:
+        """Values in FEATURES order (0.0 instead of NaN when there is nothing to average)"""
+        return [
+            self.sum / self.count if self.count else 0.0,
+            float(self.count),
+            self.night / self.calls if self.calls else 0.0,
+            float(len(self.origins)),
+            float(len(self.targets))
+        ]
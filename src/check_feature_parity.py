@@ -0,0 +1,88 @@
+"""
+Check that the offline and live feature paths agree (see feature_kernel.py)
+
+Computes caller features from call_data twice: with batch_features(), as
+feature_engineering.py does, and by replaying every call in file order
+through the backend's FeatureExtractor, as the live pipeline does. Every
+feature of every caller must be identical.
+
+With --window N the extractor keeps its rolling window of N calls and is
+compared with batch_features() over each caller's last N calls. Evicting a
+call subtracts its duration from the compensated sum, so avg_call_duration
+may then differ in the last bits; everything else must still be identical.
+
+Usage (from the repository root, after generate_data.py):
+    python src/check_feature_parity.py
+    python src/check_feature_parity.py --input data/call_data_large.csv --window 1000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+from columnar import find_table, load_table
+from feature_kernel import FEATURES, batch_features
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "backend-simulation"))
+from feature_extractor import FeatureExtractor  # noqa: E402
+
+COLUMNS = ["caller_id", "call_duration", "timestamp", "origin_region", "target_region"]
+
+def replay(df, window: int) -> FeatureExtractor:
+    """Feed every call to a FeatureExtractor in file order"""
+    extractor = FeatureExtractor()
+    extractor.max_records_per_caller = window
+    timestamps = df["timestamp"].dt.to_pydatetime()  # The backend sees datetimes
+    for caller, duration, timestamp, origin, target in zip(
+        df["caller_id"].tolist(), df["call_duration"].tolist(), timestamps,
+        df["origin_region"].tolist(), df["target_region"].tolist()
+    ):
+        extractor.add_cdr(caller, {
+            "duration": duration,
+            "timestamp": timestamp,
+            "origin_region": origin,
+            "target_region": target
+        })
+    return extractor
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batch and incremental caller features")
+    parser.add_argument("--input", default="call_data", help="Table path or name in data/ (default: newest call_data.*)")
+    parser.add_argument("--window", type=int, help="Rolling window per caller (default: unbounded)")
+    args = parser.parse_args()
+
+    path = find_table(args.input)
+    df = load_table(path, COLUMNS)
+    df["timestamp"] = df["timestamp"].astype("datetime64[us]")
+    window = args.window or len(df)
+    print(f"Input: {path} ({len(df):,} calls)")
+
+    started = time.perf_counter()
+    batch = batch_features(df.groupby("caller_id").tail(window) if args.window else df)
+    print(f"Batch kernel: {len(batch):,} callers in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    extractor = replay(df, window)
+    live = np.array([extractor.extract_features(caller) for caller in batch["caller_id"].tolist()])
+    print(f"Incremental kernel (FeatureExtractor): {time.perf_counter() - started:.1f}s")
+
+    failed = False
+    for i, feature in enumerate(FEATURES):
+        expected = batch[feature].to_numpy(dtype=np.float64)
+        mismatches = int((live[:, i] != expected).sum())
+        if mismatches and args.window and feature == "avg_call_duration":
+            error = np.abs(live[:, i] - expected) / np.abs(expected)
+            print(f"  {feature:<24}{mismatches:>8} callers differ, max relative error {error.max():.1e}")
+            failed |= bool(error.max() > 1e-12)
+        else:
+            print(f"  {feature:<24}{mismatches:>8} callers differ")
+            failed |= mismatches > 0
+
+    if failed:
+        print("[ERROR] Batch and incremental features differ")
+        sys.exit(1)
+    print("[OK] Batch and incremental features match")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Columnar on-disk formats for the data/ pipeline
+
+Every src/ script reads and writes its tables through load_table() and
+save_table(). The format is chosen with SATARK_DATA_FORMAT:
+
+    csv       data/<name>.csv (default, unchanged behaviour)
+    parquet   data/<name>.parquet (needs pyarrow)
+    arrow     data/<name>.arrow, Arrow IPC / Feather v2, uncompressed so
+              reads are memory-mapped (needs pyarrow)
+    npy       data/<name>.npyd/, one .npy file per column plus meta.json,
+              memory-mapped copy-on-write with np.load(mmap_mode="c")
+    columnar  parquet if pyarrow is installed, otherwise npy
+
+Before a columnar write, tables are compacted: strings become dictionary
+codes (pandas categoricals), datetimes are int64 epoch nanoseconds, integers
+are downcast to the smallest type that fits, and floats become float32 only
+when that is lossless.
+
+Loading by name picks the most recently written file among the formats, so a
+stage written as Parquet is read by the next stage even if a stale CSV exists.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path("data")
+
+SUFFIXES = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "npy": ".npyd"
+}
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def resolve_format(fmt: str = None) -> str:
+    fmt = fmt or os.environ.get("SATARK_DATA_FORMAT", "csv")
+    if fmt == "columnar":
+        return "parquet" if has_pyarrow() else "npy"
+    if fmt not in SUFFIXES:
+        raise ValueError(f"Unknown data format {fmt!r} (choose from {', '.join(SUFFIXES)} or columnar)")
+    if fmt in ("parquet", "arrow") and not has_pyarrow():
+        raise ImportError(f"The {fmt} format needs pyarrow (pip install pyarrow); use npy instead")
+    return fmt
+
+def format_of(path: Path) -> str:
+    for fmt, suffix in SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return fmt
+    raise ValueError(f"Cannot tell the format of {path}")
+
+def table_path(name: str, fmt: str = None) -> Path:
+    """data/<name> in the given (or configured) format"""
+    return DATA_DIR / f"{name}{SUFFIXES[resolve_format(fmt)]}"
+
+def find_table(name_or_path) -> Path:
+    """
+    A path as given, or the most recently written <name>.* table
+    (a bare name is looked up in data/, a path without suffix next to it)
+    """
+    path = Path(name_or_path)
+    if path.suffix or path.exists():
+        return path
+    base = path if path.parent != Path(".") else DATA_DIR / path
+    candidates = [base.with_name(base.name + suffix) for suffix in SUFFIXES.values()]
+    existing = [candidate for candidate in candidates if candidate.exists()]
+    if not existing:
+        raise FileNotFoundError(f"No table {base}.* ({', '.join(SUFFIXES.values())})")
+    return max(existing, key=lambda p: p.stat().st_mtime)
+
+# ==========================================
+# COMPACTION
+# ==========================================
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Dictionary-encode strings and downcast numbers without changing any value"""
+    columns = {}
+    for name, series in df.items():
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_datetime64_any_dtype(series):
+            columns[name] = series
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            columns[name] = series.astype("category")
+        elif pd.api.types.is_bool_dtype(series):
+            columns[name] = series
+        elif pd.api.types.is_integer_dtype(series):
+            columns[name] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            narrow = series.astype(np.float32)
+            lossless = np.array_equal(narrow.to_numpy(np.float64), series.to_numpy(np.float64), equal_nan=True)
+            columns[name] = narrow if lossless else series
+        else:
+            columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+# ==========================================
+# NPY DIRECTORY LAYOUT
+# ==========================================
+# meta.json: {"rows": n, "columns": [{"name", "kind", "dtype"}]}
+# kind "number": <i>.npy holds the values
+# kind "datetime": <i>.npy holds int64 epoch nanoseconds
+# kind "category": <i>.codes.npy (-1 = missing) and <i>.values.npy (unicode)
+
+def _encode_npy(series: pd.Series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        values = np.array([str(v) for v in series.cat.categories], dtype=str)
+        return "category", {"codes": codes, "values": values}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert(None)
+        return "datetime", {"": series.to_numpy("datetime64[ns]").view(np.int64)}
+    return "number", {"": series.to_numpy()}
+
+def _write_npy(df: pd.DataFrame, path: Path):
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    meta = {"rows": len(df), "columns": []}
+    for i, (name, series) in enumerate(df.items()):
+        kind, arrays = _encode_npy(series)
+        for part, array in arrays.items():
+            np.save(tmp / f"{i}{'.' + part if part else ''}.npy", array, allow_pickle=False)
+        meta["columns"].append({"name": str(name), "kind": kind, "dtype": str(series.dtype)})
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    if path.exists():
+        shutil.rmtree(path)
+    tmp.rename(path)
+
+def _read_npy(path: Path, columns: List[str] = None, start: int = 0, stop: int = None) -> pd.DataFrame:
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    stop = meta["rows"] if stop is None else min(stop, meta["rows"])
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        if columns is not None and column["name"] not in columns:
+            continue
+        if column["kind"] == "category":
+            codes = np.load(path / f"{i}.codes.npy", mmap_mode="r")[start:stop]
+            values = np.load(path / f"{i}.values.npy")
+            data[column["name"]] = pd.Categorical.from_codes(codes, values.astype(object))
+        else:
+            # Copy-on-write: callers may modify the frame without touching the file
+            values = np.load(path / f"{i}.npy", mmap_mode="c")[start:stop]
+            if column["kind"] == "datetime":
+                values = values.view("datetime64[ns]")
+            data[column["name"]] = values
+    order = [c["name"] for c in meta["columns"] if c["name"] in data]
+    # copy=False keeps numeric columns backed by the memory map
+    return pd.DataFrame({name: data[name] for name in order}, copy=False)
+
+def concat_npy(parts: List[Path], output: Path):
+    """
+    Concatenate npy tables with identical columns, one column of one part in
+    memory at a time. compact() downcasts each part on its own, so a number
+    column is written in the type that holds every part's values
+    (np.result_type, e.g. int8 + int16 -> int16, float32 + float64 -> float64).
+    """
+    metas = [json.loads((part / "meta.json").read_text()) for part in parts]
+    layout = [(c["name"], c["kind"]) for c in metas[0]["columns"]]
+    for part, meta in zip(parts, metas):
+        if [(c["name"], c["kind"]) for c in meta["columns"]] != layout:
+            raise ValueError(f"{part}: columns differ from {parts[0]} ({meta['columns']} vs {metas[0]['columns']})")
+    total = sum(meta["rows"] for meta in metas)
+    columns = [dict(column) for column in metas[0]["columns"]]
+    tmp = output.with_name(output.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    for i, column in enumerate(columns):
+        if column["kind"] == "category":
+            # Union of the parts' dictionaries; codes are remapped part by part
+            values = [np.load(part / f"{i}.values.npy") for part in parts]
+            union = np.unique(np.concatenate(values)) if values else np.array([], dtype=str)
+            code_dtype = np.int8 if len(union) < 2**7 else np.int16 if len(union) < 2**15 else np.int32
+            out = np.lib.format.open_memmap(tmp / f"{i}.codes.npy", mode="w+", dtype=code_dtype, shape=(total,))
+            offset = 0
+            for part, part_values in zip(parts, values):
+                codes = np.load(part / f"{i}.codes.npy", mmap_mode="r")
+                mapping = np.searchsorted(union, part_values).astype(code_dtype)
+                out[offset:offset + len(codes)] = np.where(codes >= 0, mapping[codes.clip(0)], -1)
+                offset += len(codes)
+            out.flush()
+            del out
+            np.save(tmp / f"{i}.values.npy", union)
+        else:
+            dtype = np.result_type(*[np.load(part / f"{i}.npy", mmap_mode="r").dtype for part in parts])
+            if column["kind"] == "number":
+                column["dtype"] = str(dtype)
+            out = np.lib.format.open_memmap(tmp / f"{i}.npy", mode="w+", dtype=dtype, shape=(total,))
+            offset = 0
+            for part in parts:
+                values = np.load(part / f"{i}.npy", mmap_mode="r")
+                out[offset:offset + len(values)] = values
+                offset += len(values)
+            out.flush()
+            del out
+    (tmp / "meta.json").write_text(json.dumps({"rows": total, "columns": columns}, indent=2))
+    if output.exists():
+        shutil.rmtree(output)
+    tmp.rename(output)
+
+# ==========================================
+# READ / WRITE
+# ==========================================
+
+def save_table(df: pd.DataFrame, name_or_path, fmt: str = None) -> Path:
+    """Write a table; a bare name goes to data/<name> in the configured format"""
+    path = Path(name_or_path)
+    if path.suffix:
+        fmt = format_of(path)
+    else:
+        path = table_path(str(name_or_path), fmt)
+        fmt = format_of(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+    resolve_format(fmt)  # Fails early if pyarrow is missing
+    df = compact(df.reset_index(drop=True))
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "arrow":
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression="uncompressed")
+    else:
+        _write_npy(df, path)
+    return path
+
+def load_table(name_or_path, columns: List[str] = None) -> pd.DataFrame:
+    """Read a table by path or by name (newest data/<name>.* wins)"""
+    path = find_table(name_or_path)
+    fmt = format_of(path)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if fmt == "arrow":
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return _read_npy(path, columns)
+
+def count_rows(path: Path) -> Optional[int]:
+    """Row count without reading the data (None for CSV)"""
+    path = Path(path)
+    fmt = format_of(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == "arrow":
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=[], memory_map=True).num_rows
+    if fmt == "npy":
+        return json.loads((path / "meta.json").read_text())["rows"]
+    return None
+
+def read_rows(path: Path, start: int, stop: int, columns: List[str] = None) -> pd.DataFrame:
+    """Rows [start, stop) of a columnar table"""
+    path = Path(path)
+    fmt = format_of(path)
+    if fmt == "npy":
+        return _read_npy(path, columns, start, stop)
+    if fmt == "arrow":
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return table.slice(start, stop - start).to_pandas()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        file = pq.ParquetFile(path, memory_map=True)
+        groups, first, offset = [], None, 0
+        for i in range(file.metadata.num_row_groups):
+            rows = file.metadata.row_group(i).num_rows
+            if offset < stop and offset + rows > start:
+                groups.append(i)
+                first = offset if first is None else first
+            offset += rows
+        if not groups:
+            return file.schema_arrow.empty_table().select(columns or file.schema_arrow.names).to_pandas()
+        table = file.read_row_groups(groups, columns=columns)
+        return table.slice(start - first, stop - start).to_pandas()
+    raise ValueError("read_rows needs a columnar table")
+
+def iter_chunks(path: Path, chunk_rows: int, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+    """Read any table format chunk by chunk"""
+    path = Path(path)
+    if format_of(path) == "csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+        return
+    if format_of(path) == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    total = count_rows(path)
+    for start in range(0, total, chunk_rows):
+        yield read_rows(path, start, start + chunk_rows, columns)
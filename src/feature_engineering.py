@@ -1,38 +1,161 @@
+"""
+Per-caller behaviour features (data/call_data.csv -> data/caller_features.csv)
+
+The features are defined in feature_kernel.py (shared with the live backend).
+Three modes with byte-identical output:
+  - in-memory (default): feature_kernel.batch_features() over the whole file
+  - --stream: reads the CSV in chunks into feature_kernel.StreamingAggregator
+    (exact per-caller partial aggregates), so memory grows with the number
+    of callers, not rows
+  - --workers N: callers are hash-partitioned across N processes, each
+    aggregating its own partition in streaming fashion
+
+Usage (from the repository root):
+    python src/feature_engineering.py
+    python src/feature_engineering.py --stream --chunk-rows 1000000
+    python src/feature_engineering.py --workers 16
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+import numpy as np
 import pandas as pd
 
-# Load dataset
-df = pd.read_csv("data/call_data.csv")
+from columnar import count_rows, find_table, format_of, iter_chunks, load_table, read_rows, save_table
+from feature_kernel import StreamingAggregator, batch_features, night_flags
+
+# Tables are found / written through columnar.py (SATARK_DATA_FORMAT picks the format)
+INPUT = "call_data"
+OUTPUT = "caller_features"
+
+USECOLS = ["caller_id", "call_duration", "timestamp", "origin_region", "target_region", "true_label"]
+
+# ==========================================
+# STREAMING MODE
+# ==========================================
+
+def build_features_streaming(path: Path, chunk_rows: int = 1_000_000) -> pd.DataFrame:
+    aggregator = StreamingAggregator()
+    for chunk in iter_chunks(path, chunk_rows, USECOLS):
+        aggregator.update(chunk)
+    return aggregator.result()
+
+# ==========================================
+# PARALLEL MODE
+# ==========================================
+# Phase 1 splits the file into byte ranges (row ranges for columnar tables); each worker reads its range and
+# writes the rows of every caller partition (hash of caller_id) to its own
+# spill file. Phase 2 gives each worker one partition: it aggregates that
+# partition's spill files in file order, so every caller's rows are still
+# summed in the original order. The partitions' features are concatenated
+# and sorted by caller_id; raw rows are never shuffled between workers.
+
+def _range_chunks(path: str, start: int, end: int, block_bytes: int):
+    """DataFrames of the lines starting in [start, end), block_bytes at a time"""
+    if format_of(path) != "csv":
+        # Row range of a columnar table; roughly block_bytes of CSV worth of rows per chunk
+        block_rows = max(1, block_bytes // 64)
+        for first in range(start, end, block_rows):
+            yield read_rows(path, first, min(end, first + block_rows), USECOLS)
+        return
+    with open(path, "rb") as f:
+        header = f.readline()
+        if start < len(header):
+            start = len(header)
+        else:
+            f.seek(start - 1)
+            f.readline()  # The line containing start belongs to the previous range
+            start = f.tell()
+        while start < end:
+            f.seek(start)
+            data = f.read(min(block_bytes, end - start))
+            rest = f.readline() if not data.endswith(b"\n") else b""  # Finish the last line
+            data += rest
+            if not data:
+                return
+            start += len(data)
+            yield pd.read_csv(io.BytesIO(header + data), usecols=USECOLS)
+
+def split_range(path: str, start: int, end: int, partitions: int, spill_dir: str, range_index: int,
+                block_bytes: int) -> int:
+    """Phase 1: parse one byte range and spill it by caller partition; returns rows"""
+    rows = 0
+    for block, chunk in enumerate(_range_chunks(path, start, end, block_bytes)):
+        chunk = chunk[chunk["caller_id"].notna()]
+        chunk = chunk.assign(is_night=night_flags(chunk["timestamp"]).astype(np.int8)).drop(columns="timestamp")
+        chunk["origin_region"] = chunk["origin_region"].astype("category")
+        chunk["target_region"] = chunk["target_region"].astype("category")
+        partition = pd.util.hash_array(chunk["caller_id"].to_numpy()) % partitions
+        for p, part in chunk.groupby(partition, sort=False):
+            part.to_pickle(Path(spill_dir) / f"p{p:03d}-r{range_index:05d}-b{block:05d}.pkl")
+        rows += len(chunk)
+    return rows
 
-# Convert timestamp to datetime
-df["timestamp"] = pd.to_datetime(df["timestamp"])
+def aggregate_partition(spill_dir: str, partition: int) -> pd.DataFrame:
+    """Phase 2: features of one caller partition"""
+    aggregator = StreamingAggregator()
+    for spill in sorted(Path(spill_dir).glob(f"p{partition:03d}-*.pkl")):
+        chunk = pd.read_pickle(spill)
+        chunk["origin_region"] = chunk["origin_region"].astype(object)
+        chunk["target_region"] = chunk["target_region"].astype(object)
+        aggregator.update(chunk)
+        spill.unlink()
+    return aggregator.result()
 
-# Extract hour
-df["hour"] = df["timestamp"].dt.hour
+def build_features_parallel(path: str, workers: int, block_bytes: int = 64 * 1024 * 1024,
+                            tmp_dir: str = None) -> pd.DataFrame:
+    if format_of(path) == "csv":
+        size = os.path.getsize(path)
+    else:
+        size = count_rows(path)
+        block_bytes = max(1, block_bytes // 64)  # Ranges are counted in rows
+    n_ranges = max(1, min(workers * 4, -(-size // block_bytes)))  # A few ranges per worker for balance
+    bounds = [size * i // n_ranges for i in range(n_ranges + 1)]
+    with tempfile.TemporaryDirectory(prefix="caller-features-", dir=tmp_dir) as spill_dir, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(
+            split_range, repeat(str(path)), bounds[:-1], bounds[1:], repeat(workers), repeat(spill_dir),
+            range(n_ranges), repeat(block_bytes)
+        ))
+        parts = list(pool.map(aggregate_partition, repeat(spill_dir), range(workers)))
+    features = pd.concat(parts, ignore_index=True)
+    return features.sort_values("caller_id", kind="stable", ignore_index=True)
 
-# Night call flag
-df["is_night"] = df["hour"].apply(lambda x: 1 if x >= 22 or x <= 5 else 0)
+# ==========================================
+# MAIN
+# ==========================================
 
-# Aggregate behaviour per caller
-features = df.groupby("caller_id").agg({
-    "call_duration": ["mean", "count"],
-    "is_night": "mean",
-    "origin_region": "nunique",
-    "target_region": "nunique",
-    "true_label": "max"  # Preserve fraud ground truth
-})
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate call records into per-caller features")
+    parser.add_argument("--input", default=INPUT, help="Table path or name in data/ (default: newest call_data.*)")
+    parser.add_argument("--output", default=OUTPUT, help="Table path or name in data/ (written in SATARK_DATA_FORMAT)")
+    parser.add_argument("--stream", action="store_true", help="Read the input in chunks (bounded memory)")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows per chunk with --stream")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Aggregate hash partitions of callers in this many processes (implies bounded memory)")
+    parser.add_argument("--tmp-dir", help="Directory for partition spill files with --workers (default: system temp)")
+    args = parser.parse_args()
 
-features.columns = [
-    "avg_call_duration",
-    "total_calls",
-    "night_call_ratio",
-    "unique_origin_regions",
-    "unique_target_regions",
-    "true_label"
-]
+    started = time.perf_counter()
+    path = find_table(args.input)
+    if args.workers > 1:
+        features = build_features_parallel(path, args.workers, tmp_dir=args.tmp_dir)
+    elif args.stream:
+        features = build_features_streaming(path, args.chunk_rows)
+    else:
+        features = batch_features(load_table(path, USECOLS))
 
-features = features.reset_index()
+    output = save_table(features, args.output)
 
-features.to_csv("data/caller_features.csv", index=False)
+    print("Feature engineering complete!")
+    print(f"Total callers processed: {len(features)}")
+    print(f"Input: {path}, output: {output}")
+    print(f"Time: {time.perf_counter() - started:.1f}s")
 
-print("Feature engineering complete!")
-print(f"Total callers processed: {len(features)}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Caller behaviour features: the single definition shared by the offline
+pipeline (src/feature_engineering.py) and the live backend
+(backend-simulation/feature_extractor.py)
+
+    avg_call_duration       mean duration of the calls that have one
+    total_calls             number of calls with a duration
+    night_call_ratio        share of all calls starting 22:00-05:59
+    unique_origin_regions   distinct origin regions (missing ones ignored)
+    unique_target_regions   distinct target regions (missing ones ignored)
+
+Three kernels compute them:
+  - batch_features(): vectorized over a whole table with pandas
+  - StreamingAggregator: vectorized partial aggregates updated one chunk at
+    a time (feature_engineering.py --stream and --workers)
+  - CallerState (caller_state.py, re-exported here): per-caller running
+    state for a stream; add() and remove() are O(1), so a rolling window
+    costs nothing to maintain
+
+Duration sums use the Kahan-compensated summation of pandas' grouped mean,
+so StreamingAggregator and a CallerState fed a caller's calls in table
+order give bit-identical features to batch_features().
+check_feature_parity.py verifies this.
+
+The backend imports only caller_state.py (through sys.path, see
+feature_extractor.py), which has no dependencies, so numpy and pandas stay
+out of the server's startup.
+"""
+import numpy as np
+import pandas as pd
+
+from caller_state import FEATURES, NIGHT_END, NIGHT_START, CallerState, is_night_hour  # noqa: F401
+
+def night_flags(timestamps: pd.Series) -> np.ndarray:
+    """1 for calls starting at night, 0 otherwise (including missing timestamps)"""
+    hour = pd.to_datetime(timestamps).dt.hour.to_numpy()
+    return is_night_hour(hour).astype(np.int64)
+
+# ==========================================
+# BATCH KERNEL
+# ==========================================
+
+def batch_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Features of every caller in df (caller_id, call_duration, timestamp,
+    origin_region, target_region), one row per caller sorted by caller_id.
+    A true_label column, if present, is kept as the caller's maximum.
+    """
+    df = df.assign(is_night=night_flags(df["timestamp"]))
+    aggregations = {
+        "call_duration": ["mean", "count"],
+        "is_night": "mean",
+        "origin_region": "nunique",
+        "target_region": "nunique"
+    }
+    if "true_label" in df:
+        aggregations["true_label"] = "max"  # Preserve fraud ground truth
+    features = df.groupby("caller_id").agg(aggregations)
+    features.columns = FEATURES + (["true_label"] if "true_label" in df else [])
+    return features.reset_index()
+
+# ==========================================
+# PARTIAL-AGGREGATE KERNEL
+# ==========================================
+
+class StreamingAggregator:
+    """
+    Exact per-caller partial aggregates, updated one chunk at a time.
+
+    Duration means must match pandas to the last bit, so the duration sum
+    repeats pandas' grouped mean: Kahan-compensated summation in row order per
+    caller. Within a chunk, rows are stepped by their rank inside their
+    caller, so each step updates many callers at once and a caller's rows
+    are still added in file order. Region sets are bitmasks (64 regions per
+    word); counts, night counts and label maxima are plain sums and maxima.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.index = {}  # caller_id -> row in the state arrays
+        self.regions = {}  # region -> bit
+        self.sum = np.zeros(capacity)
+        self.compensation = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)  # Non-missing durations
+        self.calls = np.zeros(capacity, dtype=np.int64)  # All rows
+        self.night = np.zeros(capacity, dtype=np.int64)
+        self.label = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+        self.origin = np.zeros((capacity, 1), dtype=np.uint64)
+        self.target = np.zeros((capacity, 1), dtype=np.uint64)
+        self.rows = 0
+
+    def _grow(self, size: int, words: int):
+        capacity = len(self.sum)
+        if size > capacity:
+            extra = max(size, capacity * 2) - capacity
+            self.sum = np.concatenate([self.sum, np.zeros(extra)])
+            self.compensation = np.concatenate([self.compensation, np.zeros(extra)])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            self.calls = np.concatenate([self.calls, np.zeros(extra, dtype=np.int64)])
+            self.night = np.concatenate([self.night, np.zeros(extra, dtype=np.int64)])
+            self.label = np.concatenate([self.label, np.full(extra, np.iinfo(np.int64).min, dtype=np.int64)])
+            self.origin = np.concatenate([self.origin, np.zeros((extra, self.origin.shape[1]), dtype=np.uint64)])
+            self.target = np.concatenate([self.target, np.zeros((extra, self.target.shape[1]), dtype=np.uint64)])
+        if words > self.origin.shape[1]:
+            extra = words - self.origin.shape[1]
+            self.origin = np.hstack([self.origin, np.zeros((len(self.origin), extra), dtype=np.uint64)])
+            self.target = np.hstack([self.target, np.zeros((len(self.target), extra), dtype=np.uint64)])
+
+    def _codes(self, values: pd.Series, mapping: dict) -> np.ndarray:
+        """Global codes for a column (-1 for missing), adding new values to mapping"""
+        local, uniques = pd.factorize(values)
+        known = np.fromiter(
+            (mapping.setdefault(value, len(mapping)) for value in uniques.tolist()),
+            dtype=np.int64, count=len(uniques)
+        )
+        return np.where(local >= 0, known[local], -1)
+
+    def _add_regions(self, masks: np.ndarray, callers: np.ndarray, regions: np.ndarray):
+        present = regions >= 0  # nunique ignores missing regions
+        callers, regions = callers[present], regions[present]
+        # One update per distinct (caller, region) pair
+        pairs = np.unique(callers * (len(self.regions) + 1) + regions)
+        callers, regions = pairs // (len(self.regions) + 1), pairs % (len(self.regions) + 1)
+        np.bitwise_or.at(
+            masks, (callers, regions // 64), np.left_shift(np.uint64(1), (regions % 64).astype(np.uint64))
+        )
+
+    def _add_durations(self, callers: np.ndarray, durations: np.ndarray):
+        """Kahan-summed per caller, in row order (same arithmetic as pandas' grouped mean)"""
+        valid = ~np.isnan(durations)
+        callers, durations = callers[valid], durations[valid]
+        np.add.at(self.count, callers, 1)
+        order = np.argsort(callers, kind="stable")
+        sorted_callers = callers[order]
+        starts = np.flatnonzero(np.r_[True, sorted_callers[1:] != sorted_callers[:-1]])
+        lengths = np.diff(np.r_[starts, len(sorted_callers)])
+        rank = np.arange(len(sorted_callers)) - np.repeat(starts, lengths)
+        # Step k adds the k-th row of every caller that has one
+        by_rank = order[np.argsort(rank, kind="stable")]
+        bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+        for k in range(len(bounds) - 1):
+            rows = by_rank[bounds[k]:bounds[k + 1]]
+            group = callers[rows]
+            y = durations[rows] - self.compensation[group]
+            t = self.sum[group] + y
+            compensation = t - self.sum[group] - y
+            self.compensation[group] = np.where(np.isnan(compensation), 0.0, compensation)
+            self.sum[group] = t
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = chunk[chunk["caller_id"].notna()]  # groupby drops missing keys
+        callers = self._codes(chunk["caller_id"], self.index)
+        origin = self._codes(chunk["origin_region"], self.regions)
+        target = self._codes(chunk["target_region"], self.regions)
+        self._grow(len(self.index), len(self.regions) // 64 + 1)
+
+        self._add_durations(callers, chunk["call_duration"].to_numpy(dtype=np.float64))
+        self.calls[:len(self.index)] += np.bincount(callers, minlength=len(self.index))
+        if "is_night" in chunk:
+            night = chunk["is_night"].to_numpy(dtype=np.int64)
+        else:
+            night = night_flags(chunk["timestamp"])
+        np.add.at(self.night, callers, night)
+        np.maximum.at(self.label, callers, chunk["true_label"].to_numpy(dtype=np.int64))
+        self._add_regions(self.origin, callers, origin)
+        self._add_regions(self.target, callers, target)
+        self.rows += len(chunk)
+
+    @staticmethod
+    def _popcount(masks: np.ndarray) -> np.ndarray:
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(masks).sum(axis=1).astype(np.int64)
+        return np.unpackbits(masks.view(np.uint8), axis=1).sum(axis=1).astype(np.int64)
+
+    def result(self) -> pd.DataFrame:
+        """Features sorted by caller_id, exactly as batch_features() returns them"""
+        n = len(self.index)
+        callers = pd.Index(list(self.index))
+        order = np.argsort(callers.to_numpy(), kind="stable")
+        count = self.count[:n][order]
+        features = pd.DataFrame({
+            "caller_id": callers.to_numpy()[order],
+            "avg_call_duration": self.sum[:n][order] / count,
+            "total_calls": count,
+            "night_call_ratio": self.night[:n][order] / self.calls[:n][order],
+            "unique_origin_regions": self._popcount(self.origin[:n][order]),
+            "unique_target_regions": self._popcount(self.target[:n][order]),
+            "true_label": self.label[:n][order]
+        })
+        return features
@@ -1,11 +1,10 @@
-import pandas as pd
-import numpy as np
+from columnar import load_table
 
 # ==========================================
 # LOAD FRAUD PREDICTIONS
 # ==========================================
 
-df = pd.read_csv("data/fraud_predictions.csv")
+df = load_table("fraud_predictions")
 
 # Separate detected fraud callers
 fraud_df = df[df["predicted_fraud"] == 1].copy()
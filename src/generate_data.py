@@ -1,146 +1,274 @@
-import pandas as pd
+"""
+Synthetic telecom CDR generator (writes data/call_data.csv)
+
+Vectorized with NumPy: per-caller daily call counts, hours, durations and
+regions are drawn as arrays and timestamps are built with array arithmetic.
+Callers are generated in fixed-size blocks, each with its own random stream
+derived from the seed, so memory is bounded by the block size and a given
+seed always produces the same data. With --workers N the blocks are spread
+over a process pool; each writes its own part file, and the parts are then
+concatenated in block order (identical to a single-process run) unless
+--no-combine is given.
+
+Usage (from the repository root):
+    python src/generate_data.py
+    python src/generate_data.py --seed 42 --start 2026-01-31
+    python src/generate_data.py --seed 42 --callers 1000000 --days 30 --output data/call_data_large.csv
+    python src/generate_data.py --seed 42 --rows 1e8 --workers 8 --format columnar
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
 import numpy as np
-import random
-from datetime import datetime, timedelta
-
-# ==========================================
-# CONFIGURATION (SCALED)
-# ==========================================
+import pandas as pd
 
-TOTAL_CALLERS = random.randint(10000, 40000)
-FRAUD_RATIO = random.uniform(0.015, 0.035)
-DAYS_OF_SIMULATION = random.randint(1, 30)
+from columnar import SUFFIXES, concat_npy, resolve_format, save_table, table_path
 
-REGIONS = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Bangalore", "Hyderabad"]
-REGIONS = random.sample(REGIONS, random.randint(3, 6))
+COLUMNS = [
+    "caller_id",
+    "receiver_id",
+    "call_duration",
+    "timestamp",
+    "origin_region",
+    "target_region",
+    "true_label"
+]
 
-# ==========================================
-# FRAUD CHARACTERISTICS (VARIABLE PER DATASET)
-# ==========================================
+ALL_REGIONS = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Bangalore", "Hyderabad"]
+NIGHT_HOURS = np.array([22, 23, 0, 1, 2, 3, 4, 5])
+# Callers per generated block (part of the seed -> data mapping); fraud callers
+# make ~6x more calls, so their blocks are smaller to keep blocks of similar size
+BLOCK_CALLERS = 5000
+FRAUD_BLOCK_CALLERS = 1000
 
-fraud_volume_multiplier = random.uniform(0.8, 1.3)
-fraud_night_bias = random.uniform(0.2, 0.6)
+US_PER_DAY = 86_400_000_000
 
 # ==========================================
-# CREATE CALLER POPULATION
+# CONFIGURATION (SCALED)
 # ==========================================
 
-num_fraud = int(TOTAL_CALLERS * FRAUD_RATIO)
-num_normal = TOTAL_CALLERS - num_fraud
-
-normal_callers = [random.randint(9000000000, 9999999999) for _ in range(num_normal)]
-fraud_callers = [random.randint(9000000000, 9999999999) for _ in range(num_fraud)]
-
-print(f"Normal callers: {len(normal_callers)}")
-print(f"Fraud callers: {len(fraud_callers)}")
+def draw_config(seed=None, callers=None, days=None, start: datetime = None, rows=None) -> dict:
+    """
+    Dataset-level parameters; everything else is derived from these.
+    Overrides replace drawn values without shifting the other draws.
+    rows sizes the caller population so the expected row count matches.
+    """
+    rng = np.random.default_rng(seed)
+    drawn_callers = int(rng.integers(10000, 40000, endpoint=True))
+    fraud_ratio = rng.uniform(0.015, 0.035)
+    drawn_days = int(rng.integers(1, 30, endpoint=True))
+    n_regions = int(rng.integers(3, 6, endpoint=True))
+    regions = [str(r) for r in rng.choice(ALL_REGIONS, n_regions, replace=False)]
+    # Fraud characteristics (variable per dataset)
+    fraud_volume_multiplier = rng.uniform(0.8, 1.3)
+    fraud_night_bias = rng.uniform(0.2, 0.6)
+    derived_seed = int(rng.integers(2**63))
+
+    days = days or drawn_days
+    if rows:
+        callers = max(1, round(rows / (days * expected_calls_per_day(fraud_ratio, fraud_volume_multiplier))))
+    total_callers = callers or drawn_callers
+    num_fraud = int(total_callers * fraud_ratio)
+    return {
+        "seed": derived_seed if seed is None else seed,
+        "total_callers": total_callers,
+        "num_fraud": num_fraud,
+        "num_normal": total_callers - num_fraud,
+        "days": days,
+        "regions": regions,
+        "fraud_volume_multiplier": fraud_volume_multiplier,
+        "fraud_night_bias": fraud_night_bias,
+        # Timestamps are days back from now, keeping now's sub-second part
+        "start_us": int(np.datetime64(start or datetime.now(), "us").astype(np.int64))
+    }
+
+def expected_calls_per_day(fraud_ratio: float, fraud_volume_multiplier: float) -> float:
+    """Mean calls per caller per day across normal and fraud callers"""
+    normal = 0.92 * 3 + 0.08 * 13  # 1-5 calls, or 6-20 on 8% of days
+    fraud = np.mean([max(1, int(base * fraud_volume_multiplier)) for base in range(6, 36)])
+    return (1 - fraud_ratio) * normal + fraud_ratio * fraud
+
+def block_plan(config: dict):
+    """(block index, first caller, caller count, is_fraud) for every block, normal callers first"""
+    plan = []
+    for is_fraud, total in ((False, config["num_normal"]), (True, config["num_fraud"])):
+        size = FRAUD_BLOCK_CALLERS if is_fraud else BLOCK_CALLERS
+        for first in range(0, total, size):
+            plan.append((len(plan), first, min(size, total - first), is_fraud))
+    return plan
 
 # ==========================================
 # GENERATE CALL DATA
 # ==========================================
 
-call_records = []
-start_date = datetime.now()
-
-# -------- NORMAL USERS --------
-for caller in normal_callers:
-
-    for day in range(DAYS_OF_SIMULATION):
-
-        calls_today = random.randint(1, 5)
-        if random.random() < 0.08:
-            calls_today = random.randint(6, 20)
-        for _ in range(calls_today):
-
-            hour = random.randint(8, 22)
-            minute = random.randint(0, 59)
-            second = random.randint(0, 59)
-
-            timestamp = start_date - timedelta(days=day)
-            timestamp = timestamp.replace(hour=hour, minute=minute, second=second)
-
-            duration = max(30, np.random.normal(160, 60))
-
-
-            origin = random.choice(REGIONS)
-            target = origin if random.random() < 0.8 else random.choice(REGIONS)
-
-            receiver = random.randint(8000000000, 8999999999)
-
-            call_records.append([
-                caller,
-                receiver,
-                round(duration, 2),
-                timestamp,
-                origin,
-                target,
-                0
-            ])
-
-# -------- FRAUD USERS --------
-for caller in fraud_callers:
-
-    for day in range(DAYS_OF_SIMULATION):
-
-        # Use fraud_volume_multiplier to vary call volume
-        base_calls = random.randint(6, 35)
-        calls_today = max(1, int(base_calls * fraud_volume_multiplier))
-
-
-        for _ in range(calls_today):
-
-            # Use fraud_night_bias to vary night call probability
-            if random.random() < fraud_night_bias:
-                hour = random.choice([22, 23, 0, 1, 2, 3, 4, 5])
-            else:
-                hour = random.randint(9, 21)
-
-            minute = random.randint(0, 59)
-            second = random.randint(0, 59)
-
-            timestamp = start_date - timedelta(days=day)
-            timestamp = timestamp.replace(hour=hour, minute=minute, second=second)
-
-            duration = max(20, np.random.normal(120, 60))
-
-
-            origin = random.choice(REGIONS)
-            target = random.choice(REGIONS)
-
-            receiver = random.randint(8000000000, 8999999999)
-
-            call_records.append([
-                caller,
-                receiver,
-                round(duration, 2),
-                timestamp,
-                origin,
-                target,
-                1
-            ])
+def generate_block(config: dict, block: int, n_callers: int, is_fraud: bool) -> pd.DataFrame:
+    """All calls of n_callers callers, caller by caller and day by day"""
+    rng = np.random.default_rng([config["seed"], block])
+    days = config["days"]
+    regions = np.array(config["regions"])
+
+    callers = rng.integers(9000000000, 9999999999, n_callers, endpoint=True)
+
+    # Calls per caller per day
+    if is_fraud:
+        base_calls = rng.integers(6, 35, (n_callers, days), endpoint=True)
+        calls_per_day = np.maximum(1, (base_calls * config["fraud_volume_multiplier"]).astype(np.int64))
+    else:
+        calls_per_day = rng.integers(1, 5, (n_callers, days), endpoint=True)
+        heavy = rng.random((n_callers, days)) < 0.08
+        calls_per_day[heavy] = rng.integers(6, 20, int(heavy.sum()), endpoint=True)
+
+    counts = calls_per_day.ravel()
+    n = int(counts.sum())
+    caller_id = np.repeat(np.repeat(callers, days), counts)
+    day = np.repeat(np.tile(np.arange(days), n_callers), counts)
+
+    if is_fraud:
+        night = rng.random(n) < config["fraud_night_bias"]
+        hour = np.where(night, rng.choice(NIGHT_HOURS, n), rng.integers(9, 21, n, endpoint=True))
+    else:
+        hour = rng.integers(8, 22, n, endpoint=True)
+    seconds = hour * 3600 + rng.integers(0, 59, n, endpoint=True) * 60 + rng.integers(0, 59, n, endpoint=True)
+
+    # Same as (start - day days).replace(hour=..., minute=..., second=...)
+    start_us = config["start_us"]
+    start_day_us = start_us - start_us % US_PER_DAY
+    sub_second_us = start_us % 1_000_000
+    timestamp = (start_day_us - day * US_PER_DAY + seconds * 1_000_000 + sub_second_us).astype("datetime64[us]")
+
+    if is_fraud:
+        duration = np.maximum(20, rng.normal(120, 60, n))
+        origin = rng.integers(0, len(regions), n)
+        target = rng.integers(0, len(regions), n)
+    else:
+        duration = np.maximum(30, rng.normal(160, 60, n))
+        origin = rng.integers(0, len(regions), n)
+        target = np.where(rng.random(n) < 0.8, origin, rng.integers(0, len(regions), n))
+
+    return pd.DataFrame({
+        "caller_id": caller_id,
+        "receiver_id": rng.integers(8000000000, 8999999999, n, endpoint=True),
+        "call_duration": duration.round(2),
+        "timestamp": timestamp,
+        # Same dictionary in every block, so columnar parts can be concatenated as is
+        "origin_region": pd.Categorical.from_codes(origin, regions),
+        "target_region": pd.Categorical.from_codes(target, regions),
+        "true_label": np.full(n, int(is_fraud), dtype=np.int8)
+    }, columns=COLUMNS)
 
 # ==========================================
 # SAVE DATA
 # ==========================================
 
-columns = [
-    "caller_id",
-    "receiver_id",
-    "call_duration",
-    "timestamp",
-    "origin_region",
-    "target_region",
-    "true_label"
-]
-
-df = pd.DataFrame(call_records, columns=columns)
-
-# (Noise injection removed - moved to train_model.py)
-# ==========================================
-
-df.to_csv("data/call_data.csv", index=False)
-
-print("\n======================================")
-print(" SCALED TELECOM DATA GENERATED ")
-print("======================================")
-print(f"Total records generated: {len(df)}")
-print("======================================\n")
+def write_part(config: dict, block: int, n_callers: int, is_fraud: bool, path: str, fmt: str, append: bool = False) -> int:
+    """Generate one block and write it; returns the row count"""
+    df = generate_block(config, block, n_callers, is_fraud)
+    if fmt == "csv":
+        df.to_csv(path, mode="a" if append else "w", header=not append, index=False)
+    else:
+        save_table(df, path)
+    return len(df)
+
+def combine_parts(parts: list, output: Path, fmt: str):
+    """Concatenate part files in order, one part in memory at a time"""
+    if fmt == "npy":
+        concat_npy(parts, output)
+        return
+    if fmt in ("parquet", "arrow"):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+        if not parts:
+            return
+        # compact() downcasts each part on its own (int8 in one, int16 in another):
+        # write every part in the widest type any part uses
+        schemas = [pq.read_schema(part) if fmt == "parquet" else ipc.open_file(pa.memory_map(str(part))).schema
+                   for part in parts]
+        schema = pa.unify_schemas(schemas, promote_options="permissive")
+        writer = pq.ParquetWriter(output, schema) if fmt == "parquet" else ipc.new_file(output, schema)
+        for part in parts:
+            table = pq.read_table(part) if fmt == "parquet" else feather.read_table(part, memory_map=True)
+            writer.write_table(table.cast(schema))
+        writer.close()
+        return
+    with open(output, "wb") as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as f:
+                if i > 0:
+                    f.readline()  # Header
+                shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic telecom call data")
+    parser.add_argument("--seed", type=int, help="Random seed (default: a fresh dataset every run)")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--callers", type=int, help="Total callers (default: random 10k-40k)")
+    size.add_argument("--rows", type=float, help="Target row count, e.g. 1e8 (sizes the caller population)")
+    parser.add_argument("--days", type=int, help="Days of simulation (default: random 1-30)")
+    parser.add_argument("--start", type=datetime.fromisoformat,
+                        help="Most recent day, e.g. 2026-01-31T09:00 (default: now; fix it with --seed for identical files)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating caller blocks in parallel")
+    parser.add_argument("--format", choices=list(SUFFIXES) + ["columnar"],
+                        default=os.environ.get("SATARK_DATA_FORMAT", "csv"), help="See columnar.py")
+    parser.add_argument("--no-combine", action="store_true",
+                        help="Leave one file per caller block in <output>.parts/ instead of a single file")
+    parser.add_argument("--output", help="Output path (default: data/call_data.<format suffix>)")
+    args = parser.parse_args()
+
+    try:
+        args.format = resolve_format(args.format)
+    except (ImportError, ValueError) as e:
+        parser.error(str(e))
+    output = Path(args.output) if args.output else table_path("call_data", args.format)
+
+    started = time.perf_counter()
+    config = draw_config(args.seed, args.callers, args.days, args.start, int(args.rows) if args.rows else None)
+    plan = block_plan(config)
+    print(f"Normal callers: {config['num_normal']}")
+    print(f"Fraud callers: {config['num_fraud']}")
+    print(f"Blocks: {len(plan)}, {args.workers} worker(s)")
+
+    total = 0
+    if args.workers <= 1 and not args.no_combine and args.format == "csv":
+        # Single process: append straight to the output
+        for block, _, n_callers, is_fraud in plan:
+            total += write_part(config, block, n_callers, is_fraud, output, "csv", append=block > 0)
+    else:
+        parts_dir = output.with_name(output.name + ".parts")
+        if parts_dir.exists():
+            shutil.rmtree(parts_dir)
+        parts_dir.mkdir(parents=True)
+        parts = [parts_dir / f"part-{block:05d}{SUFFIXES[args.format]}" for block, _, _, _ in plan]
+        # Peak memory is one block per worker, whatever the total size
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [
+                pool.submit(write_part, config, block, n_callers, is_fraud, str(part), args.format)
+                for (block, _, n_callers, is_fraud), part in zip(plan, parts)
+            ]
+            for done, future in enumerate(futures, 1):
+                total += future.result()
+                if done % 50 == 0:
+                    print(f"  {done}/{len(plan)} blocks, {total:,} rows")
+        if args.no_combine:
+            output = parts_dir
+        else:
+            combine_parts(parts, output, args.format)
+            shutil.rmtree(parts_dir)
+
+    elapsed = time.perf_counter() - started
+    print("\n======================================")
+    print(" SCALED TELECOM DATA GENERATED ")
+    print("======================================")
+    print(f"Total records generated: {total}")
+    print(f"Seed: {config['seed']}")
+    print(f"Output: {output}")
+    print(f"Time: {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    print("======================================\n")
+
+if __name__ == "__main__":
+    main()
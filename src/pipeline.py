@@ -0,0 +1,276 @@
+"""
+Offline pipeline runner: generate -> features -> train -> inference / explain
+
+Each stage declares the scripts it runs and the tables or files it reads and
+writes. A stage is skipped when its key (a hash of its code, arguments,
+SATARK_DATA_FORMAT and input contents) matches the previous run and its
+outputs still have the contents that run produced. If a re-run stage writes
+byte-identical outputs, its downstream stages stay up to date. Stages whose
+inputs are ready run in parallel.
+
+Inputs and outputs without a "/" are tables in data/ (any format, see
+columnar.py); others are paths from the repository root. Run state and
+per-stage logs are kept in data/.pipeline/.
+
+Usage (from the repository root):
+    python src/pipeline.py                     # run whatever is out of date
+    python src/pipeline.py --dry-run           # show what would run and why
+    python src/pipeline.py --only explain      # just this stage, even if up to date
+    python src/pipeline.py --from train        # re-run train, then anything its outputs changed
+    python src/pipeline.py --seed 42 --rows 1e7 --workers 8 --train-mode reuse
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from columnar import find_table, resolve_format
+
+REPO = Path(__file__).resolve().parent.parent
+STATE_DIR = Path("data") / ".pipeline"
+
+MODELS = ["models/random_forest.pkl", "models/isolation_forest.pkl", "models/kmeans.pkl",
+          "models/decision_threshold.pkl"]
+
+# code: files hashed into the stage key; args / run_args: script arguments
+# inside / outside the key (run_args must not change the outputs)
+STAGES = {
+    "generate": {
+        "code": ["src/generate_data.py", "src/columnar.py"],
+        "inputs": [],
+        "outputs": ["call_data"]
+    },
+    "features": {
+        "code": ["src/feature_engineering.py", "src/feature_kernel.py", "src/caller_state.py", "src/columnar.py"],
+        "inputs": ["call_data"],
+        "outputs": ["caller_features"]
+    },
+    "train": {
+        "code": ["src/train_model.py", "src/columnar.py"],
+        "inputs": ["caller_features"],
+        "outputs": MODELS + ["data/hybrid_fraud_predictions.csv", "data/fraud_campaign_clusters.csv",
+                             "fraud_predictions"]
+    },
+    "inference": {
+        "code": ["src/test_pipeline.py", "src/columnar.py"],
+        "inputs": ["caller_features"] + MODELS,
+        "outputs": ["data/inference_results.csv"]
+    },
+    "explain": {
+        "code": ["src/fraud_explainer.py", "src/columnar.py"],
+        "inputs": ["fraud_predictions"],
+        "outputs": ["data/fraud_explanation_report.csv"]
+    },
+    "usage": {
+        "code": ["src/test_usage_dataset.py", "src/columnar.py"],
+        "inputs": ["your_usage_dataset"],
+        "outputs": ["data/usage_anomaly_report.csv"]
+    }
+}
+
+def configure(args) -> dict:
+    """STAGES with script arguments from the command line"""
+    stages = {name: dict(stage, script=stage["code"][0], args=[], run_args=[]) for name, stage in STAGES.items()}
+    generate = stages["generate"]["args"]
+    if args.seed is not None:
+        generate += ["--seed", str(args.seed)]
+    if args.rows:
+        generate += ["--rows", str(int(args.rows))]
+    if args.start:
+        generate += ["--start", args.start]
+    if args.workers > 1:
+        stages["generate"]["run_args"] += ["--workers", str(args.workers)]
+        stages["features"]["run_args"] += ["--workers", str(args.workers)]
+    if args.train_mode:
+        stages["train"]["args"] += ["--mode", args.train_mode]
+    return stages
+
+def upstream(stages: dict) -> dict:
+    """stage -> stages producing one of its inputs"""
+    producers = {output: name for name, stage in stages.items() for output in stage["outputs"]}
+    return {
+        name: sorted({producers[i] for i in stage["inputs"] if i in producers and producers[i] != name})
+        for name, stage in stages.items()
+    }
+
+def downstream_of(stages: dict, roots: list) -> list:
+    deps = upstream(stages)
+    selected = set(roots)
+    changed = True
+    while changed:
+        changed = False
+        for name in stages:
+            if name not in selected and selected.intersection(deps[name]):
+                selected.add(name)
+                changed = True
+    return [name for name in stages if name in selected]
+
+# ==========================================
+# CONTENT HASHES
+# ==========================================
+
+class Hasher:
+    """sha256 of files and table directories, cached by (size, mtime) across runs"""
+
+    def __init__(self, cache: dict):
+        self.cache = cache  # path -> [size, mtime_ns, digest]
+
+    def file(self, path: Path) -> str:
+        stat = path.stat()
+        cached = self.cache.get(str(path))
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+                digest.update(block)
+        self.cache[str(path)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def path(self, path: Path):
+        """Digest of a file or directory, None if it does not exist"""
+        if path.is_dir():
+            digest = hashlib.sha256()
+            for child in sorted(path.iterdir()):
+                digest.update(f"{child.name}:{self.file(child)}\n".encode())
+            return digest.hexdigest()
+        return self.file(path) if path.exists() else None
+
+def resolve(entry: str):
+    """Path of a declared input / output (None for a table that does not exist yet)"""
+    if "/" in entry:
+        return Path(entry)
+    try:
+        return find_table(entry)
+    except FileNotFoundError:
+        return None
+
+def digests(hasher: Hasher, entries: list) -> dict:
+    result = {}
+    for entry in entries:
+        path = resolve(entry)
+        result[entry] = [str(path), hasher.path(path)] if path else None
+    return result
+
+def stage_key(hasher: Hasher, stage: dict) -> str:
+    key = {
+        "code": {path: hasher.path(Path(path)) for path in stage["code"]},
+        "args": stage["args"],
+        "format": os.environ.get("SATARK_DATA_FORMAT", "csv"),
+        "inputs": digests(hasher, stage["inputs"])
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def stale_reason(hasher: Hasher, stage: dict, recorded: dict):
+    """Why a stage must run, or None if it is up to date"""
+    if not recorded:
+        return "never run"
+    if recorded["key"] != stage_key(hasher, stage):
+        return "code, arguments or inputs changed"
+    if digests(hasher, stage["outputs"]) != recorded["outputs"]:
+        return "outputs missing or modified"
+    return None
+
+# ==========================================
+# RUNNING
+# ==========================================
+
+def run_stage(name: str, stage: dict, hasher: Hasher, state: dict, force: bool, dry_run: bool,
+              upstream_runs: list) -> dict:
+    if dry_run and upstream_runs and not force:
+        return {"status": f"may run (after {', '.join(upstream_runs)})"}
+    reason = "forced" if force else stale_reason(hasher, stage, state.get(name))
+    if reason is None:
+        return {"status": "up to date"}
+    if dry_run:
+        return {"status": f"would run ({reason})"}
+    key = stage_key(hasher, stage)  # Before running, so inputs changed meanwhile make it stale
+    print(f"[RUN]  {name}: python {stage['script']} ({reason})")
+    log = STATE_DIR / "logs" / f"{name}.log"
+    started = time.perf_counter()
+    with open(log, "w") as out:
+        process = subprocess.run(
+            [sys.executable, stage["script"], *stage["args"], *stage["run_args"]],
+            stdout=out, stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONUNBUFFERED="1")
+        )
+    seconds = time.perf_counter() - started
+    if process.returncode != 0:
+        return {"status": "failed", "error": f"exit status {process.returncode}, see {log}", "seconds": seconds}
+    state[name] = {"key": key, "outputs": digests(hasher, stage["outputs"]), "seconds": seconds}
+    return {"status": "ran", "seconds": seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline pipeline, skipping up-to-date stages")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--only", nargs="+", choices=list(STAGES), help="Run just these stages (forced)")
+    selection.add_argument("--from", dest="start_stage", choices=list(STAGES),
+                           help="Force this stage, then run its downstream stages if they are out of date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Stages running at the same time")
+    parser.add_argument("--seed", type=int, help="generate_data.py --seed")
+    parser.add_argument("--rows", type=float, help="generate_data.py --rows")
+    parser.add_argument("--start", help="generate_data.py --start")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for generate_data.py and feature_engineering.py (outputs are unchanged)")
+    parser.add_argument("--train-mode", choices=["refit", "warm-start", "reuse"], help="train_model.py --mode")
+    args = parser.parse_args()
+
+    os.chdir(REPO)  # The scripts use data/ and models/ relative paths
+    resolve_format(os.environ.get("SATARK_DATA_FORMAT", "csv"))  # Fail early on a bad format
+    (STATE_DIR / "logs").mkdir(parents=True, exist_ok=True)
+    os.makedirs("models", exist_ok=True)
+    state_path = STATE_DIR / "state.json"
+    saved = json.loads(state_path.read_text()) if state_path.exists() else {}
+    state, hasher = saved.get("stages", {}), Hasher(saved.get("hashes", {}))
+
+    stages = configure(args)
+    if args.only:
+        selected, forced = [name for name in stages if name in args.only], set(args.only)
+    elif args.start_stage:
+        selected, forced = downstream_of(stages, [args.start_stage]), {args.start_stage}
+    else:
+        selected, forced = list(stages), set()
+    # A stage waits for the selected stages it reads from
+    deps = {name: [d for d in upstream(stages)[name] if d in selected] for name in selected}
+
+    started = time.perf_counter()
+    results, running = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        while len(results) < len(selected):
+            for name in selected:
+                if name in results or name in running:
+                    continue
+                if any(results.get(d, {}).get("status") in ("failed", "skipped") for d in deps[name]):
+                    results[name] = {"status": "skipped", "error": "an upstream stage failed"}
+                    print(f"[SKIP] {name}: an upstream stage failed")
+                elif all(d in results for d in deps[name]):
+                    upstream_runs = [d for d in deps[name] if results[d]["status"].startswith(("would run", "may run"))]
+                    running[name] = pool.submit(
+                        run_stage, name, stages[name], hasher, state, name in forced, args.dry_run, upstream_runs
+                    )
+            if not running:
+                continue
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name, future in list(running.items()):
+                if future in done:
+                    result = results[name] = future.result()
+                    del running[name]
+                    timing = f" in {result['seconds']:.1f}s" if "seconds" in result else ""
+                    tag = "[ERROR]" if result["status"] == "failed" else "[OK]  "
+                    print(f"{tag} {name}: {result['status']}{timing}" + (f" - {result['error']}" if "error" in result else ""))
+
+    if not args.dry_run:
+        tmp = state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"stages": state, "hashes": hasher.cache}, indent=2))
+        os.replace(tmp, state_path)
+    print(f"\nPipeline finished in {time.perf_counter() - started:.1f}s")
+    if any(r["status"] in ("failed", "skipped") for r in results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
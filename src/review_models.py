@@ -5,6 +5,7 @@ Inspect trained models and generated predictions
 import joblib
 import pandas as pd
 import os
+from columnar import find_table, load_table
 
 print("=" * 60)
 print(" MODEL AND DATA REVIEW ")
@@ -61,16 +62,20 @@ print("\n\n2. DATA FILES")
 print("-" * 60)
 
 data_files = {
-    "Hybrid Predictions": "hybrid_fraud_predictions.csv",
-    "Fraud Clusters": "fraud_campaign_clusters.csv",
-    "Caller Features": "caller_features.csv"
+    "Hybrid Predictions": "hybrid_fraud_predictions",
+    "Fraud Clusters": "fraud_campaign_clusters",
+    "Caller Features": "caller_features"
 }
 
-for data_name, filename in data_files.items():
-    filepath = os.path.join(data_dir, filename)
-    if os.path.exists(filepath):
+for data_name, table in data_files.items():
+    try:
+        filepath = find_table(os.path.join(data_dir, table))  # CSV or a columnar format
+    except FileNotFoundError:
+        filepath = None
+    if filepath is not None:
+        filename = filepath.name
         try:
-            df = pd.read_csv(filepath)
+            df = load_table(filepath)
             print(f"\n{data_name} ({filename}):")
             print(f"  Rows: {len(df):,}")
             print(f"  Columns: {len(df.columns)}")
@@ -7,6 +7,7 @@ import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 import joblib
 import os
+from columnar import find_table, load_table
 
 print("=" * 60)
 print(" INFERENCE PIPELINE - Testing on New Data ")
@@ -48,12 +49,9 @@ else:
 # ==========================================
 
 print("\nLoading new dataset...")
-data_path = "data/caller_features.csv"
+data_path = find_table("caller_features")  # Newest of .csv / .parquet / .arrow / .npyd
 
-if not os.path.exists(data_path):
-    raise FileNotFoundError(f"Data file not found: {data_path}")
-
-df = pd.read_csv(data_path)
+df = load_table(data_path)
 
 if "caller_id" not in df.columns:
     raise ValueError("Column 'caller_id' not found in dataset.")
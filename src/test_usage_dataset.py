@@ -1,10 +1,10 @@
-import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import MinMaxScaler
+from columnar import load_table
 
 
 # Replace with your actual file name
-df = pd.read_csv("data/your_usage_dataset.csv")
+df = load_table("your_usage_dataset")
 
 print("\nDataset Loaded Successfully")
 print("Total Records:", len(df))
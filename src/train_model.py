@@ -2,7 +2,32 @@
 Unified Hybrid Fraud Detection Training Pipeline
 Combines Supervised (RandomForest) + Unsupervised (IsolationForest) + Clustering
 Includes proper train/test split and evaluation
+
+Forests are fitted concurrently. --mode chooses how the full-data models are
+obtained after the held-out evaluation:
+  - refit (default): RF and IF are fitted again from scratch on all callers
+  - warm-start: the IF from the evaluation run is kept (see below); the
+    full-data RF keeps half of the evaluation trees and fits the other half
+    on all callers
+  - reuse: the IF from the evaluation run is kept and its train/test scores
+    are reused for the full-dataset predictions; the RF is fitted again from
+    scratch on all callers
+
+Only the IF is reused: it never sees labels and each tree is grown on a
+256-caller subsample, so refitting on all callers only redraws the
+subsamples. The evaluation RF is never shipped as is: its scores are
+in-sample for training callers and out-of-sample for test callers, and one
+threshold cannot fit both. Per-stage timings go to models/training_timings.json.
+
+Usage (from the repository root):
+    python src/train_model.py
+    python src/train_model.py --mode reuse
 """
+import argparse
+import copy
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
@@ -13,18 +38,34 @@ from sklearn.metrics import precision_recall_curve
 import joblib
 import os
 import random
+from columnar import load_table, save_table
 
 # ==========================================
 # STEP 0: SETUP AND DATA LOADING
 # ==========================================
 
+parser = argparse.ArgumentParser(description="Train the hybrid fraud detection models")
+parser.add_argument("--mode", choices=["refit", "warm-start", "reuse"], default="refit",
+                    help="How the full-data models are obtained (see the module docstring)")
+args = parser.parse_args()
+
+timings = {}
+_lap_started = time.perf_counter()
+
+def lap(stage: str):
+    """Record the seconds since the previous lap under stage"""
+    global _lap_started
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - _lap_started
+    _lap_started = now
+
 print("=" * 60)
 print(" HYBRID FRAUD DETECTION TRAINING PIPELINE ")
 print("=" * 60)
 print("\nLoading data...")
 
-# Load feature data
-df = pd.read_csv("data/caller_features.csv")
+# Load feature data (CSV or a columnar table, see columnar.py)
+df = load_table("caller_features")
 
 if "true_label" not in df.columns:
     raise ValueError("Column 'true_label' not found in dataset.")
@@ -70,6 +111,7 @@ print(f"  Flipped {len(flip_normal)} normal to fraud")
 
 print(f"[OK] Loaded {len(df)} callers with {len(feature_cols)} features")
 print(f"  Features: {', '.join(feature_cols)}")
+lap("load")
 
 # Create models directory
 os.makedirs("models", exist_ok=True)
@@ -98,6 +140,7 @@ print(f"  Training set: {len(X_train)} callers ({len(X_train)/len(df)*100:.1f}%)
 print(f"  Test set: {len(X_test)} callers ({len(X_test)/len(df)*100:.1f}%)")
 print(f"  Training fraud: {y_train.sum()} ({y_train.sum()/len(y_train)*100:.2f}%)")
 print(f"  Test fraud: {y_test.sum()} ({y_test.sum()/len(y_test)*100:.2f}%)")
+lap("split")
 
 # ==========================================
 # STEP 2: TRAINING PHASE (ON TRAINING SET ONLY)
@@ -107,27 +150,32 @@ print("\n" + "=" * 60)
 print(" STEP 2: Training Models (Training Set Only) ")
 print("=" * 60)
 
-# Train RandomForest on training set
-print("\nTraining RandomForest...")
-rf_model = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=10,
-    random_state=42,
-    n_jobs=-1
-)
-rf_model.fit(X_train, y_train)
+def make_random_forest():
+    return RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        random_state=42,
+        n_jobs=-1
+    )
+
+def make_isolation_forest():
+    return IsolationForest(
+        n_estimators=300,
+        contamination='auto',
+        random_state=42,
+        n_jobs=-1
+    )
+
+# Tree building releases the GIL, so RF and IF are fitted on threads side by side
+pool = ThreadPoolExecutor(max_workers=2)
+print(f"\nTraining RandomForest and IsolationForest concurrently (mode: {args.mode})...")
+rf_model = make_random_forest()
+iso_model = make_isolation_forest()
+for fit in [pool.submit(rf_model.fit, X_train, y_train), pool.submit(iso_model.fit, X_train)]:
+    fit.result()
 print(f"[OK] RandomForest trained on {len(X_train)} samples")
-
-# Train IsolationForest on training set
-print("\nTraining IsolationForest...")
-iso_model = IsolationForest(
-    n_estimators=300,
-    contamination='auto',
-    random_state=42,
-    n_jobs=-1
-)
-iso_model.fit(X_train)
 print(f"[OK] IsolationForest trained on {len(X_train)} samples")
+lap("fit_evaluation_models")
 
 # ==========================================
 # STEP 3: TEST EVALUATION PHASE
@@ -217,35 +265,44 @@ print(f"\nRecall                        : {test_recall:.2f}%")
 print(f"Precision                     : {test_precision:.2f}%")
 print(f"FPR (False Positive Rate)     : {test_fpr:.2f}%")
 print("-" * 60)
+lap("evaluate")
 
 # ==========================================
 # STEP 4: FULL MODEL TRAINING (ON ALL DATA)
 # ==========================================
 
 print("\n" + "=" * 60)
-print(" STEP 4: Retraining on Full Dataset ")
+print(" STEP 4: Full Dataset Models ")
 print("=" * 60)
 
-# Retrain models on full dataset
-print("\nRetraining RandomForest on full dataset...")
-rf_model_full = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=10,
-    random_state=42,
-    n_jobs=-1
-)
-rf_model_full.fit(X, y)
-print(f"[OK] RandomForest retrained on {len(X)} samples")
-
-print("\nRetraining IsolationForest on full dataset...")
-iso_model_full = IsolationForest(
-    n_estimators=300,
-    contamination='auto',
-    random_state=42,
-    n_jobs=-1
-)
-iso_model_full.fit(X)
-print(f"[OK] IsolationForest retrained on {len(X)} samples")
+if args.mode == "refit":
+    print("\nRetraining RandomForest and IsolationForest on full dataset...")
+    rf_model_full = make_random_forest()
+    iso_model_full = make_isolation_forest()
+    for fit in [pool.submit(rf_model_full.fit, X, y), pool.submit(iso_model_full.fit, X)]:
+        fit.result()
+    print(f"[OK] RandomForest retrained on {len(X)} samples")
+    print(f"[OK] IsolationForest retrained on {len(X)} samples")
+else:
+    iso_model_full = iso_model
+    print(f"\n[OK] IsolationForest from the evaluation run kept (label-free, subsample-based)")
+    if args.mode == "warm-start":
+        # Keep the first half of the evaluation trees and grow the rest on all
+        # callers; the new trees get the seeds a fresh fit would give them
+        kept = rf_model.n_estimators // 2
+        rf_model_full = copy.copy(rf_model)
+        rf_model_full.estimators_ = rf_model.estimators_[:kept]
+        rf_model_full.set_params(warm_start=True)
+        rf_model_full.fit(X, y)
+        rf_model_full.set_params(warm_start=False)
+        print(f"[OK] RandomForest warm-started: {kept} evaluation trees + "
+              f"{rf_model_full.n_estimators - kept} trees fitted on {len(X)} samples")
+    else:
+        rf_model_full = make_random_forest()
+        rf_model_full.fit(X, y)
+        print(f"[OK] RandomForest retrained on {len(X)} samples")
+pool.shutdown()
+lap("fit_full_models")
 
 # ==========================================
 # STEP 5: FULL DATASET PREDICTIONS
@@ -255,10 +312,19 @@ print("\n" + "=" * 60)
 print(" STEP 5: Generating Full Dataset Predictions ")
 print("=" * 60)
 
-# Compute predictions on full dataset
+# Compute predictions on full dataset; the scores of an IF kept from the
+# evaluation run are reused instead of recomputed
 fraud_probability = rf_model_full.predict_proba(X)[:, 1]
-anomaly_score = iso_model_full.decision_function(X)
-anomaly_intensity = -anomaly_score
+
+if iso_model_full is iso_model:
+    train_positions = df.index.get_indexer(train_indices)
+    test_positions = df.index.get_indexer(test_indices)
+    anomaly_intensity = np.empty(len(X))
+    anomaly_intensity[test_positions] = test_anomaly_intensity
+    anomaly_intensity[train_positions] = train_anomaly_intensity
+else:
+    anomaly_score = iso_model_full.decision_function(X)
+    anomaly_intensity = -anomaly_score
 
 # Normalize anomaly intensity
 scaler_anomaly_full = MinMaxScaler(feature_range=(0, 1))
@@ -286,6 +352,7 @@ print(f"[OK] Full dataset predictions generated")
 print(f"  Final risk range: [{final_risk.min():.4f}, {final_risk.max():.4f}]")
 print(f"  Dynamic threshold (F1-optimal): {threshold_value:.4f}")
 print(f"  Callers flagged as fraud: {predicted_fraud.sum()}")
+lap("predict")
 
 # ==========================================
 # STEP 6: CSV EXPORT FOR DASHBOARD
@@ -309,6 +376,17 @@ export_df.to_csv("data/hybrid_fraud_predictions.csv", index=False)
 print(f"[OK] Predictions saved to data/hybrid_fraud_predictions.csv")
 print(f"  Columns: {', '.join(export_df.columns)}")
 
+# Features next to the predictions, for fraud_explainer.py
+explained = save_table(df[["caller_id"] + feature_cols + [
+    "fraud_probability",
+    "anomaly_intensity",
+    "final_risk",
+    "predicted_fraud",
+    "true_label"
+]], "fraud_predictions")
+print(f"[OK] Predictions with features saved to {explained}")
+lap("export")
+
 # ==========================================
 # STEP 7: CAMPAIGN CLUSTERING
 # ==========================================
@@ -391,6 +469,8 @@ else:
     ])
     empty_df.to_csv("data/fraud_campaign_clusters.csv", index=False)
 
+lap("cluster")
+
 # ==========================================
 # STEP 8: SAVE MODELS
 # ==========================================
@@ -403,11 +483,20 @@ print("=" * 60)
 joblib.dump(rf_model_full, "models/random_forest.pkl")
 joblib.dump(iso_model_full, "models/isolation_forest.pkl")
 
+trained_on = {
+    "refit": ("full dataset", "full dataset"),
+    "warm-start": ("training split + full dataset", "training split"),
+    "reuse": ("full dataset", "training split")
+}[args.mode]
 print(f"[OK] Models saved:")
-print(f"  - models/random_forest.pkl (trained on full dataset)")
-print(f"  - models/isolation_forest.pkl (trained on full dataset)")
+print(f"  - models/random_forest.pkl (trained on {trained_on[0]})")
+print(f"  - models/isolation_forest.pkl (trained on {trained_on[1]})")
 if len(fraud_df) > 0 and n_clusters >= 2:
     print(f"  - models/kmeans.pkl")
+lap("save")
+
+with open("models/training_timings.json", "w") as f:
+    json.dump({"mode": args.mode, "callers": len(df), "seconds": timings, "total": sum(timings.values())}, f, indent=2)
 
 # ==========================================
 # FINAL SUMMARY
@@ -417,6 +506,10 @@ print("\n" + "=" * 60)
 print(" TRAINING PIPELINE COMPLETE ")
 print("=" * 60)
 print(f"\n[OK] Test evaluation completed on held-out test set")
-print(f"[OK] Models retrained on full dataset and saved")
+print(f"[OK] Full dataset models ({args.mode}) saved")
+print("\nStage timings:")
+for stage_name, seconds in timings.items():
+    print(f"  {stage_name:<24}{seconds:>8.1f}s")
+print(f"  {'total':<24}{sum(timings.values()):>8.1f}s (models/training_timings.json)")
 print(f"[OK] Predictions and clusters exported to CSV")
 print("\n" + "=" * 60)